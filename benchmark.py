@@ -0,0 +1,185 @@
+from utils.synthetic import SyntheticTree
+from utils.compare import COMPARE_POLICIES, METADATA
+from utils.workers import DEFAULT_WORKERS
+from utils.index import HashIndex
+from syncronizer import SyncFold
+from loguru import logger
+import subprocess
+import platform
+import argparse
+import tempfile
+import shutil
+import json
+import time
+import os
+
+MiB = 1024 * 1024
+
+# Every scenario builds a source tree, and optionally changes it after the first two cycles. The sizes are multiplied
+# by the --scale option.
+SCENARIOS = {
+    "tiny_files": {
+        "build": lambda tree, scale: tree.tiny_files(int(20000 * scale)),
+        "change": None,
+    },
+    "huge_files": {
+        "build": lambda tree, scale: tree.huge_files(2, int(128 * MiB * scale)),
+        "change": None,
+    },
+    "deep_nesting": {
+        "build": lambda tree, scale: tree.deep_nesting(max(1, int(200 * scale))),
+        "change": None,
+    },
+    "wide_directory": {
+        "build": lambda tree, scale: tree.wide_directory(int(20000 * scale)),
+        "change": None,
+    },
+    "partial_modification": {
+        "build": lambda tree, scale: (tree.tiny_files(int(5000 * scale)), tree.huge_files(1, int(128 * MiB * scale))),
+        "change": lambda tree: tree.modify_files(0.05),
+    },
+    "rename": {
+        "build": lambda tree, scale: tree.tiny_files(int(5000 * scale), per_directory=250),
+        "change": lambda tree: tree.rename_entries(50, directory_count=2),
+    },
+}
+
+
+def parse_passed_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the synchronization on synthetic trees")
+    parser.add_argument("--output", default="benchmark-results.json", help="File the results are written to, as JSON")
+    parser.add_argument("--baseline", help="Results of a previous run, to print the ratio of every phase against")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS), help="Scenarios to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier of the number and size of the generated files")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated trees")
+    parser.add_argument("--workdir", help="Folder where the trees are generated, a temporary one by default")
+    parser.add_argument("--compare", choices=COMPARE_POLICIES, default=METADATA, help="How files present in both folders are compared")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="How many operations run concurrently")
+    parser.add_argument("--streaming", action="store_true", help="Run the cycles in streaming mode")
+    parser.add_argument("--log_file", default="logs/benchmark.log", help="Where the warnings and errors of the cycles are logged")
+    return parser.parse_args()
+
+
+def tree_size(folder: str) -> tuple:
+    files = 0
+    size = 0
+    for current_dir, _, file_names in os.walk(folder):
+        for file_name in file_names:
+            files += 1
+            size += os.path.getsize(os.path.join(current_dir, file_name))
+    return files, size
+
+
+def current_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(name: str, workdir: str, args: argparse.Namespace) -> dict:
+    """
+    This function generates the source tree of a scenario and times three cycles over it: a cold one, into an empty
+    replica, a warm one, with nothing to do, and, for the scenarios that change the tree, one after the change.
+
+    Args:
+        name: str
+        workdir: str
+        args: argparse.Namespace
+
+    Returns:
+        result: dict
+    """
+
+    scenario = SCENARIOS[name]
+    source_folder = os.path.join(workdir, name, "source")
+    destiny_folder = os.path.join(workdir, name, "replica")
+    tree = SyntheticTree(source_folder, args.seed)
+
+    generation_start = time.monotonic()
+    scenario["build"](tree, args.scale)
+    files, size = tree_size(source_folder)
+    result = {"files": files, "bytes": size, "generation_seconds": time.monotonic() - generation_start, "cycles": {}}
+
+    index = HashIndex(os.path.join(workdir, name, "index.sqlite"), logger)
+    synchronizer = SyncFold(source_folder, destiny_folder, logger, compare_policy=args.compare, index=index,
+                            workers=args.workers, streaming=args.streaming)
+    try:
+        cycles = ["cold", "warm"] + (["changed"] if scenario["change"] is not None else [])
+        for cycle in cycles:
+            if cycle == "changed":
+                scenario["change"](tree)
+            report = synchronizer.run_sincronization()
+            result["cycles"][cycle] = report.to_dict()
+            print(f"{name:<22} {cycle:<8} {report.duration:8.3f}s  {report.bytes_copied / MiB:10.1f} MiB copied  "
+                  f"{len(report.errors)} errors")
+    finally:
+        synchronizer.close()
+        shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+    return result
+
+
+def compare_with_baseline(results: dict, baseline: dict) -> None:
+    """
+    This function prints, for every phase of every cycle present in both runs, the time of this run divided by the
+    time of the baseline, so a value above 1 is a regression.
+
+    Args:
+        results: dict
+        baseline: dict
+
+    Returns:
+        None
+    """
+
+    print(f"\ncompared with {baseline.get('version') or 'the baseline'}:")
+    for name, scenario in results["scenarios"].items():
+        baseline_scenario = baseline.get("scenarios", {}).get(name)
+        if baseline_scenario is None:
+            continue
+        for cycle, report in scenario["cycles"].items():
+            baseline_report = baseline_scenario["cycles"].get(cycle)
+            if baseline_report is None:
+                continue
+            timings = {"total": report["duration_seconds"], **report["phases"]}
+            baseline_timings = {"total": baseline_report["duration_seconds"], **baseline_report["phases"]}
+            ratios = [
+                f"{phase} x{seconds / baseline_timings[phase]:.2f}"
+                for phase, seconds in timings.items() if baseline_timings.get(phase)
+            ]
+            print(f"{name:<22} {cycle:<8} {', '.join(ratios)}")
+
+
+def main():
+    args = parse_passed_arguments()
+    # per file logging would be most of what gets measured, only the problems are logged
+    logger.remove()
+    logger.add(args.log_file, level="WARNING")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="syncfold-benchmark-")
+    results = {
+        "version": current_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: getattr(args, key) for key in ("scale", "seed", "compare", "workers", "streaming")},
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenarios:
+            results["scenarios"][name] = run_scenario(name, workdir, args)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare_with_baseline(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+from utils.compare import COMPARE_POLICIES, METADATA
+from utils.files import DIGEST_ALGORITHMS, DEFAULT_DIGEST
+from utils.delta import DEFAULT_DELTA_THRESHOLD
+from utils.workers import WorkerPool, IOBudget, DEFAULT_WORKERS, DEFAULT_MAX_CONCURRENT_IO
+from utils.process_hasher import ProcessPoolHasher
+from utils.metrics import MetricsExporter
+from utils.throttle import Throttle
+from utils.plan import ORDER_POLICIES, PATH_ORDER
+from utils.index import HashIndex
+from utils.journal import OperationJournal
+from utils.filters import PathFilter
+from utils.remote import RemoteReplica, state_folder
+from utils.scrub import DEFAULT_SCRUB_SLICE_BYTES
+from syncronizer import SyncFold, DEFAULT_FULL_SCAN_EVERY
+import threading
+import json
+import time
+import os
+
+DEFAULT_INTERVAL = 60
+DEFAULT_MAX_RUNNING_PAIRS = 4
+
+# Options of a pair, with their defaults. They can also be set for every pair at once in the "defaults" section.
+PAIR_OPTIONS = {
+    "name": None,
+    "source_folder": None,
+    "replica_folder": None,
+    "remote": None,
+    "token": None,
+    "compression": True,
+    "interval": DEFAULT_INTERVAL,
+    "priority": 0,
+    "compare": METADATA,
+    "digest": DEFAULT_DIGEST,
+    "index_path": None,
+    "no_index": False,
+    "journal_path": None,
+    "no_journal": False,
+    "filter_file": None,
+    "exclude": [],
+    "delta_threshold": DEFAULT_DELTA_THRESHOLD,
+    "no_move_detection": False,
+    "prune_unchanged": False,
+    "full_scan_every": None,
+    "streaming": False,
+    "metrics_textfile": None,
+    "metrics_json": None,
+    "order": PATH_ORDER,
+    "scrub_bytes_per_second": None,
+    "scrub_slice_bytes": DEFAULT_SCRUB_SLICE_BYTES,
+    "dry_run": False,
+}
+DAEMON_OPTIONS = {
+    "workers": DEFAULT_WORKERS,
+    "max_concurrent_io": DEFAULT_MAX_CONCURRENT_IO,
+    "max_running_pairs": DEFAULT_MAX_RUNNING_PAIRS,
+    "hasher": "thread",
+    "hash_processes": None,
+    "max_bytes_per_second": None,
+    "max_ops_per_second": None,
+    "defaults": {},
+    "pairs": [],
+}
+
+
+class SyncPair:
+    """
+    This class holds the configuration and the scheduling state of one source and replica pair of the daemon.
+
+    Attributes:
+        name: str
+        options: dict
+        synchronizer: SyncFold | None, created on the first cycle
+        next_run: float, monotonic time the next cycle is due at
+        running: bool
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        self.name = options["name"] or options["replica_folder"] or options["remote"]
+        self.interval = options["interval"]
+        self.priority = options["priority"]
+        self.synchronizer = None
+        self.next_run = 0.0
+        self.running = False
+        self.skipped_while_running = False
+
+
+class SyncDaemon:
+    """
+    This class runs many source and replica pairs in a single process, described by a config file. Every pair has its
+    own interval and priority, all of them share one worker pool and one I/O budget, and at most max_running_pairs
+    cycles run at the same time, the due pairs with the highest priority being started first. A pair whose previous
+    cycle is still running is not started again until that cycle finishes.
+
+    Attributes:
+        config: dict
+        logger: logger
+        pairs: list of SyncPair
+        pool: WorkerPool
+        io_budget: IOBudget
+        throttle: Throttle | None, shared by every pair
+        hasher: ProcessPoolHasher | None, its processes are shared by the pairs, each one hashing with its own digest
+    """
+
+    def __init__(self, config: dict, logger):
+        self.config = SyncDaemon.validate_config(config)
+        self.logger = logger
+        self.pairs = [SyncPair({**PAIR_OPTIONS, **self.config["defaults"], **pair}) for pair in self.config["pairs"]]
+        self.pool = WorkerPool(self.config["workers"])
+        self.io_budget = IOBudget(self.config["max_concurrent_io"])
+        self.throttle = None
+        if self.config["max_bytes_per_second"] or self.config["max_ops_per_second"]:
+            self.throttle = Throttle(self.config["max_bytes_per_second"], self.config["max_ops_per_second"])
+        self.hasher = None
+        if self.config["hasher"] == "process":
+            self.hasher = ProcessPoolHasher(self.config["hash_processes"], self.config["defaults"].get("digest", DEFAULT_DIGEST))
+        self.condition = threading.Condition()
+        self.threads = []
+        self.stopped = False
+
+    @staticmethod
+    def load_config(config_path: str) -> dict:
+        with open(config_path) as config_file:
+            return json.load(config_file)
+
+    @staticmethod
+    def validate_config(config: dict) -> dict:
+        """
+        This function checks the daemon config and fills in the defaults of the options left out.
+
+        Args:
+            config: dict
+
+        Returns:
+            config: dict
+
+        Raises:
+            ValueError: When an option is unknown or has an invalid value, or a pair has no source or replica folder.
+        """
+
+        unknown = set(config) - set(DAEMON_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown daemon options: {', '.join(sorted(unknown))}.")
+        config = {**DAEMON_OPTIONS, **config}
+        if config["hasher"] not in ("thread", "process"):
+            raise ValueError(f"Invalid hasher: {config['hasher']}. Expected thread or process.")
+        if not config["pairs"]:
+            raise ValueError("The config has no pairs to synchronize.")
+
+        names = set()
+        for pair in [config["defaults"]] + list(config["pairs"]):
+            unknown = set(pair) - set(PAIR_OPTIONS)
+            if unknown:
+                raise ValueError(f"Unknown pair options: {', '.join(sorted(unknown))}.")
+            options = {**PAIR_OPTIONS, **config["defaults"], **pair}
+            if options["compare"] not in COMPARE_POLICIES:
+                raise ValueError(f"Invalid compare policy: {options['compare']}. Expected one of {', '.join(COMPARE_POLICIES)}.")
+            if options["order"] not in ORDER_POLICIES:
+                raise ValueError(f"Invalid order policy: {options['order']}. Expected one of {', '.join(ORDER_POLICIES)}.")
+            if options["digest"] not in DIGEST_ALGORITHMS:
+                raise ValueError(f"Invalid digest: {options['digest']}. Expected one of {', '.join(DIGEST_ALGORITHMS)}.")
+            if not isinstance(options["exclude"], list):
+                raise ValueError(f"Invalid exclude: {options['exclude']}. Expected a list of patterns.")
+            PathFilter(options["exclude"])
+            if pair is config["defaults"]:
+                continue
+            if not options["source_folder"] or bool(options["replica_folder"]) == bool(options["remote"]):
+                raise ValueError("Every pair needs a source_folder, and either a replica_folder or a remote.")
+            name = options["name"] or options["replica_folder"] or options["remote"]
+            if name in names:
+                raise ValueError(f"Duplicated pair: {name}.")
+            names.add(name)
+        return config
+
+    def build_synchronizer(self, pair: SyncPair):
+        """
+        This function creates the synchronizer of a pair, with its own index, journal, filter rules and metrics, and the
+        worker pool, the I/O budget and the hasher shared by every pair.
+
+        Args:
+            pair: SyncPair
+
+        Returns:
+            synchronizer: SyncFold
+        """
+
+        options = pair.options
+        replica = None
+        if options["remote"]:
+            replica = RemoteReplica(options["remote"], self.logger, compress=options["compression"], token=options["token"])
+        # a dry run leaves the disk untouched, so neither the index nor the journal are created
+        index = None
+        if not options["no_index"] and not options["dry_run"]:
+            default_folder = state_folder(options["source_folder"]) if replica else options["replica_folder"]
+            index = HashIndex(options["index_path"] or HashIndex.default_path(default_folder), self.logger)
+        path_filter = None
+        if options["filter_file"]:
+            path_filter = PathFilter.from_file(options["filter_file"], options["exclude"])
+        elif options["exclude"]:
+            path_filter = PathFilter(options["exclude"])
+        journal = None
+        if not options["no_journal"] and not options["dry_run"] and replica is None:
+            journal = OperationJournal(options["journal_path"] or OperationJournal.default_path(options["replica_folder"]), self.logger)
+        metrics = None
+        if options["metrics_textfile"] or options["metrics_json"]:
+            metrics = MetricsExporter(self.logger, options["metrics_textfile"], options["metrics_json"],
+                                      {"pair": pair.name, "replica": options["remote"] or os.path.abspath(options["replica_folder"])})
+
+        return SyncFold(options["source_folder"], options["replica_folder"] or options["remote"], self.logger, dry_run=options["dry_run"],
+                        compare_policy=options["compare"], index=index, digest_algorithm=options["digest"],
+                        hasher=self.hasher.with_algorithm(options["digest"]) if self.hasher is not None else None,
+                        delta_threshold=options["delta_threshold"] if options["delta_threshold"] >= 0 else None,
+                        detect_moves=not options["no_move_detection"], prune_unchanged=options["prune_unchanged"],
+                        full_scan_every=options["full_scan_every"] or DEFAULT_FULL_SCAN_EVERY,
+                        streaming=options["streaming"], metrics=metrics, pool=self.pool, io_budget=self.io_budget,
+                        throttle=self.throttle, order=options["order"], journal=journal,
+                        path_filter=path_filter, replica=replica,
+                        scrub_bytes_per_second=options["scrub_bytes_per_second"],
+                        scrub_slice_bytes=options["scrub_slice_bytes"])
+
+    def run_cycle(self, pair: SyncPair) -> None:
+        """
+        This function runs one cycle of a pair, in its own thread, and schedules the next one an interval after the
+        start of this one. Any error is logged, without stopping the daemon nor the other pairs.
+
+        Args:
+            pair: SyncPair
+
+        Returns:
+            None
+        """
+
+        started = time.monotonic()
+        try:
+            if not os.path.isdir(pair.options["source_folder"]):
+                self.logger.error(f"Error: the source folder of the pair {pair.name} does not exist or is not a directory.")
+                return
+            if pair.synchronizer is not None and getattr(pair.synchronizer.replica, "error", None) is not None:
+                # the connection to the receiver was lost in a previous cycle, this one connects again
+                pair.synchronizer.close()
+                pair.synchronizer = None
+            if pair.synchronizer is None:
+                pair.synchronizer = self.build_synchronizer(pair)
+            pair.synchronizer.run_sincronization()
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred while synchronizing the pair {pair.name}: {type(e).__name__} - {e}")
+        finally:
+            with self.condition:
+                pair.running = False
+                pair.next_run = started + pair.interval
+                self.condition.notify_all()
+
+    def start_due_pairs(self) -> float:
+        """
+        This function starts the cycles of the pairs that are due, by priority, as long as there are free slots, and
+        returns how long to wait until the next pair is due.
+
+        Args:
+            None
+
+        Returns:
+            wait: float, in seconds
+        """
+
+        now = time.monotonic()
+        running = sum(1 for pair in self.pairs if pair.running)
+        due = sorted((pair for pair in self.pairs if pair.next_run <= now), key=lambda pair: (-pair.priority, pair.next_run))
+        for pair in due:
+            if pair.running:
+                if not pair.skipped_while_running:
+                    self.logger.warning(f"The pair {pair.name} is due, but its previous cycle is still running. It will start once that one finishes.")
+                    pair.skipped_while_running = True
+                continue
+            if running >= self.config["max_running_pairs"]:
+                break
+
+            pair.running = True
+            pair.skipped_while_running = False
+            running += 1
+            thread = threading.Thread(target=self.run_cycle, args=(pair,), name=f"syncfold-{pair.name}", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        waiting = [pair.next_run for pair in self.pairs if not pair.running]
+        return max(0.0, min(waiting) - now) if waiting else None
+
+    def run_forever(self) -> None:
+        with self.condition:
+            while not self.stopped:
+                wait = self.start_due_pairs()
+                # a cycle that finishes wakes the scheduler up, its slot may be taken by a due pair
+                self.condition.wait(wait)
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def close(self) -> None:
+        """
+        This function stops scheduling new cycles, waits for the running ones, and releases the resources of every
+        pair and the shared ones.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        self.stop()
+        for thread in self.threads:
+            thread.join()
+        for pair in self.pairs:
+            if pair.synchronizer is not None:
+                pair.synchronizer.close()
+        self.pool.shutdown()
+        if self.hasher is not None:
+            self.hasher.shutdown()
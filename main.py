@@ -1,6 +1,22 @@
-from utils.logger import configure_logger
-from syncronizer import SyncFold
+from utils.logger import configure_logger, LOG_LEVELS, DEFAULT_DEBUG_RATE
+from utils.compare import COMPARE_POLICIES, METADATA
+from utils.files import DIGEST_ALGORITHMS, DEFAULT_DIGEST
+from utils.index import HashIndex
+from utils.journal import OperationJournal
+from utils.filters import PathFilter
+from utils.process_hasher import ProcessPoolHasher
+from utils.delta import DEFAULT_DELTA_THRESHOLD
+from utils.workers import DEFAULT_WORKERS
+from utils.watcher import InotifyWatcher
+from utils.metrics import MetricsExporter
+from utils.throttle import Throttle
+from utils.remote import RemoteReplica, ReplicaReceiver, state_folder
+from utils.scrub import DEFAULT_SCRUB_SLICE_BYTES
+from utils.plan import ORDER_POLICIES, PATH_ORDER
+from syncronizer import SyncFold, DEFAULT_FULL_SCAN_EVERY
+from daemon import SyncDaemon
 import argparse
+import os
 import time
 
 def parse_passed_arguments() -> argparse:
@@ -9,9 +25,133 @@ def parse_passed_arguments() -> argparse:
     parser.add_argument("--replica_folder", help="Path to destiny folder")
     parser.add_argument("--interval", type=int, help="Synchronization interval format: (seconds)")
     parser.add_argument("--log_folder", help="Path to logs file")
+    parser.add_argument("--compare", choices=COMPARE_POLICIES, default=METADATA, help="How common files are compared: metadata (size and mtime, hashing only when ambiguous), hash or paranoid (byte by byte)")
+    parser.add_argument("--digest", choices=DIGEST_ALGORITHMS, default=DEFAULT_DIGEST, help="Digest algorithm used when files are hashed")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of file operations run concurrently")
+    parser.add_argument("--hasher", choices=("thread", "process"), default="thread", help="Hash files in the worker threads, or in a pool of processes using every core")
+    parser.add_argument("--hash_processes", type=int, help="Number of processes of the process hasher (default: number of cores)")
+    parser.add_argument("--index_path", help="Path to the persistent hash index (default: hidden file next to the replica folder)")
+    parser.add_argument("--no_index", action="store_true", help="Do not keep a persistent hash index between cycles")
+    parser.add_argument("--journal_path", help="Path to the journal of the copies in flight (default: hidden file next to the replica folder)")
+    parser.add_argument("--no_journal", action="store_true", help="Do not journal the copies, an interrupted copy starts over")
+    parser.add_argument("--filter_file", help="File of include and exclude rules with the gitignore syntax, the excluded entries are neither synchronized nor removed from the replica")
+    parser.add_argument("--exclude", action="append", default=[], help="Exclude rule with the gitignore syntax, applied after the ones of --filter_file, can be repeated")
+    parser.add_argument("--delta_threshold", type=int, default=DEFAULT_DELTA_THRESHOLD, help="Files at least this big (bytes) are updated writing only their changed blocks, a negative value disables it")
+    parser.add_argument("--no_move_detection", action="store_true", help="Do not detect moved or renamed files, copy them again instead")
+    parser.add_argument("--prune_unchanged", action="store_true", help="Skip the files of directories that were in sync and whose mtime did not change, using the directory digests kept in the index")
+    parser.add_argument("--full_scan_every", type=int, default=DEFAULT_FULL_SCAN_EVERY, help="With --prune_unchanged, stat every file once every this many cycles")
+    parser.add_argument("--streaming", action="store_true", help="Diff both folders while walking them in sorted order and apply the operations as they are found, without keeping the trees in memory")
+    parser.add_argument("--max_bytes_per_second", type=int, help="Most bytes per second read and written by the copies and the hashing")
+    parser.add_argument("--max_ops_per_second", type=float, help="Most file operations per second, copies, updates, deletions and files hashed")
+    parser.add_argument("--scrub_bytes_per_second", type=int, help="After every cycle, re-read the next slice of the replica in the background at most at this rate, repairing the files that no longer match their source")
+    parser.add_argument("--scrub_slice_bytes", type=int, default=DEFAULT_SCRUB_SLICE_BYTES, help="Bytes of the replica scrubbed after every cycle")
+    parser.add_argument("--order", choices=ORDER_POLICIES, default=PATH_ORDER, help="Order the copies and updates run in: by path, smallest files first, or largest first")
+    parser.add_argument("--metrics_textfile", help="Write the metrics of every cycle to this file, in the Prometheus text format")
+    parser.add_argument("--metrics_json", help="Write the report of every cycle to this file, as JSON")
+    parser.add_argument("--log_level", choices=LOG_LEVELS, default="INFO", help="INFO logs every change made in the replica, SUMMARY only one line per cycle and the errors, DEBUG also the steps of every file")
+    parser.add_argument("--debug_rate", type=int, default=DEFAULT_DEBUG_RATE, help="Most debug lines logged per second, 0 for no limit")
+    parser.add_argument("--async_logging", action="store_true", help="Write the log lines from a background thread, out of the way of the file operations")
+    parser.add_argument("--watch", action="store_true", help="Sync the changed subtrees as soon as inotify reports changes in the source, instead of rescanning every interval")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Seconds without changes to wait before syncing in watch mode")
+    parser.add_argument("--full_interval", type=int, default=3600, help="Seconds between full reconciliations in watch mode")
+    parser.add_argument("--remote", help="Replicate to the folder served by a receiver on another machine, as host:port, instead of --replica_folder")
+    parser.add_argument("--serve", help="Run the receiver of remote replicas on host:port, serving --replica_folder")
+    parser.add_argument("--token", help="Shared secret the sender presents to the receiver")
+    parser.add_argument("--no_compression", action="store_true", help="Do not compress the messages sent to the receiver")
+    parser.add_argument("--config", help="Run every source and replica pair of this JSON config file in one process, instead of a single pair")
+    parser.add_argument("--dry_run", "--dry-run", action="store_true", help="Only print the sync plan and its totals, without changing the replica")
 
     return parser.parse_args()
 
+def run_watch_mode(synchronizer: SyncFold, source: str, debounce: float, full_interval: int, logger) -> None:
+    """
+    This function keeps the replica in sync using inotify events from the source: after a first full synchronization,
+    only the subtrees where changes were detected are synchronized, once the changes settle for the debounce window.
+    A full synchronization still runs every full_interval seconds, and right away when events could have been lost.
+
+    Args:
+        synchronizer: SyncFold
+        source: str
+        debounce: float
+        full_interval: int
+        logger: logger
+
+    Returns:
+        None
+    """
+
+    watcher = InotifyWatcher(source, logger, synchronizer.path_filter)
+    watcher.start()
+    try:
+        synchronizer.run_sincronization()
+        last_full_sync = time.monotonic()
+        while True:
+            timeout = full_interval - (time.monotonic() - last_full_sync)
+            changed_directories = watcher.collect(debounce, timeout)
+
+            if watcher.needs_full_sync or time.monotonic() - last_full_sync >= full_interval:
+                watcher.needs_full_sync = False
+                synchronizer.run_sincronization()
+                last_full_sync = time.monotonic()
+            elif changed_directories:
+                synchronizer.run_sincronization(changed_directories)
+    finally:
+        watcher.close()
+
+def run_daemon(config_path: str, logger) -> None:
+    """
+    This function runs the pairs of a config file until the program is stopped.
+
+    Args:
+        config_path: str
+        logger: logger
+
+    Returns:
+        None
+    """
+
+    try:
+        daemon = SyncDaemon(SyncDaemon.load_config(config_path), logger)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error: could not load the config file {config_path}: {e}")
+        return
+
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        logger.info("Program stopped throught keyboard. Synchronization Stopped.")
+    finally:
+        daemon.close()
+        logger.complete()
+
+def run_receiver(replica_folder: str, address: str, token: str, logger) -> None:
+    """
+    This function serves the replica folder to remote senders until the program is stopped.
+
+    Args:
+        replica_folder: str
+        address: str
+        token: str | None
+        logger: logger
+
+    Returns:
+        None
+    """
+
+    try:
+        receiver = ReplicaReceiver(replica_folder, logger, address, token)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error: could not listen on {address}: {e}")
+        return
+
+    try:
+        receiver.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Program stopped throught keyboard. Receiver Stopped.")
+    finally:
+        receiver.server.server_close()
+        logger.complete()
+
 def main():
     args = parse_passed_arguments()
 
@@ -20,16 +160,88 @@ def main():
     periodic_interval = args.interval
     log_folder_path = args.log_folder
 
-    logger = configure_logger(log_folder_path)
+    logger = configure_logger(log_folder_path, args.log_level, args.async_logging, args.debug_rate)
+    if args.config:
+        run_daemon(args.config, logger)
+        return
+    if args.serve:
+        run_receiver(destiny, args.serve, args.token, logger)
+        return
+
+    path_filter = None
+    try:
+        if args.filter_file:
+            path_filter = PathFilter.from_file(args.filter_file, args.exclude)
+        elif args.exclude:
+            path_filter = PathFilter(args.exclude)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error: could not load the filter rules: {e}")
+        return
+
+    replica = None
+    if args.remote:
+        try:
+            replica = RemoteReplica(args.remote, logger, compress=not args.no_compression, token=args.token)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error: could not connect to the replica receiver {args.remote}: {e}")
+            return
+        destiny = args.remote
+
+    # a dry run leaves the disk untouched, so neither the index nor the journal are created
+    index = None
+    if not args.no_index and not args.dry_run:
+        index = HashIndex(args.index_path or HashIndex.default_path(state_folder(source) if replica else destiny), logger)
+
+    # the copies to a remote replica go through temporary files of the receiver, there is nothing to resume locally
+    journal = None
+    if not args.no_journal and not args.dry_run and replica is None:
+        journal = OperationJournal(args.journal_path or OperationJournal.default_path(destiny), logger)
+
+    hasher = None
+    if args.hasher == "process":
+        hasher = ProcessPoolHasher(args.hash_processes, args.digest)
+
+    metrics = None
+    if args.metrics_textfile or args.metrics_json:
+        metrics = MetricsExporter(logger, args.metrics_textfile, args.metrics_json, {"replica": destiny if replica else os.path.abspath(destiny)})
+
+    throttle = None
+    if args.max_bytes_per_second or args.max_ops_per_second:
+        throttle = Throttle(args.max_bytes_per_second, args.max_ops_per_second)
+
+    synchronizer = SyncFold(source, destiny, logger, dry_run=args.dry_run, compare_policy=args.compare, index=index,
+                            digest_algorithm=args.digest, workers=args.workers, hasher=hasher,
+                            delta_threshold=args.delta_threshold if args.delta_threshold >= 0 else None,
+                            detect_moves=not args.no_move_detection, prune_unchanged=args.prune_unchanged,
+                            full_scan_every=args.full_scan_every, streaming=args.streaming,
+                            metrics=metrics, throttle=throttle, order=args.order,
+                            journal=journal, path_filter=path_filter, replica=replica,
+                            scrub_bytes_per_second=args.scrub_bytes_per_second, scrub_slice_bytes=args.scrub_slice_bytes)
     try:
+        if args.dry_run:
+            synchronizer.run_sincronization()
+            return
+
+        if args.watch:
+            if not InotifyWatcher.is_supported():
+                logger.error("Error: watch mode needs Linux inotify, which is not available. Falling back to the interval mode.")
+            else:
+                run_watch_mode(synchronizer, source, args.debounce, args.full_interval, logger)
+                return
+
         while True:
-            synchronizer = SyncFold(source, destiny, logger)
             synchronizer.run_sincronization()
+            if replica is not None and replica.error is not None:
+                raise ConnectionError(f"the connection to the replica receiver {args.remote} was lost.")
             time.sleep(periodic_interval)
     except KeyboardInterrupt:
         logger.info("Program stopped throught keyboard. Synchronization Stopped.")
     except Exception as e:
         logger.error(str(e))
+    finally:
+        synchronizer.close()
+        # waits for the lines still queued when logging asynchronously
+        logger.complete()
 
 
 if __name__ == "__main__":
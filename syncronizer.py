@@ -1,8 +1,27 @@
-from utils.files import FileOperator
-import shutil
+from utils.plan import DiffEngine, SyncPlan, PlanOperation, MKDIR, COPY, UPDATE, DELETE, RMDIR, MOVE, EXECUTION_ORDER, PATH_ORDER
+from utils.moves import MoveDetector
+from utils.merkle import DirectoryDigests
+from utils.compare import FileComparator, METADATA, PARANOID
+from utils.index import SOURCE, DESTINY
+from utils.scanner import TreeScanner
+from utils.delta import DEFAULT_DELTA_THRESHOLD
+from utils.files import FileOperator, DEFAULT_DIGEST
+from utils.replica import LocalReplica
+from utils.scrub import ReplicaScrubber, DEFAULT_SCRUB_SLICE_BYTES
+from utils.workers import WorkerPool, DEFAULT_WORKERS
+from utils.report import CycleReport, SCAN, DIFF, INDEX
+from utils.logger import SUMMARY
+from contextlib import nullcontext
+import threading
 import time
 import os
 
+# with pruned scans enabled, every this many cycles the scan still stats every file, to catch files modified in place,
+# which do not change the mtime of their directory
+DEFAULT_FULL_SCAN_EVERY = 10
+# phase of the streaming cycles, where the walk, the diff and the operations are interleaved
+STREAM = "stream"
+
 class SyncFold:
     """
     This class represents the attributes and methods to do operations such as scan directories, sub-directories, and their respective files,
@@ -12,9 +31,37 @@ class SyncFold:
         source_folder: str
         destiny_folder: str
         logger: logger
+        dry_run: bool
+        compare_policy: str
+        index: HashIndex | None
+        digest_algorithm: str
+        workers: int
+        hasher: ProcessPoolHasher | None
+        delta_threshold: int | None
+        detect_moves: bool
+        prune_unchanged: bool
+        full_scan_every: int
+        streaming: bool
+        metrics: MetricsExporter | None
+        pool: WorkerPool, the one passed when it's shared with other synchronizers
+        io_budget: IOBudget | None, limits the file operations running at once across every synchronizer sharing it
+        throttle: Throttle | None, limits the bytes and the file operations per second of the copies and the hashing
+        order: str, order policy of the copies and updates of the plan
+        journal: OperationJournal | None, records the copies in flight so the interrupted ones can be resumed
+        path_filter: PathFilter | None, the entries it excludes are neither synchronized nor removed from the replica
+        replica: LocalReplica | RemoteReplica, the backend every change of the replica goes through, a LocalReplica of
+            the destiny folder by default
+        scrubber: ReplicaScrubber | None, re-reads a slice of the replica after every cycle when a scrub budget is set
     """
 
-    def __init__(self, source_folder: str, destiny_folder: str, logger):
+    def __init__(self, source_folder: str, destiny_folder: str, logger, dry_run: bool = False, compare_policy: str = METADATA, index=None,
+                 digest_algorithm: str = DEFAULT_DIGEST, workers: int = DEFAULT_WORKERS, hasher=None,
+                 delta_threshold: int = DEFAULT_DELTA_THRESHOLD, detect_moves: bool = True, prune_unchanged: bool = False,
+                 full_scan_every: int = DEFAULT_FULL_SCAN_EVERY, streaming: bool = False,
+                 metrics=None, pool=None, io_budget=None, throttle=None, order: str = PATH_ORDER,
+                 journal=None, path_filter=None, replica=None, scrub_bytes_per_second: int = None,
+                 scrub_slice_bytes: int = DEFAULT_SCRUB_SLICE_BYTES):
+        self.logger = logger
         if not os.path.exists(source_folder):
             self.logger.error("Error: The provided path for source folder does not exist.")
             exit()
@@ -23,10 +70,212 @@ class SyncFold:
             self.logger.error(f"Error: {source_folder} is not an directory.")
             exit()
 
-        self.logger = logger
         self.source_folder = source_folder
         self.destiny_folder = destiny_folder
+        self.dry_run = dry_run
+        self.index = index
+        self.hasher = hasher
+        self.delta_threshold = delta_threshold
+        self.replica = replica if replica is not None else LocalReplica(destiny_folder, logger)
+        self.comparator = FileComparator(source_folder, destiny_folder, logger, compare_policy, index, digest_algorithm, hasher,
+                                         throttle, self.replica if self.replica.remote else None)
+        self.move_detector = MoveDetector(self.comparator, index, logger) if detect_moves else None
+        # pruning needs the mtime of every replica directory while the source is scanned, one round trip each when remote
+        self.prune_unchanged = prune_unchanged and index is not None and not self.replica.remote
+        self.full_scan_every = max(1, full_scan_every)
+        self.cycles = 0
+        self.pruned_directories = set()
+        self.directory_states = ({}, {})
+        self.root_mtimes = (None, None)
+        self.streaming = streaming
+        self.metrics = metrics
+        self.source_manifest = None
+        self.destiny_manifest = None
+        self.plan = None
+        self.owns_pool = pool is None
+        self.pool = pool if pool is not None else WorkerPool(workers)
+        self.io_budget = io_budget
+        self.throttle = throttle
+        self.order = order
+        self.journal = journal
+        self.path_filter = path_filter
+        self.report = CycleReport()
+        self.cycle_lock = threading.Lock()
+        self.scrubber = None
+        if scrub_bytes_per_second:
+            # the source digests of the index are only comparable when they are plain file digests
+            scrub_index = index if self.comparator.digest_label == digest_algorithm else None
+            self.scrubber = ReplicaScrubber(source_folder, self.replica, logger, self.repair_file, self.cycle_lock,
+                                            scrub_bytes_per_second, scrub_slice_bytes, scrub_index, digest_algorithm,
+                                            path_filter)
+
+    def scan_folders(self, subtrees: list = None, prune: bool = False) -> None:
+        """
+        This method scans the source and the destiny folders a single time each, keeping the resulting manifests
+        so every phase of the synchronization works over the same snapshot instead of walking the trees again.
+        When subtrees are passed, only the entries below those relative directories are scanned.
+
+        With prune, the files of the directories that were in sync in the last cycle and whose mtime did not change
+        since, in both the source and the destiny, are not stat'ed nor added to the manifests.
+
+        Args:
+            subtrees: list | None
+            prune: bool
+
+        Returns:
+            None
+        """
+
+        self.pruned_directories = set()
+        if self.prune_unchanged:
+            self.root_mtimes = (os.stat(self.source_folder).st_mtime_ns, self.replica.directory_mtime(""))
+
+        if subtrees is None and prune:
+            source_states = self.index.directory_states(SOURCE)
+            destiny_states = self.index.directory_states(DESTINY)
+            self.directory_states = (source_states, destiny_states)
+
+            def is_unchanged(relative_dir: str, mtime_ns: int) -> bool:
+                source_state = source_states.get(relative_dir)
+                destiny_state = destiny_states.get(relative_dir)
+                if source_state is None or destiny_state is None or source_state[0] != mtime_ns:
+                    return False
+                destiny_mtime_ns = self.replica.directory_mtime(relative_dir)
+                if destiny_mtime_ns is None:
+                    return False
+                if destiny_state[0] != destiny_mtime_ns or source_state[1] != destiny_state[1]:
+                    return False
+                self.pruned_directories.add(relative_dir)
+                return True
+
+            self.source_manifest = TreeScanner.scan(self.source_folder, self.logger, prune=is_unchanged,
+                                                    path_filter=self.path_filter)
+            self.destiny_manifest = self.replica.scan(prune=lambda relative_dir, mtime_ns: relative_dir in self.pruned_directories,
+                                                      path_filter=self.path_filter)
+        elif subtrees is None:
+            self.source_manifest = TreeScanner.scan(self.source_folder, self.logger, path_filter=self.path_filter)
+            self.destiny_manifest = self.replica.scan(path_filter=self.path_filter)
+        else:
+            self.source_manifest = TreeScanner.scan_subtrees(self.source_folder, subtrees, self.logger, self.path_filter)
+            self.destiny_manifest = self.replica.scan_subtrees(subtrees, self.path_filter)
+        self.plan = None
+
+    def normalize_subtrees(self, subtrees) -> list:
+        """
+        This method turns the relative directories where changes happened into the smallest set of subtrees to
+        synchronize: every directory is moved up to the closest ancestor that is a directory in both the source and the
+        destiny, and directories nested inside another one of the set are dropped.
+
+        Args:
+            subtrees: iterable of relative directories
+
+        Returns:
+            subtrees: list, or None when the whole tree has to be synchronized
+        """
+
+        normalized = set()
+        for subtree in subtrees:
+            while subtree and not (os.path.isdir(os.path.join(self.source_folder, subtree)) and self.replica.is_dir(subtree)):
+                subtree = os.path.dirname(subtree)
+            if not subtree:
+                return None
+            normalized.add(subtree)
+
+        result = []
+        for subtree in sorted(normalized):
+            if not any(subtree.startswith(kept + os.sep) for kept in result):
+                result.append(subtree)
+        return result
+
+    def get_manifests(self) -> tuple:
+        if self.source_manifest is None or self.destiny_manifest is None:
+            self.scan_folders()
+        return self.source_manifest, self.destiny_manifest
+
+    def save_directory_states(self) -> None:
+        """
+        This method computes the Merkle digests of the directories of both manifests and stores, for every directory
+        whose files are the same on both sides, its mtime and digests, so the next scans can skip its files while it
+        does not change. The other directories get their stored state dropped.
 
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        source_states, destiny_states = self.directory_states
+        source_digests = DirectoryDigests.compute(
+            self.source_manifest, {path: source_states[path][1] for path in self.pruned_directories})
+        destiny_digests = DirectoryDigests.compute(
+            self.destiny_manifest, {path: destiny_states[path][1] for path in self.pruned_directories})
+
+        source_in_sync = {}
+        destiny_in_sync = {}
+        for path, (files_digest, rollup) in source_digests.items():
+            destiny_digest = destiny_digests.get(path)
+            if destiny_digest is None or destiny_digest[0] != files_digest:
+                continue
+            if path:
+                source_mtime_ns = self.source_manifest[path].mtime_ns
+                destiny_mtime_ns = self.destiny_manifest[path].mtime_ns
+            else:
+                source_mtime_ns, destiny_mtime_ns = self.root_mtimes
+            source_in_sync[path] = (source_mtime_ns, files_digest, rollup)
+            destiny_in_sync[path] = (destiny_mtime_ns, destiny_digest[0], destiny_digest[1])
+
+        full_scan = not self.pruned_directories
+        changed = [path for path in source_digests if path not in source_in_sync]
+        for side, states in ((SOURCE, source_in_sync), (DESTINY, destiny_in_sync)):
+            if not full_scan:
+                self.index.forget_directories(side, changed)
+            self.index.store_directories(side, states, replace=full_scan)
+
+        if self.root_mtimes[1] is not None and source_digests[""][1] == destiny_digests.get("", (None, None))[1]:
+            self.logger.info("source and replica folders have the same Merkle digest.")
+
+    def build_plan(self) -> SyncPlan:
+        """
+        This method diffs the source and destiny manifests of the current cycle, producing the plan of operations
+        that makes the destiny folder equal to the source folder.
+
+        Args:
+            None
+
+        Returns:
+            plan: SyncPlan
+        """
+
+        source_manifest, destiny_manifest = self.get_manifests()
+        moves = []
+        if self.move_detector is not None:
+            try:
+                moves = self.move_detector.detect(source_manifest, destiny_manifest)
+            except Exception as e:
+                self.logger.error(f"An unexpected error occurred while detecting moved files: {type(e).__name__} - {e}")
+            # the rest of the diff sees the destiny as it will be once the moves are applied
+            destiny_manifest = MoveDetector.apply_to_manifest(destiny_manifest, moves)
+
+        self.plan = DiffEngine.build_plan(source_manifest, destiny_manifest, self.is_same_file, self.pool,
+                                          self.comparator.prepare)
+        for origin, target in moves:
+            self.plan.add(MOVE, target, destiny_manifest[target].size, origin)
+        self.plan.order_transfers(self.order)
+        return self.plan
+
+    def is_same_file(self, relative_path: str, source_entry, destiny_entry) -> bool:
+        reads_files = self.comparator.policy == PARANOID or self.comparator.needs_digests(source_entry, destiny_entry)
+        with self.io_budget if self.io_budget is not None and reads_files else nullcontext():
+            is_same = self.comparator.is_same_file(relative_path, source_entry, destiny_entry)
+        if is_same:
+            self.report.record_unchanged(source_entry.size)
+        return is_same
+
+    def get_plan(self) -> SyncPlan:
+        if self.plan is None:
+            self.build_plan()
+        return self.plan
 
     def get_file_names(self, source_folder) -> list:
         """
@@ -34,75 +283,220 @@ class SyncFold:
 
         Args:
             source_folder: str
-        
+
         Returns:
             all_files: list
 
         Raises:
            PermissionError: When the user that run the program does not have enough permissions to read the file names in the passed path.
-           OSError: Whenever there's some type of error or crash originated in the Operative System. 
+           OSError: Whenever there's some type of error or crash originated in the Operative System.
         """
 
-        all_files = []
+        return TreeScanner.files(TreeScanner.scan(source_folder, self.logger, path_filter=self.path_filter))
 
-        try:
-            for root, dirs, files in os.walk(source_folder):
-                for file in files:
-                    relative_path = os.path.relpath(os.path.join(root, file), source_folder)
-                    all_files.append(relative_path)
-        except PermissionError:
-            self.logger.error(f"Error: Permission denied while accessing files in the source folder.")
-        except OSError as e:
-            self.logger.error(f"An unexpected error occurred while walking through the folder: {str(e)}")
-
-        return all_files
-    
     def get_source_file_names(self) -> list:
         try:
-            return self.get_file_names(self.source_folder)
+            return TreeScanner.files(self.get_manifests()[0])
         except Exception as e:
             self.logger.error(f"Error retrieving source filenames: {e}")
 
     def get_destiny_file_names(self) -> list:
         try:
-            return self.get_file_names(self.destiny_folder)
+            return TreeScanner.files(self.get_manifests()[1])
         except Exception as e:
             self.logger.error(f"Error retrieving filenames from the replica folder: {e}")
 
-    def get_common_files_and_update(self) -> None:
+    def execute_operation(self, operation) -> None:
         """
-        This method get's all the files from the source directory path, all the files from the destiny path, and
-        then checks which common files there's in the source and in the destiny folder, and matches the content of them there.
+        This method applies a single operation of the plan on the destiny folder, holding a slot of the I/O budget
+        while it runs, when there's one.
 
         Args:
-            None
+            operation: PlanOperation
 
         Returns:
             None
-        
+
         Raises:
-            PermissionError: When the current user used to run the program does not have enough permissions to copy files from source folder to destiny folder. 
-            OSError: Whenever there's some type of error or crash originated in the Operative System. 
-            Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged.
+            PermissionError: When the current user used to run the program does not have enough permissions to change the destiny folder.
+            OSError: Whenever there's some type of error or crash originated in the Operative System.
         """
 
-        source_directory_files = self.get_source_file_names()
-        destiny_directory_files = self.get_destiny_file_names()
+        if self.io_budget is None:
+            return self.apply_operation(operation)
+        with self.io_budget:
+            return self.apply_operation(operation)
+
+    def apply_operation(self, operation) -> None:
+        source_path = os.path.join(self.source_folder, operation.path)
+
+        if self.throttle is not None:
+            self.throttle.operation()
+
+        if self.index is not None and operation.kind in (RMDIR, DELETE, UPDATE, MOVE):
+            self.index.forget(DESTINY, operation.path)
+            if operation.origin is not None:
+                self.index.forget(DESTINY, operation.origin)
+
+        if operation.kind == MOVE:
+            self.replica.move(operation.origin, operation.path)
+            self.logger.info(f'Entry-> {operation.origin} moved to {operation.path} in destiny folder.')
+        elif operation.kind == MKDIR:
+            self.replica.make_directory(operation.path)
+            self.logger.info(f'Directory-> {operation.path} created in destiny folder.')
+        elif operation.kind == RMDIR:
+            if self.replica.remove_directory(operation.path, self.path_filter):
+                self.logger.info(f'Directory-> {operation.path} deleted from destiny folder.')
+            else:
+                self.logger.info(f'Directory-> {operation.path} emptied in destiny folder, keeping its excluded entries.')
+        elif operation.kind == DELETE:
+            self.replica.remove_file(operation.path)
+            self.logger.info(f'File: {operation.path} deleted from backup folder.')
+        elif operation.kind == UPDATE:
+            result = None
+            if self.delta_threshold is not None and operation.size >= self.delta_threshold:
+                # large files modified in part only get their changed blocks written, a full copy is the fallback
+                result = self.replica.update_file(source_path, operation.path, self.throttle)
+            if result is None:
+                result = self.replica.copy_file(source_path, operation.path, self.throttle, self.journal)
+            if result is None:
+                raise OSError(f"could not update {operation.path} in the destiny folder.")
+            self.report.record_copy(result)
+            self.logger.info(f'File: {operation.path} successfully updated.')
+        elif operation.kind == COPY:
+            result = self.replica.copy_file(source_path, operation.path, self.throttle, self.journal)
+            if result is None:
+                raise OSError(f"could not copy {operation.path} to the destiny folder.")
+            self.report.record_copy(result)
+            self.logger.info(f'File: {operation.path} successfully copied to backup.')
+
+    def execute_copy_batch(self, operations: list) -> list:
+        """
+        This method copies a batch of small files with a single call to the replica backend, for the backends where
+        every call costs a round trip, holding a slot of the I/O budget while it runs, when there's one.
 
-        same_files = [item for item in source_directory_files if item in destiny_directory_files]
-        try:
-            for file_name in same_files:
-                source_path = os.path.join(self.source_folder, file_name)
-                replica_path = os.path.join(self.destiny_folder, file_name)
-                if not FileOperator.compare_file(source_path, replica_path, self.logger):
-                    FileOperator.replicate_file(source_path, replica_path, self.logger)
-                    self.logger.info(f'File: {file_name} successfully updated.')
-        except PermissionError as e:
-            self.logger.error(e)
-        except OSError as e:
-            self.logger.error(e)
-        except Exception as e:
-            self.logger.error(f'An error happened while updating common files: {type(e).__name__} - {e}')
+        Args:
+            operations: list of PlanOperation
+
+        Returns:
+            errors: list, the exception every copy failed with, or None for the ones that succeeded
+        """
+
+        if len(operations) == 1:
+            try:
+                self.execute_operation(operations[0])
+                return [None]
+            except Exception as e:
+                return [e]
+
+        if self.throttle is not None:
+            for _ in operations:
+                self.throttle.operation()
+        items = [(os.path.join(self.source_folder, operation.path), operation.path) for operation in operations]
+        with self.io_budget if self.io_budget is not None else nullcontext():
+            results = self.replica.copy_files(items, self.throttle, self.journal)
+
+        errors = []
+        for operation, result in zip(operations, results):
+            if isinstance(result, Exception):
+                errors.append(result)
+                continue
+            self.report.record_copy(result)
+            self.logger.info(f'File: {operation.path} successfully copied to backup.')
+            errors.append(None)
+        return errors
+
+    def copy_batches(self, operations: list) -> list:
+        """
+        This method groups the copies of a plan in batches of up to the batch size of the replica backend, every
+        file bigger than a tenth of it being copied on its own.
+
+        Args:
+            operations: list of PlanOperation
+
+        Returns:
+            batches: list of lists of PlanOperation
+        """
+
+        batch_bytes = self.replica.batch_bytes
+        batches = []
+        small = []
+        small_bytes = 0
+        for operation in operations:
+            if operation.size > batch_bytes // 10:
+                batches.append([operation])
+                continue
+            if small and small_bytes + operation.size > batch_bytes:
+                batches.append(small)
+                small = []
+                small_bytes = 0
+            small.append(operation)
+            small_bytes += operation.size
+        if small:
+            batches.append(small)
+        return batches
+
+    def execute_operations(self, kind: str) -> None:
+        """
+        This method applies every operation of the passed kind from the current plan on the destiny folder, running them
+        concurrently in the worker pool. Directories are created one depth level at a time, so a parent always exists
+        before its children. An operation that fails is recorded in the cycle report, without stopping the others.
+
+        Args:
+            kind: str
+
+        Returns:
+            None
+        """
+
+        operations = self.get_plan().of_kind(kind)
+        if not operations:
+            return
+        phase_start = time.monotonic()
+        if kind == MOVE:
+            # directory moves come before the moves of files that travel with them, so they run one at a time
+            batches = [[operation] for operation in operations]
+        elif kind == MKDIR:
+            levels = {}
+            for operation in operations:
+                levels.setdefault(operation.path.count(os.sep), []).append(operation)
+            batches = [levels[depth] for depth in sorted(levels)]
+        else:
+            batches = [operations]
+
+        for batch in batches:
+            if kind == COPY and self.replica.batch_bytes:
+                outcomes = []
+                for group, errors, error in self.pool.run_all(self.execute_copy_batch, self.copy_batches(batch)):
+                    outcomes.extend(zip(group, errors if error is None else [error] * len(group)))
+            else:
+                outcomes = [(operation, error) for operation, _, error in self.pool.run_all(self.execute_operation, batch)]
+
+            for operation, error in outcomes:
+                if error is None:
+                    self.report.record_success(operation)
+                    continue
+
+                self.report.record_error(operation, error)
+                if isinstance(error, PermissionError):
+                    self.logger.error(f"Error: Permission denied while applying {kind} on {operation.path}. - {error}")
+                else:
+                    self.logger.error(f"An unexpected error occurred while applying {kind} on {operation.path}: {type(error).__name__} - {error}")
+        self.report.record_phase(kind, time.monotonic() - phase_start)
+
+    def get_common_files_and_update(self) -> None:
+        """
+        This method takes the files present in both the source and the destiny folder whose content does not match,
+        from the plan of the current cycle, and updates them in the destiny folder.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        self.execute_operations(UPDATE)
 
     def copy_missing_files_in_destiny(self) -> None:
         """
@@ -111,51 +505,26 @@ class SyncFold:
 
         Args:
             None
-        
+
         Returns:
             None
         """
-        
-        source_files = self.get_source_file_names()
-        destiny_files = self.get_destiny_file_names()
 
-        try:
-            missing_files = [item for item in source_files if item not in destiny_files]
-            for file in missing_files:
-                source_path = os.path.join(self.source_folder, file)
-                destiny_path = os.path.join(self.destiny_folder, file)
-                FileOperator.replicate_file(source_path, destiny_path, self.logger)
-                self.logger.info(f'File: {file} successfully copied to backup.')
-        except Exception as e: 
-            self.logger.error(e)
+        self.execute_operations(COPY)
 
     def remove_non_coexisting_files(self) -> None:
         """
-        This method checks in the destiny directory path, for files that are not present in the source path, 
+        This method checks in the destiny directory path, for files that are not present in the source path,
         and then deletes them.
 
         Args:
             None
-        
+
         Returns:
             None
         """
 
-        try:
-            source_files = self.get_source_file_names()
-            destiny_files = self.get_destiny_file_names()
-
-            extra_files = [item for item in destiny_files if item not in source_files]
-            for file in extra_files:
-                destiny_path = os.path.join(self.destiny_folder, file)
-                os.remove(destiny_path)
-                self.logger.info(f'File: {file} deleted from backup folder.')
-        except PermissionError as e:
-            self.logger.error(e)
-        except OSError as e:
-            self.logger.error(e)
-        except Exception as e:
-            self.logger.error(f'An unexpected error occurred during _remove_extra_files: {type(e).__name__} - {str(e)}')
+        self.execute_operations(DELETE)
 
     def get_subdirectories(self, folder_directory) -> list:
         """
@@ -165,89 +534,323 @@ class SyncFold:
             folder_directory: str
 
         Returns:
-            None
+            subdirectories: list
 
         Raises:
-            PermissionError: When the current user used to run the program does not have enough permissions to copy files from source folder to destiny folder. 
-            OSError: Whenever there's some type of error or crash originated in the Operative System. 
-            Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged. 
+            PermissionError: When the current user used to run the program does not have enough permissions to copy files from source folder to destiny folder.
+            OSError: Whenever there's some type of error or crash originated in the Operative System.
+            Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged.
         """
 
-        subdirectories = []
-
         try:
-            for dirpath, _, _ in os.walk(folder_directory):
-                rel_path = os.path.relpath(dirpath, folder_directory)
-                if rel_path != '.':
-                    subdirectories.append(rel_path)
-        except PermissionError:
-            self.logger.error(f"Error: Permission denied while accessing files in the {folder_directory} folder.")
-        except OSError as e:
-            self.logger.error(f"An unexpected error occurred while walking through the folder: {str(e)}")
+            return TreeScanner.directories(TreeScanner.scan(folder_directory, self.logger, path_filter=self.path_filter))
         except Exception as e:
             self.logger.error(f'An unexpected error occurred retrieving subdirectories: {type(e).__name__} - {str(e)}')
 
-        return subdirectories
+        return []
 
     def get_directories_from_source(self) -> list:
         try:
-            return self.get_subdirectories(self.source_folder)
+            return TreeScanner.directories(self.get_manifests()[0])
         except Exception as e:
             self.logger.error(f"Error getting source directories {e}")
 
     def get_directories_from_destiny(self) -> list:
         try:
-            return self.get_subdirectories(self.destiny_folder)
+            return TreeScanner.directories(self.get_manifests()[1])
         except Exception as e:
             self.logger.error(f"Error getting directories from replica folder {e}")
 
     def check_destiny_for_missing_directories(self) -> None:
         """
         This method goes throught the source directory and the destiny directory, checks which folders are present
-        in the source but not in the destiny directory, and then proceeds to creating them in the destiny directory.
+        in the source but not in the destiny directory, and then proceeds to creating them in the destiny directory,
+        while removing the directories that only exist in the destiny.
 
         Args:
             None
 
         Returns:
             None
+        """
 
-        Raises:
-            PermissionError: When the current user used to run the program does not have enough permissions to copy files from source folder to destiny folder. 
-            OSError: Whenever there's some type of error or crash originated in the Operative System. 
-            Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged.
+        self.execute_operations(RMDIR)
+        self.execute_operations(MKDIR)
+
+    def save_index(self, partial: bool = False) -> None:
+        """
+        This method drops from the index the paths that no longer exist in the source, and commits the digests of the
+        current cycle to disk. After a partial cycle the manifests only cover some subtrees, so nothing is dropped.
+
+        Args:
+            partial: bool
+
+        Returns:
+            None
         """
 
+        if self.index is None:
+            return
+
+        phase_start = time.monotonic()
         try:
-            source_directory = self.get_directories_from_source()
-            destiny_directory = self.get_directories_from_destiny()
-
-            missing_dirs = [item for item in source_directory if item not in destiny_directory]
-            for directory in missing_dirs:
-                os.mkdir(os.path.join(self.destiny_folder, directory))
-                self.logger.info(f'Directory-> {directory} created in destiny folder.')
-
-            extra_dirs = [item for item in destiny_directory if item not in source_directory]
-            for directory in extra_dirs:
-                shutil.rmtree(os.path.join(self.destiny_folder, directory))
-                self.logger.info(f'Directory-> {directory} deleted from destiny folder.')
-
-        except PermissionError as e:
-            self.logger.error(f"Error: Permission denied while accessing directories. - {e}")
-        except OSError as e:
-            self.logger.error(f"An unexpected error occurred: {e}")
+            if not partial:
+                self.index.prune(SOURCE, self.source_manifest)
+            self.index.commit()
         except Exception as e:
-            self.logger.error(f"An unexpected error occurred: {type(e).__name__} - {e}")
+            self.logger.error(f"An unexpected error occurred while saving the hash index: {type(e).__name__} - {e}")
+        self.report.record_phase(INDEX, time.monotonic() - phase_start)
+
+    def recover_journal(self) -> None:
+        """
+        This method goes through the copies left in the journal by a previous run that was interrupted, before the
+        folders are scanned. The copies whose source did not change since are finished, resuming from the last offset
+        flushed to disk, without the replica having to be hashed to find them. The temporary files of the others are
+        removed.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        if self.journal is None:
+            return
+
+        for entry in self.journal.entries():
+            try:
+                source_stat = os.stat(entry.source_path)
+                unchanged = (source_stat.st_size, source_stat.st_mtime_ns) == (entry.size, entry.mtime_ns)
+            except OSError:
+                unchanged = False
+
+            if unchanged and entry.verified_offset:
+                result = FileOperator.replicate_file(entry.source_path, entry.target_path, self.logger, self.throttle, self.journal)
+                if result is not None:
+                    self.report.record_copy(result)
+                    self.logger.info(f"File: interrupted copy of {entry.target_path} completed.")
+                continue
+
+            try:
+                if os.path.exists(entry.temporary_path):
+                    os.remove(entry.temporary_path)
+            except OSError as e:
+                self.logger.error(f"An unexpected error occurred while removing {entry.temporary_path}: {type(e).__name__} - {e}")
+            self.journal.finish(entry.target_path)
+
+    def repair_file(self, relative_path: str, size: int) -> bool:
+        """
+        This method copies a source file over its replica file again, for the replica files the scrubber found corrupted.
+
+        Args:
+            relative_path: str
+            size: int
+
+        Returns:
+            repaired: bool
+        """
+
+        try:
+            self.execute_operation(PlanOperation(COPY, relative_path, size))
+            return True
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred while repairing {relative_path}: {type(e).__name__} - {e}")
+            return False
+
+    def close(self) -> None:
+        if self.scrubber is not None:
+            self.scrubber.stop()
+        if self.owns_pool:
+            self.pool.shutdown()
+        if self.hasher is not None:
+            self.hasher.shutdown()
+        if self.index is not None:
+            self.index.close()
+        if self.journal is not None:
+            self.journal.close()
+        self.replica.close()
+
+    def log_plan(self) -> None:
+        for line in self.get_plan().describe():
+            self.logger.info(line)
+
+    def start_report(self) -> None:
+        self.report = CycleReport()
+        self.comparator.report = self.report
+        self.pool.max_queue_depth = self.pool.queue_depth
+
+    def finish_report(self) -> None:
+        """
+        This method closes the report of the current cycle and exports its metrics, when an exporter is set.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        self.report.max_queue_depth = self.pool.max_queue_depth
+        if self.scrubber is not None:
+            self.report.scrub = self.scrubber.progress()
+        self.report.finish()
+        if self.metrics is not None:
+            self.metrics.export(self.report)
+
+    def stream_operations(self):
+        """
+        This method walks the source and the destiny folders side by side, yielding the operations of the cycle as
+        the merge of both walks finds them, while the files present on both sides are compared by the worker pool.
+        The digests of the source files the walk does not find are removed from the index along the way.
+
+        Args:
+            None
+
+        Yields:
+            operation: PlanOperation
+        """
+
+        source_entries = TreeScanner.walk(self.source_folder, self.logger, path_filter=self.path_filter)
+        if self.index is not None and not self.dry_run:
+            # the index drops the files the walk goes past without finding, as it goes
+            source_entries = self.index.prune_walk(SOURCE, source_entries)
+        destiny_entries = self.replica.walk(self.path_filter)
+        yield from DiffEngine.stream_plan(source_entries, destiny_entries, self.is_same_file, self.pool)
+
+    def run_streaming_sincronization(self) -> CycleReport:
+        """
+        This method runs one synchronization cycle over the whole tree without building the manifests nor the plan,
+        applying every operation as soon as the walk of both folders finds it, so the memory used depends on the depth
+        and the width of the directories instead of the number of files.
+
+        Directory and removal operations run in the walking thread, in the order they are found, which keeps every
+        directory created before the files copied into it, while copies and updates run in the worker pool. Moved files
+        are not detected in this mode, since that needs both trees at once.
+
+        Args:
+            None
+
+        Returns:
+            report: CycleReport
+        """
 
-    def run_sincronization(self) -> None:
         start = time.time()
+        self.start_report()
+        if not self.dry_run:
+            self.recover_journal()
+        self.source_manifest = None
+        self.destiny_manifest = None
+        self.plan = None
+
+        phase_start = time.monotonic()
+        if self.dry_run:
+            for operation in self.stream_operations():
+                self.report.record_success(operation)
+                self.logger.info(operation.describe())
+            self.report.record_phase(STREAM, time.monotonic() - phase_start)
+            self.logger.log(SUMMARY, f"dry run finished, no changes were made. (Duration: {(time.time() - start)} seconds.)")
+            self.finish_report()
+            return self.report
+
+        runs_inline = lambda operation: operation.kind not in (COPY, UPDATE)
+        for operation, _, error in self.pool.run_stream(self.execute_operation, self.stream_operations(), runs_inline):
+            if error is None:
+                self.report.record_success(operation)
+                continue
+
+            self.report.record_error(operation, error)
+            if isinstance(error, PermissionError):
+                self.logger.error(f"Error: Permission denied while applying {operation.kind} on {operation.path}. - {error}")
+            else:
+                self.logger.error(f"An unexpected error occurred while applying {operation.kind} on {operation.path}: {type(error).__name__} - {error}")
+        self.report.record_phase(STREAM, time.monotonic() - phase_start)
+        # the walk already pruned the index, only the digests of the cycle are left to commit
+        self.save_index(partial=True)
+
+        self.finish_report()
+        self.logger.log(SUMMARY, f"sync operation runned! (Duration: {(time.time() - start)} seconds.) {self.report.summary()}")
+        if self.report.has_errors():
+            self.logger.error(f"{len(self.report.errors)} operations failed during the sync operation.")
+        return self.report
+
+    def run_sincronization(self, subtrees=None) -> CycleReport:
+        """
+        This method runs one synchronization cycle, over the whole tree or, when subtrees are passed, only over the
+        relative directories where changes were detected, and then starts scrubbing the next slice of the replica in
+        the background, when there's a scrubber.
+
+        Args:
+            subtrees: iterable of relative directories | None
+
+        Returns:
+            report: CycleReport
+        """
+
+        with self.cycle_lock:
+            report = self.synchronize(subtrees)
+        if self.scrubber is not None and not self.dry_run:
+            self.scrubber.start_slice()
+        return report
+
+    def synchronize(self, subtrees=None) -> CycleReport:
+        """
+        This method runs the synchronization cycle of run_sincronization. In streaming mode the full tree cycles are run
+        by run_streaming_sincronization, while the subtree cycles still diff their, smaller, manifests.
+
+        Args:
+            subtrees: iterable of relative directories | None
+
+        Returns:
+            report: CycleReport
+        """
+
+        if subtrees is not None:
+            subtrees = self.normalize_subtrees(subtrees)
+        if self.streaming and subtrees is None:
+            return self.run_streaming_sincronization()
+
+        start = time.time()
+        self.start_report()
+        if not self.dry_run:
+            self.recover_journal()
+        full_tree = subtrees is None
+        prune = self.prune_unchanged and full_tree and self.cycles % self.full_scan_every != 0
+
+        # A single scan of each tree per cycle, then one diff that every step below executes
+        phase_start = time.monotonic()
+        self.scan_folders(subtrees, prune)
+        self.report.record_phase(SCAN, time.monotonic() - phase_start)
+        partial = not full_tree or bool(self.pruned_directories)
+
+        phase_start = time.monotonic()
+        self.build_plan()
+        self.report.record_phase(DIFF, time.monotonic() - phase_start)
+        if full_tree:
+            self.cycles += 1
+            if self.prune_unchanged and not self.dry_run:
+                phase_start = time.monotonic()
+                try:
+                    self.save_directory_states()
+                except Exception as e:
+                    self.logger.error(f"An unexpected error occurred while saving the directory digests: {type(e).__name__} - {e}")
+                self.report.record_phase(INDEX, time.monotonic() - phase_start)
+
+        if self.dry_run:
+            self.log_plan()
+            self.logger.log(SUMMARY, f"dry run finished, no changes were made. (Duration: {(time.time() - start)} seconds.)")
+            self.finish_report()
+            return self.report
 
         # Orchestrating in order, the process of syncronizing the directories
-        self.check_destiny_for_missing_directories()
-        self.get_common_files_and_update()
-        self.copy_missing_files_in_destiny()
-        self.remove_non_coexisting_files()
-        
+        for kind in EXECUTION_ORDER:
+            self.execute_operations(kind)
+        self.save_index(partial)
+
         end = time.time()
         lapse = end - start
-        self.logger.info(f"sync operation runned! (Duration: {(lapse)} seconds.)")
+        self.finish_report()
+        self.logger.log(SUMMARY, f"sync operation runned! (Duration: {(lapse)} seconds.) {self.report.summary()}")
+        if self.report.has_errors():
+            self.logger.error(f"{len(self.report.errors)} operations failed during the sync operation.")
+        return self.report
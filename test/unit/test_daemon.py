@@ -0,0 +1,98 @@
+from utils.logger import configure_logger
+from daemon import SyncDaemon
+import pytest
+import shutil
+import time
+import os
+
+logger = configure_logger("logs/test_sync.log")
+
+@pytest.fixture
+def setup_test_environment():
+    for name in ("first", "second"):
+        os.makedirs(f".test_daemon/{name}/source", exist_ok=True)
+        with open(f".test_daemon/{name}/source/file.txt", "w") as file:
+            file.write(name)
+    yield ".test_daemon"
+    shutil.rmtree(".test_daemon")
+
+def daemon_config(folder: str) -> dict:
+    return {
+        "workers": 2,
+        "max_concurrent_io": 1,
+        "max_running_pairs": 1,
+        "defaults": {"interval": 3600},
+        "pairs": [
+            {"name": name, "source_folder": f"{folder}/{name}/source", "replica_folder": f"{folder}/{name}/replica",
+             "index_path": f"{folder}/{name}/index.sqlite", "priority": priority}
+            for name, priority in (("first", 0), ("second", 5))
+        ],
+    }
+
+# This function tests if the daemon runs every pair of the config, one at a time, and if a pair whose previous cycle
+# is still running is not started again
+def test_daemon_runs_every_pair(setup_test_environment):
+    daemon = SyncDaemon(daemon_config(setup_test_environment), logger)
+    daemon.start_due_pairs()
+    # a single slot, taken by the pair with the highest priority
+    assert [pair.name for pair in daemon.pairs if pair.running] in (["second"], [])
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and not all(pair.synchronizer and not pair.running for pair in daemon.pairs):
+        with daemon.condition:
+            daemon.start_due_pairs()
+            daemon.condition.wait(0.05)
+
+    for name in ("first", "second"):
+        with open(os.path.join(setup_test_environment, name, "replica", "file.txt")) as file:
+            assert file.read() == name
+
+    second = daemon.pairs[1]
+    second.running = True
+    second.next_run = 0
+    threads = len(daemon.threads)
+    daemon.start_due_pairs()
+    assert second.skipped_while_running
+    assert len(daemon.threads) <= threads
+    second.running = False
+    daemon.close()
+
+# This function tests if the config is rejected when it has unknown options or a pair without folders
+def test_daemon_config_validation():
+    with pytest.raises(ValueError):
+        SyncDaemon.validate_config({"pairs": [{"source_folder": "a", "replica_folder": "b", "colour": "red"}]})
+    with pytest.raises(ValueError):
+        SyncDaemon.validate_config({"pairs": [{"source_folder": "a"}]})
+    with pytest.raises(ValueError):
+        SyncDaemon.validate_config({"pairs": []})
+    config = SyncDaemon.validate_config({"pairs": [{"source_folder": "a", "replica_folder": "b"}]})
+    assert config["max_running_pairs"] == 4
+
+# This function tests if a dry run pair neither creates its index and journal nor changes the replica
+def test_daemon_dry_run_leaves_disk_untouched(setup_test_environment):
+    config = daemon_config(setup_test_environment)
+    config["defaults"]["dry_run"] = True
+    daemon = SyncDaemon(config, logger)
+    for pair in daemon.pairs:
+        daemon.run_cycle(pair)
+    daemon.close()
+
+    for name in ("first", "second"):
+        assert sorted(os.listdir(f"{setup_test_environment}/{name}")) == ["source"]
+
+# This function tests if, with the process hasher, a pair that sets its own digest gets a hasher with that digest
+# sharing the processes of the daemon
+def test_daemon_hasher_follows_pair_digest(setup_test_environment):
+    config = daemon_config(setup_test_environment)
+    config["hasher"] = "process"
+    config["pairs"][1]["digest"] = "md5"
+    daemon = SyncDaemon(config, logger)
+
+    first, second = (daemon.build_synchronizer(pair) for pair in daemon.pairs)
+
+    assert first.hasher is daemon.hasher
+    assert second.hasher.algorithm == "md5" and second.comparator.digest_label.startswith("md5-tree")
+    assert second.hasher.executor is daemon.hasher.executor
+    for synchronizer in (first, second):
+        synchronizer.close()
+    daemon.close()
@@ -1,5 +1,8 @@
 from utils.logger import configure_logger
 from syncronizer import SyncFold
+from utils.filters import PathFilter
+from utils.index import HashIndex
+from utils.remote import RemoteReplica, ReplicaReceiver
 import pytest
 import shutil
 import os
@@ -77,3 +80,272 @@ def test_check_destiny_for_missing_directories(setup_test_environment):
     sync.check_destiny_for_missing_directories()
     assert os.path.exists(os.path.join(destiny_folder, "new_subdir"))
 
+
+# This function tests if a full run_sincronization leaves the destiny folder with the same files and directories
+# as the source, removing the extra ones, while walking every tree only once
+def test_run_sincronization(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    os.makedirs(os.path.join(source_folder, "a", "b"), exist_ok=True)
+    with open(os.path.join(source_folder, "a", "b", "file.txt"), "w") as file:
+        file.write("source content")
+    os.makedirs(os.path.join(destiny_folder, "old", "nested"), exist_ok=True)
+    with open(os.path.join(destiny_folder, "old", "nested", "stale.txt"), "w") as file:
+        file.write("stale")
+
+    sync = SyncFold(source_folder, destiny_folder, logger)
+    sync.run_sincronization()
+
+    with open(os.path.join(destiny_folder, "a", "b", "file.txt")) as file:
+        assert file.read() == "source content"
+    assert not os.path.exists(os.path.join(destiny_folder, "old"))
+
+    report = sync.run_sincronization()
+    assert report.unchanged == {"count": 1, "bytes": len("source content")}
+    assert {"scan", "diff"} <= set(report.phases)
+
+# This function tests if a dry run only builds the plan, without making any change in the destiny folder
+def test_run_sincronization_dry_run(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    with open(os.path.join(source_folder, "new.txt"), "w") as file:
+        file.write("new")
+    with open(os.path.join(destiny_folder, "extra.txt"), "w") as file:
+        file.write("extra")
+
+    sync = SyncFold(source_folder, destiny_folder, logger, dry_run=True)
+    sync.run_sincronization()
+
+    assert not os.path.exists(os.path.join(destiny_folder, "new.txt"))
+    assert os.path.exists(os.path.join(destiny_folder, "extra.txt"))
+    assert sync.plan.totals()["copy"] == {"count": 1, "bytes": 3}
+
+# This function tests if one failing operation is recorded in the cycle report while the other operations of the
+# plan are still applied
+def test_failed_operation_is_reported(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    for name in ("vanishing.txt", "kept.txt"):
+        with open(os.path.join(source_folder, name), "w") as file:
+            file.write(name)
+
+    sync = SyncFold(source_folder, destiny_folder, logger, workers=2)
+    sync.build_plan()
+    os.remove(os.path.join(source_folder, "vanishing.txt"))
+    for kind in ("mkdir", "copy"):
+        sync.execute_operations(kind)
+    sync.close()
+
+    assert os.path.exists(os.path.join(destiny_folder, "kept.txt"))
+    assert [error["path"] for error in sync.report.errors] == ["vanishing.txt"]
+    assert sync.report.operations["copy"] == {"count": 1, "bytes": len("kept.txt")}
+
+# This function tests if a synchronization restricted to a subtree only changes the destiny inside that subtree
+def test_run_sincronization_subtrees(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    for folder in (source_folder, destiny_folder):
+        os.makedirs(os.path.join(folder, "changed"), exist_ok=True)
+        os.makedirs(os.path.join(folder, "untouched"), exist_ok=True)
+    with open(os.path.join(source_folder, "changed", "new.txt"), "w") as file:
+        file.write("new")
+    with open(os.path.join(source_folder, "untouched", "pending.txt"), "w") as file:
+        file.write("pending")
+    with open(os.path.join(destiny_folder, "changed", "extra.txt"), "w") as file:
+        file.write("extra")
+
+    sync = SyncFold(source_folder, destiny_folder, logger)
+    sync.run_sincronization({"changed"})
+
+    assert os.path.exists(os.path.join(destiny_folder, "changed", "new.txt"))
+    assert not os.path.exists(os.path.join(destiny_folder, "changed", "extra.txt"))
+    assert not os.path.exists(os.path.join(destiny_folder, "untouched", "pending.txt"))
+    assert sync.normalize_subtrees({"changed", os.path.join("changed", "gone"), "missing"}) is None
+    assert sync.normalize_subtrees({"changed", os.path.join("changed", "gone")}) == ["changed"]
+
+# This function tests if a directory renamed in the source is renamed in the destiny too, instead of being
+# deleted and copied again, and if a renamed file is moved the same way
+def test_run_sincronization_detects_moves(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    os.makedirs(os.path.join(source_folder, "old_name", "inner"), exist_ok=True)
+    with open(os.path.join(source_folder, "old_name", "inner", "data.txt"), "w") as file:
+        file.write("data that should not be copied twice")
+    with open(os.path.join(source_folder, "report.txt"), "w") as file:
+        file.write("report")
+
+    sync = SyncFold(source_folder, destiny_folder, logger)
+    sync.run_sincronization()
+    os.rename(os.path.join(source_folder, "old_name"), os.path.join(source_folder, "new_name"))
+    os.rename(os.path.join(source_folder, "report.txt"), os.path.join(source_folder, "report_final.txt"))
+    report = sync.run_sincronization()
+
+    assert sorted((operation.origin, operation.path) for operation in sync.plan.of_kind("move")) == [
+        ("old_name", "new_name"), ("report.txt", "report_final.txt"),
+    ]
+    assert "copy" not in report.operations
+    assert not os.path.exists(os.path.join(destiny_folder, "old_name"))
+    with open(os.path.join(destiny_folder, "new_name", "inner", "data.txt")) as file:
+        assert file.read() == "data that should not be copied twice"
+    assert os.path.exists(os.path.join(destiny_folder, "report_final.txt"))
+
+# This function tests if, with pruned scans, the files of an unchanged directory are left out of the second scan,
+# while a file added to another directory is still copied
+def test_run_sincronization_prunes_unchanged_directories(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    for directory in ("static", "busy"):
+        os.makedirs(os.path.join(source_folder, directory), exist_ok=True)
+        with open(os.path.join(source_folder, directory, "file.txt"), "w") as file:
+            file.write(directory)
+
+    index = HashIndex(".test/index.sqlite", logger)
+    sync = SyncFold(source_folder, destiny_folder, logger, index=index, prune_unchanged=True)
+    sync.run_sincronization()
+    # the first cycle changed the replica directories, the second one stores their settled state
+    sync.run_sincronization()
+    with open(os.path.join(source_folder, "busy", "new.txt"), "w") as file:
+        file.write("new")
+    sync.run_sincronization()
+
+    assert "static" in sync.pruned_directories
+    assert "busy" not in sync.pruned_directories
+    assert os.path.join("static", "file.txt") not in sync.source_manifest
+    assert os.path.exists(os.path.join(destiny_folder, "busy", "new.txt"))
+    assert os.path.exists(os.path.join(destiny_folder, "static", "file.txt"))
+    sync.close()
+
+# This function tests if a streaming cycle, that applies the operations while walking both folders, leaves the destiny
+# folder in the same state as a regular one
+def test_run_streaming_sincronization(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    os.makedirs(os.path.join(source_folder, "dir", "sub"), exist_ok=True)
+    for path in (os.path.join("dir", "sub", "a.txt"), os.path.join("dir", "b.txt"), "c.txt"):
+        with open(os.path.join(source_folder, path), "w") as file:
+            file.write(path)
+    os.makedirs(os.path.join(destiny_folder, "old", "inner"), exist_ok=True)
+    with open(os.path.join(destiny_folder, "old", "inner", "stale.txt"), "w") as file:
+        file.write("stale")
+    with open(os.path.join(destiny_folder, "c.txt"), "w") as file:
+        file.write("outdated content")
+
+    sync = SyncFold(source_folder, destiny_folder, logger, streaming=True)
+    report = sync.run_sincronization()
+    sync.close()
+
+    assert not report.has_errors()
+    assert sync.plan is None
+    assert report.operations["rmdir"] == {"count": 1, "bytes": 5}
+    assert not os.path.exists(os.path.join(destiny_folder, "old"))
+    for path in (os.path.join("dir", "sub", "a.txt"), os.path.join("dir", "b.txt"), "c.txt"):
+        with open(os.path.join(destiny_folder, path)) as file:
+            assert file.read() == path
+
+# This function tests if a complete streaming cycle drops from the index the files no longer in the source
+def test_run_streaming_sincronization_prunes_index(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    for path in ("kept.txt", "removed.txt"):
+        with open(os.path.join(source_folder, path), "w") as file:
+            file.write(path)
+
+    index = HashIndex(".test/index.sqlite", logger)
+    sync = SyncFold(source_folder, destiny_folder, logger, index=index, compare_policy="hash", streaming=True)
+    sync.run_sincronization()
+    # the second cycle compares both files, which stores their digests
+    sync.run_sincronization()
+    assert index.stored_entry("source", "removed.txt") is not None
+
+    os.remove(os.path.join(source_folder, "removed.txt"))
+    sync.run_sincronization()
+
+    assert index.stored_entry("source", "removed.txt") is None
+    assert index.stored_entry("source", "kept.txt") is not None
+    sync.close()
+
+# This function tests if the excluded entries of the source are not copied, and if the excluded entries of the
+# replica are kept, even inside a directory removed from the source
+def test_run_sincronization_with_path_filter(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    os.makedirs(os.path.join(source_folder, "node_modules"), exist_ok=True)
+    for path in ("main.py", "main.pyc", os.path.join("node_modules", "lib.js")):
+        with open(os.path.join(source_folder, path), "w") as file:
+            file.write(path)
+    os.makedirs(os.path.join(destiny_folder, "removed", "node_modules"), exist_ok=True)
+    for path in ("local.pyc", os.path.join("removed", "stale.txt"), os.path.join("removed", "node_modules", "lib.js")):
+        with open(os.path.join(destiny_folder, path), "w") as file:
+            file.write(path)
+
+    sync = SyncFold(source_folder, destiny_folder, logger, path_filter=PathFilter(["node_modules/", "*.pyc"]))
+    report = sync.run_sincronization()
+    sync.close()
+
+    assert not report.has_errors()
+    assert os.path.exists(os.path.join(destiny_folder, "main.py"))
+    assert not os.path.exists(os.path.join(destiny_folder, "main.pyc"))
+    assert not os.path.exists(os.path.join(destiny_folder, "node_modules"))
+    assert os.path.exists(os.path.join(destiny_folder, "local.pyc"))
+    assert not os.path.exists(os.path.join(destiny_folder, "removed", "stale.txt"))
+    assert os.path.exists(os.path.join(destiny_folder, "removed", "node_modules", "lib.js"))
+
+
+# This function tests a synchronization to a replica served by a receiver: small files in batches, a big file in
+# chunks, then a delta update, a move and a deletion, with the replica compared against the source after each cycle
+def test_run_sincronization_to_remote_replica(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    os.makedirs(os.path.join(source_folder, "dir", "nested"), exist_ok=True)
+    files = {os.path.join("dir", "nested", f"file_{number}.txt"): os.urandom(100 * number + 1) for number in range(20)}
+    files["big.bin"] = os.urandom(2 * 1024 * 1024)
+    files["deleted.txt"] = b"deleted"
+    for path, data in files.items():
+        with open(os.path.join(source_folder, path), "wb") as file:
+            file.write(data)
+
+    receiver = ReplicaReceiver(destiny_folder, logger)
+    receiver.start()
+    sync = SyncFold(source_folder, receiver.address, logger, replica=RemoteReplica(receiver.address, logger),
+                    index=HashIndex(".test/index.sqlite", logger), delta_threshold=1024 * 1024)
+    first_report = sync.run_sincronization()
+
+    with open(os.path.join(source_folder, "big.bin"), "r+b") as file:
+        file.seek(1000)
+        file.write(b"0123456789")
+    files["big.bin"] = files["big.bin"][:1000] + b"0123456789" + files["big.bin"][1010:]
+    os.remove(os.path.join(source_folder, "deleted.txt"))
+    del files["deleted.txt"]
+    os.rename(os.path.join(source_folder, "dir", "nested"), os.path.join(source_folder, "moved"))
+    files = {path.replace(os.path.join("dir", "nested"), "moved"): data for path, data in files.items()}
+    second_report = sync.run_sincronization()
+    sync.close()
+    receiver.shutdown()
+
+    assert not first_report.has_errors() and not second_report.has_errors()
+    assert second_report.operations["move"]["count"] == 1
+    assert "delta_in_place" in second_report.copy_methods
+    assert not os.path.exists(os.path.join(destiny_folder, "deleted.txt"))
+    assert not os.path.exists(os.path.join(destiny_folder, "dir", "nested"))
+    for path, data in files.items():
+        with open(os.path.join(destiny_folder, path), "rb") as file:
+            assert file.read() == data
+
+# This function tests if a replica file corrupted on disk, with its size and mtime untouched, is found by the scrubber
+# after the next cycle and copied again from the source
+def test_scrubber_repairs_corrupted_replica_file(setup_test_environment):
+    source_folder, destiny_folder = setup_test_environment
+    for name in ("first.bin", "second.bin"):
+        with open(os.path.join(source_folder, name), "wb") as file:
+            file.write(os.urandom(64 * 1024))
+
+    sync = SyncFold(source_folder, destiny_folder, logger, index=HashIndex(".test/index.sqlite", logger),
+                    scrub_bytes_per_second=100 * 1024 * 1024)
+    sync.run_sincronization()
+    sync.scrubber.wait()
+    corrupted_path = os.path.join(destiny_folder, "second.bin")
+    replica_stat = os.stat(corrupted_path)
+    with open(corrupted_path, "r+b") as file:
+        file.seek(1000)
+        file.write(b"bit rot")
+    os.utime(corrupted_path, ns=(replica_stat.st_atime_ns, replica_stat.st_mtime_ns))
+
+    report = sync.run_sincronization()
+    sync.scrubber.wait()
+    progress = sync.scrubber.progress()
+    sync.close()
+
+    assert report.operations == {}
+    assert progress["passes"] == 2 and progress["mismatches"] == 1 and progress["repaired"] == 1
+    with open(os.path.join(source_folder, "second.bin"), "rb") as source, open(corrupted_path, "rb") as replica:
+        assert source.read() == replica.read()
@@ -0,0 +1,237 @@
+from utils.index import SOURCE, DESTINY
+from utils.files import FileOperator, DEFAULT_DIGEST
+import os
+
+METADATA = "metadata"
+HASH = "hash"
+PARANOID = "paranoid"
+COMPARE_POLICIES = (METADATA, HASH, PARANOID)
+
+
+class FileComparator:
+    """
+    This class decides if a file in the source and its counterpart in the destiny have the same content,
+    following one of the comparison policies:
+
+    - metadata: different sizes mean different files and equal size plus equal mtime_ns mean equal files, without
+      reading any content. Only the ambiguous case, same size with a different mtime, is hashed.
+    - hash: the content of both files is always hashed and the digests compared.
+    - paranoid: the content of both files is always compared byte by byte.
+
+    When a HashIndex is passed, the digests of the metadata and hash policies are taken from it for every file whose
+    stat tuple did not change since its digest was stored, and only the other files are read. When a ProcessPoolHasher
+    is passed, the digests still missing are computed by it in one go in prepare, instead of one file at a time.
+
+    The files actually read to compute a digest are counted in the report of the current cycle, when one is set, and
+    taken from the budgets of the throttle, when there's one.
+
+    When a remote replica is passed, the digests of the destiny files are computed by the receiver, many at a time in
+    prepare, so their content never crosses the network. The source files are then hashed in process with the same
+    flat digest, since the tree digests of the process pool hasher could not be compared with them, and the paranoid
+    policy compares the digests computed on both ends instead of the bytes.
+
+    Attributes:
+        source_folder: str
+        destiny_folder: str
+        logger: logger
+        policy: str
+        index: HashIndex | None
+        algorithm: str
+        hasher: ProcessPoolHasher | None
+        throttle: Throttle | None
+        replica: RemoteReplica | None
+        report: CycleReport | None
+    """
+
+    def __init__(self, source_folder: str, destiny_folder: str, logger, policy: str = METADATA, index=None, algorithm: str = DEFAULT_DIGEST,
+                 hasher=None, throttle=None, replica=None):
+        if policy not in COMPARE_POLICIES:
+            raise ValueError(f"Invalid compare policy: {policy}. Expected one of {', '.join(COMPARE_POLICIES)}.")
+
+        self.source_folder = source_folder
+        self.destiny_folder = destiny_folder
+        self.logger = logger
+        self.policy = policy
+        self.index = index
+        self.algorithm = algorithm
+        self.replica = replica
+        self.hasher = hasher if replica is None else None
+        self.throttle = throttle
+        self.digest_label = self.hasher.label if self.hasher is not None else algorithm
+        self.prepared_digests = {}
+        self.report = None
+
+    def needs_digests(self, source_entry, destiny_entry) -> bool:
+        if self.policy == PARANOID or source_entry.size != destiny_entry.size:
+            return False
+        return not (self.policy == METADATA and source_entry.mtime_ns == destiny_entry.mtime_ns)
+
+    def side_path(self, side: str, relative_path: str) -> str:
+        folder = self.source_folder if side == SOURCE else self.destiny_folder
+        return os.path.join(folder, relative_path)
+
+    def prepare(self, common_files: list) -> None:
+        """
+        This function computes, with the process pool hasher, every digest the comparison of the passed files is going
+        to need and that is not already in the index. Without a process pool hasher it does nothing, and the digests are
+        computed one by one during the comparisons.
+
+        Args:
+            common_files: list of (relative_path, source_entry, destiny_entry) tuples
+
+        Returns:
+            None
+        """
+
+        self.prepared_digests = {}
+        if self.replica is not None:
+            return self.prepare_replica_digests(common_files)
+        if self.hasher is None:
+            return
+
+        pending = {}
+        for relative_path, source_entry, destiny_entry in common_files:
+            if not self.needs_digests(source_entry, destiny_entry):
+                continue
+            for side, entry in ((SOURCE, source_entry), (DESTINY, destiny_entry)):
+                if self.index is None or self.index.lookup(side, relative_path, entry, self.digest_label) is None:
+                    pending[self.side_path(side, relative_path)] = (side, relative_path, entry)
+
+        files = [(file_path, entry.size) for file_path, (_, _, entry) in pending.items()]
+        if self.throttle is None:
+            digests = self.hasher.hash_files(files)
+        else:
+            # the worker processes can not share the budget, so the files are handed to them about a second worth at a time
+            digests = {}
+            for group in self.throttled_groups(files):
+                for _, size in group:
+                    self.throttle.operation()
+                    self.throttle.transfer(size)
+                digests.update(self.hasher.hash_files(group))
+        for file_path, (side, relative_path, entry) in pending.items():
+            digest = digests.get(file_path)
+            if digest is None:
+                self.logger.error(f"ERROR: could not hash the file: {file_path}")
+                continue
+            self.prepared_digests[(side, relative_path)] = digest
+            if self.report is not None:
+                self.report.record_hash(entry.size)
+            if self.index is not None:
+                self.index.store(side, relative_path, entry, self.digest_label, digest)
+
+    def prepare_replica_digests(self, common_files: list) -> None:
+        """
+        This function asks the remote replica, in a single request, for every digest of a destiny file the comparison
+        of the passed files is going to need and that is not already in the index.
+
+        Args:
+            common_files: list of (relative_path, source_entry, destiny_entry) tuples
+
+        Returns:
+            None
+        """
+
+        pending = {}
+        for relative_path, source_entry, destiny_entry in common_files:
+            if self.policy == PARANOID or not self.needs_digests(source_entry, destiny_entry):
+                continue
+            if self.index is None or self.index.lookup(DESTINY, relative_path, destiny_entry, self.digest_label) is None:
+                pending[relative_path] = destiny_entry
+        if not pending:
+            return
+
+        digests = self.replica.file_digests(list(pending), self.algorithm, self.throttle)
+        for relative_path, entry in pending.items():
+            digest = digests.get(relative_path)
+            if digest is None:
+                self.logger.error(f"ERROR: could not hash the file: {relative_path} in the replica")
+                continue
+            self.prepared_digests[(DESTINY, relative_path)] = digest
+            if self.index is not None:
+                self.index.store(DESTINY, relative_path, entry, self.digest_label, digest)
+
+    def throttled_groups(self, files: list) -> list:
+        group_bytes = self.throttle.bytes_per_second or float("inf")
+        group_files = max(1, int(self.throttle.ops_per_second or len(files) or 1))
+        groups = [[]]
+        size_in_group = 0
+        for file_path, size in files:
+            if groups[-1] and (size_in_group + size > group_bytes or len(groups[-1]) >= group_files):
+                groups.append([])
+                size_in_group = 0
+            groups[-1].append((file_path, size))
+            size_in_group += size
+        return [group for group in groups if group]
+
+    def file_digest(self, side: str, relative_path: str, entry) -> str:
+        """
+        This function returns the digest of a file of one of the sides, reusing the one stored in the index while the
+        file is unchanged, and hashing the file otherwise.
+
+        Args:
+            side: str
+            relative_path: str
+            entry: ManifestEntry
+
+        Returns:
+            digest: str | None
+        """
+
+        if self.index is not None:
+            digest = self.index.lookup(side, relative_path, entry, self.digest_label)
+            if digest is not None:
+                return digest
+
+        digest = self.prepared_digests.get((side, relative_path))
+        if digest is not None:
+            return digest
+
+        file_path = self.side_path(side, relative_path)
+        if self.throttle is not None:
+            self.throttle.operation()
+        if side == DESTINY and self.replica is not None:
+            digest = self.replica.file_digest(relative_path, self.algorithm, self.throttle)
+        elif self.hasher is not None:
+            if self.throttle is not None:
+                self.throttle.transfer(entry.size)
+            digest = self.hasher.hash_files([(file_path, entry.size)]).get(file_path)
+        else:
+            digest = FileOperator.hash_file(file_path, self.logger, self.algorithm, throttle=self.throttle)
+        if digest is not None and self.report is not None and not (side == DESTINY and self.replica is not None):
+            self.report.record_hash(entry.size)
+        if digest is not None and self.index is not None:
+            self.index.store(side, relative_path, entry, self.digest_label, digest)
+        return digest
+
+    def is_same_file(self, relative_path: str, source_entry, destiny_entry) -> bool:
+        """
+        This function compares the source and destiny files of the passed relative path, using the manifest entries
+        collected while scanning for the metadata decisions.
+
+        Args:
+            relative_path: str
+            source_entry: ManifestEntry
+            destiny_entry: ManifestEntry
+
+        Returns:
+            bool
+        """
+
+        source_path = os.path.join(self.source_folder, relative_path)
+        destiny_path = os.path.join(self.destiny_folder, relative_path)
+
+        if self.policy == PARANOID and self.replica is not None:
+            source_digest = FileOperator.hash_file(source_path, self.logger, self.algorithm, throttle=self.throttle)
+            return source_digest is not None and source_digest == self.replica.file_digest(relative_path, self.algorithm)
+
+        if self.policy == PARANOID:
+            if self.throttle is not None:
+                self.throttle.operation()
+            return bool(FileOperator.compare_file_bytes(source_path, destiny_path, self.logger, throttle=self.throttle))
+
+        if not self.needs_digests(source_entry, destiny_entry):
+            return source_entry.size == destiny_entry.size
+
+        source_digest = self.file_digest(SOURCE, relative_path, source_entry)
+        destiny_digest = self.file_digest(DESTINY, relative_path, destiny_entry)
+        return source_digest is not None and source_digest == destiny_digest
@@ -0,0 +1,350 @@
+from utils.files import FileOperator, CopyResult, CHUNK_SIZE
+from typing import NamedTuple
+import shutil
+import zlib
+import os
+
+BLOCK_SIZE = 64 * 1024
+DEFAULT_DELTA_THRESHOLD = 64 * 1024 * 1024
+ADLER_MODULUS = 65521
+STRONG_DIGEST = "blake2b"
+# literal runs longer than this are closed, so the source window kept in memory stays bounded
+MAX_LITERAL = 16 * 1024 * 1024
+# the bytes matching no block are scanned one by one, far slower than a copy, so once a delta holds more literals than
+# this, or than this part of the file, the file is copied in full instead
+MAX_DELTA_LITERALS = 4 * 1024 * 1024
+MAX_LITERAL_RATIO = 0.5
+
+DELTA_IN_PLACE = "delta_in_place"
+DELTA_REBUILD = "delta_rebuild"
+
+
+class DeltaOperation(NamedTuple):
+    """
+    This class represents one instruction of a delta: `length` bytes of the target at `target_offset` come either from
+    the basis file at `basis_offset` (a matched block), or from the source file at the same offset (a literal, in which
+    case basis_offset is None).
+
+    Attributes:
+        target_offset: int
+        basis_offset: int | None
+        length: int
+    """
+
+    target_offset: int
+    basis_offset: int
+    length: int
+
+
+class DeltaTransfer:
+    """
+    This class has the method operations used to update a large replica file by writing only what changed, the same way
+    rsync does: the replica is split in blocks with a weak rolling checksum and a strong digest each, the source is
+    scanned with the rolling checksum to find the blocks it shares with the replica, and only the bytes of the source
+    that matched no block are written.
+
+    Attributes:
+        None
+    """
+
+    @staticmethod
+    def weak_checksum(block) -> int:
+        """
+        This function returns the weak checksum of a block. Adler-32 has the same structure as the rsync rolling
+        checksum, so whole blocks are summed by zlib in C and only the rolling steps run in Python.
+
+        Args:
+            block: bytes
+
+        Returns:
+            checksum: int
+        """
+
+        return zlib.adler32(block)
+
+    @staticmethod
+    def roll_checksum(checksum: int, outgoing: int, incoming: int, block_size: int) -> int:
+        """
+        This function moves the window of an Adler-32 checksum one byte forward, removing the outgoing byte and adding
+        the incoming one, without summing the whole block again.
+
+        Args:
+            checksum: int
+            outgoing: int
+            incoming: int
+            block_size: int
+
+        Returns:
+            checksum: int
+        """
+
+        a = checksum & 0xFFFF
+        b = checksum >> 16
+        a = (a - outgoing + incoming) % ADLER_MODULUS
+        b = (b - block_size * outgoing + a - 1) % ADLER_MODULUS
+        return (b << 16) | a
+
+    @staticmethod
+    def literal_budget(size: int) -> int:
+        return min(MAX_DELTA_LITERALS, int(size * MAX_LITERAL_RATIO))
+
+    @staticmethod
+    def strong_digest(block) -> bytes:
+        file_hash = FileOperator.new_digest(STRONG_DIGEST)
+        file_hash.update(block)
+        return file_hash.digest()
+
+    @staticmethod
+    def build_signature(basis_path: str, block_size: int = BLOCK_SIZE, throttle=None) -> dict:
+        """
+        This function splits the basis file in full blocks, and returns the table that maps the weak checksum of every
+        block to the strong digests and offsets of the blocks that have it.
+
+        Args:
+            basis_path: str
+            block_size: int
+            throttle: Throttle | None
+
+        Returns:
+            signature: dict
+        """
+
+        signature = {}
+        buffer = bytearray(block_size)
+        view = memoryview(buffer)
+        offset = 0
+        with open(basis_path, "rb", buffering=0) as basis_file:
+            while True:
+                read_size = FileOperator.read_chunk(basis_file, view)
+                if throttle is not None:
+                    throttle.transfer(read_size)
+                if read_size < block_size:
+                    break
+                signature.setdefault(DeltaTransfer.weak_checksum(view), []).append((DeltaTransfer.strong_digest(view), offset))
+                offset += block_size
+        return signature
+
+    @staticmethod
+    def compute_delta(source_path: str, signature: dict, block_size: int = BLOCK_SIZE, throttle=None,
+                      max_literal_bytes: int = None) -> list:
+        """
+        This function scans the source file with the rolling checksum, and returns the delta operations that rebuild
+        the source from the basis file the signature was built from. The literals only hold offsets in the source, so
+        the delta stays small whatever the amount of changed data.
+
+        Args:
+            source_path: str
+            signature: dict
+            block_size: int
+            throttle: Throttle | None
+            max_literal_bytes: int | None, the scan stops as soon as the literals go over it
+
+        Returns:
+            operations: list of DeltaOperation, merged when contiguous, or None when the literals went over
+            max_literal_bytes and the file is better copied in full
+        """
+
+        operations = []
+        literal_bytes = 0
+        if max_literal_bytes is None:
+            max_literal_bytes = float("inf")
+
+        def add(target_offset: int, basis_offset, length: int) -> None:
+            nonlocal literal_bytes
+            if length <= 0:
+                return
+            if basis_offset is None:
+                literal_bytes += length
+            if operations:
+                last = operations[-1]
+                contiguous_literal = basis_offset is None and last.basis_offset is None
+                contiguous_copy = (basis_offset is not None and last.basis_offset is not None
+                                   and last.basis_offset + last.length == basis_offset)
+                if last.target_offset + last.length == target_offset and (contiguous_literal or contiguous_copy):
+                    operations[-1] = last._replace(length=last.length + length)
+                    return
+            operations.append(DeltaOperation(target_offset, basis_offset, length))
+
+        with open(source_path, "rb") as source_file:
+            data = b""
+            base = 0              # offset in the source of data[0]
+            position = 0          # start of the window, relative to data
+            literal_start = 0     # start of the pending literal, relative to data
+            checksum = None
+            end_of_file = False
+
+            while True:
+                if len(data) - position < block_size and not end_of_file:
+                    # drop what was already emitted and read more of the source
+                    read_data = source_file.read(max(CHUNK_SIZE * 4, block_size))
+                    if throttle is not None:
+                        throttle.transfer(len(read_data))
+                    data = data[literal_start:] + read_data
+                    base += literal_start
+                    position -= literal_start
+                    literal_start = 0
+                    end_of_file = len(data) - position < block_size
+                    continue
+
+                if len(data) - position < block_size:
+                    add(base + literal_start, None, len(data) - literal_start)
+                    if literal_bytes > max_literal_bytes:
+                        return None
+                    break
+
+                if checksum is None:
+                    checksum = DeltaTransfer.weak_checksum(data[position:position + block_size])
+
+                match = None
+                candidates = signature.get(checksum)
+                if candidates:
+                    strong = DeltaTransfer.strong_digest(data[position:position + block_size])
+                    for candidate_strong, basis_offset in candidates:
+                        if candidate_strong == strong:
+                            match = basis_offset
+                            break
+
+                if match is not None:
+                    add(base + literal_start, None, position - literal_start)
+                    add(base + position, match, block_size)
+                    position += block_size
+                    literal_start = position
+                    checksum = None
+                    continue
+
+                if literal_bytes + position - literal_start > max_literal_bytes:
+                    return None
+                if position - literal_start >= MAX_LITERAL:
+                    add(base + literal_start, None, position - literal_start)
+                    literal_start = position
+
+                if position + block_size >= len(data):
+                    checksum = None
+                    position += 1
+                    continue
+
+                # the window rolls over the bytes that match no block in a tight loop, the same steps as roll_checksum
+                # inlined, until its weak checksum is one of the signature, the data read runs out, the literal has to
+                # be closed or the literal budget is spent
+                stop = min(len(data) - block_size, literal_start + MAX_LITERAL, literal_start + max_literal_bytes - literal_bytes + 1)
+                a = checksum & 0xFFFF
+                b = checksum >> 16
+                while position < stop:
+                    outgoing = data[position]
+                    a = (a - outgoing + data[position + block_size]) % ADLER_MODULUS
+                    b = (b - block_size * outgoing + a - 1) % ADLER_MODULUS
+                    position += 1
+                    if ((b << 16) | a) in signature:
+                        break
+                checksum = (b << 16) | a
+
+        return operations
+
+    @staticmethod
+    def apply_delta(source_path: str, basis_path: str, operations: list, throttle=None) -> CopyResult:
+        """
+        This function writes the target described by the delta over the basis file. When every matched block stays at
+        the same offset, which is the case for files modified in place, only the literals are written into the basis
+        file and it is truncated to the new size. Otherwise the target is rebuilt in a temporary file that replaces the
+        basis file once complete. Either way the data is flushed to disk before this returns, and the rename with it,
+        so the metadata copied afterwards never describes data that a crash could still lose.
+
+        Args:
+            source_path: str
+            basis_path: str
+            operations: list of DeltaOperation
+            throttle: Throttle | None
+
+        Returns:
+            CopyResult: the delta method used and the bytes actually written.
+        """
+
+        target_size = os.path.getsize(source_path)
+        in_place = all(operation.basis_offset in (None, operation.target_offset) for operation in operations)
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+
+        def write_range(from_file, to_file, from_offset: int, to_offset: int, length: int) -> int:
+            from_file.seek(from_offset)
+            to_file.seek(to_offset)
+            written = 0
+            while written < length:
+                read_size = FileOperator.read_chunk(from_file, view[:min(len(view), length - written)])
+                if not read_size:
+                    raise OSError(f"unexpected end of file while applying the delta of {source_path}")
+                if throttle is not None:
+                    throttle.transfer(read_size)
+                to_file.write(view[:read_size])
+                written += read_size
+            return written
+
+        with open(source_path, "rb", buffering=0) as source_file:
+            if in_place:
+                written = 0
+                with open(basis_path, "r+b") as basis_file:
+                    for operation in operations:
+                        if operation.basis_offset is None:
+                            written += write_range(source_file, basis_file, operation.target_offset, operation.target_offset, operation.length)
+                    basis_file.truncate(target_size)
+                    basis_file.flush()
+                    os.fsync(basis_file.fileno())
+                return CopyResult(DELTA_IN_PLACE, written)
+
+            temporary_path = os.path.join(os.path.dirname(basis_path), f".{os.path.basename(basis_path)}.syncfold-delta")
+            written = 0
+            try:
+                with open(basis_path, "rb", buffering=0) as basis_file, open(temporary_path, "wb") as target_file:
+                    for operation in operations:
+                        if operation.basis_offset is None:
+                            written += write_range(source_file, target_file, operation.target_offset, operation.target_offset, operation.length)
+                        else:
+                            written += write_range(basis_file, target_file, operation.basis_offset, operation.target_offset, operation.length)
+                    target_file.truncate(target_size)
+                    target_file.flush()
+                    os.fsync(target_file.fileno())
+                os.replace(temporary_path, basis_path)
+                FileOperator.fsync_directory(os.path.dirname(basis_path) or os.curdir)
+            except BaseException:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                raise
+            return CopyResult(DELTA_REBUILD, written)
+
+    @staticmethod
+    def update_file(source_path: str, destiny_path: str, logger, block_size: int = BLOCK_SIZE, throttle=None) -> CopyResult:
+        """
+        This function updates an existing replica file from its source writing only the changed blocks, and preserves
+        the metadata of the source like replicate_file does.
+
+        Args:
+            source_path: str
+            destiny_path: str
+            logger: logger
+            block_size: int
+            throttle: Throttle | None, the bytes read and written are taken from its bytes budget
+
+        Returns:
+            CopyResult: the delta method used and the bytes written, or None when an error was logged instead, or when
+            too much of the file changed for a delta to pay off.
+
+        Raises:
+            Exception: Any exception is logged, and None is returned so the caller can fall back to a full copy.
+        """
+
+        try:
+            logger.debug(f"start delta update: {source_path} - {destiny_path}")
+            signature = DeltaTransfer.build_signature(destiny_path, block_size, throttle)
+            operations = DeltaTransfer.compute_delta(source_path, signature, block_size, throttle,
+                                                     DeltaTransfer.literal_budget(os.path.getsize(source_path)))
+            if operations is None:
+                logger.debug(f"too much of {source_path} changed for a delta update, copying it in full")
+                return None
+            result = DeltaTransfer.apply_delta(source_path, destiny_path, operations, throttle)
+            shutil.copystat(source_path, destiny_path)
+            literal_bytes = sum(operation.length for operation in operations if operation.basis_offset is None)
+            logger.debug(f"file updated with delta! ({result.method}, {literal_bytes} changed bytes, {result.bytes_copied} bytes written)")
+            return result
+        except Exception as e:
+            logger.error(f"ERROR: delta update failed: {source_path} - {destiny_path}")
+            logger.error(f"{type(e).__name__} - {e}")
+            return None
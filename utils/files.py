@@ -1,7 +1,51 @@
+from utils.journal import JournalEntry
+from typing import NamedTuple
 import hashlib
 import shutil
+import errno
 import os
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_DIGEST = "blake2b"
+DIGEST_ALGORITHMS = ("blake2b", "md5", "sha256") + (("xxh3",) if xxhash is not None else ())
+
+# ioctl request number of FICLONE on Linux, which makes the destiny share the extents of the source on btrfs and XFS
+FICLONE = 0x40049409
+# errors meaning a copy method is not supported for this pair of files, so the next method has to be tried
+UNSUPPORTED_COPY_ERRORS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EPERM)
+
+# an interrupted copy can be resumed from the last multiple of this size flushed to disk
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+TEMPORARY_SUFFIX = ".syncfold-part"
+
+REFLINK = "reflink"
+COPY_FILE_RANGE = "copy_file_range"
+SENDFILE = "sendfile"
+BUFFERED = "buffered"
+
+
+class CopyResult(NamedTuple):
+    """
+    This class represents the outcome of a file replication: the copy method that was used and the bytes it moved.
+
+    Attributes:
+        method: str
+        bytes_copied: int
+    """
+
+    method: str
+    bytes_copied: int
+
 
 class FileOperator:
     """
@@ -13,17 +57,27 @@ class FileOperator:
     """
 
     @staticmethod
-    def replicate_file(source_path: str, destiny_path: str, logger) -> None:
+    def replicate_file(source_path: str, destiny_path: str, logger, throttle=None, journal=None) -> CopyResult:
         """
         This function takes in the source file and replicates/copies it to the destiny path, passed in the paramethers.
+        The data is copied by the kernel whenever possible, trying in order a FICLONE reflink, os.copy_file_range,
+        os.sendfile and finally a buffered copy, and the metadata is then preserved the same way shutil.copy2 does.
+
+        The data is written to a hidden temporary file next to the target, flushed to disk and renamed over the target
+        once complete, so the target is never left truncated nor holding data that did not reach the disk. With a
+        journal, the copies of at least CHECKPOINT_BYTES are recorded while in flight together with the offset the
+        temporary file was flushed up to, and a copy interrupted after a checkpoint resumes from there. The smaller ones
+        could never resume, so they are not journaled.
 
         Args:
             source_path: str
             destiny_path: str
             logger: logger
+            throttle: Throttle | None
+            journal: OperationJournal | None
         
         Returns:
-            None
+            CopyResult: the copy method used and the bytes moved, or None when an error was logged instead.
 
         Raises:
            FileNotFoundError: When the source file path passed is not found or inexistent in the disk
@@ -35,12 +89,47 @@ class FileOperator:
         """
         
         try:
-            logger.info(f"start file replication: {source_path} - {destiny_path}")
+            logger.debug(f"start file replication: {source_path} - {destiny_path}")
             destiny_path = os.path.dirname(destiny_path)
             os.makedirs(destiny_path, exist_ok=True)
 
-            shutil.copy2(source_path, destiny_path)
-            logger.info("file replicated successfully!")
+            target_path = os.path.join(destiny_path, os.path.basename(source_path))
+            if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+                raise shutil.SameFileError(f"{source_path} and {target_path} are the same file")
+
+            temporary_path = FileOperator.temporary_path(target_path)
+            source_stat = os.stat(source_path)
+            offset = 0
+            checkpoint = None
+            if journal is not None and source_stat.st_size < CHECKPOINT_BYTES:
+                journal = None
+            if journal is not None:
+                entry = journal.entry(target_path)
+                if entry is not None and entry[1:5] == (source_path, temporary_path, source_stat.st_size, source_stat.st_mtime_ns):
+                    offset = FileOperator.resume_offset(source_path, temporary_path, entry.verified_offset)
+                    if offset:
+                        logger.info(f"resuming the interrupted copy of {target_path} from byte {offset}")
+                journal.begin(JournalEntry(target_path, source_path, temporary_path, source_stat.st_size, source_stat.st_mtime_ns, offset))
+                checkpoint = lambda verified_offset: journal.checkpoint(target_path, verified_offset)
+
+            try:
+                result = FileOperator.copy_file_data(source_path, temporary_path, throttle, offset, checkpoint)
+                shutil.copystat(source_path, temporary_path)
+                os.replace(temporary_path, target_path)
+                FileOperator.fsync_directory(destiny_path)
+            except BaseException:
+                # a temporary file flushed up to a checkpoint is kept, so the next attempt resumes from there
+                entry = journal.entry(target_path) if journal is not None else None
+                if entry is None or not entry.verified_offset:
+                    if os.path.exists(temporary_path):
+                        os.remove(temporary_path)
+                    if journal is not None:
+                        journal.finish(target_path)
+                raise
+            if journal is not None:
+                journal.finish(target_path)
+            logger.debug(f"file replicated successfully! ({result.method}, {result.bytes_copied} bytes)")
+            return result
         except FileNotFoundError as e:
             logger.error(f"ERROR: specified source file for copy was not found: {source_path}")
             logger.error(f"{e}")
@@ -60,50 +149,469 @@ class FileOperator:
             logger.error("ERROR: unknown exception occured.")
             logger.error(f"{e}")
 
+        return None
+
+    @staticmethod
+    def fsync_directory(directory_path: str) -> None:
+        # makes a rename in the directory durable, on the platforms where directories can be opened and synced
+        try:
+            directory_fd = os.open(directory_path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(directory_fd)
+        except OSError:
+            pass
+        finally:
+            os.close(directory_fd)
+
+    @staticmethod
+    def temporary_path(target_path: str) -> str:
+        folder, name = os.path.split(target_path)
+        return os.path.join(folder, f".{name}{TEMPORARY_SUFFIX}")
+
     @staticmethod
-    def compare_file(source_path: str, destiny_path: str, logger) -> None:
+    def resume_offset(source_path: str, temporary_path: str, verified_offset: int) -> int:
         """
-        This function takes in two files paths, and compares two generate hashes using the MD5 algorithm, checking if the two files are equal.
+        This function returns the offset an interrupted copy can resume from: the verified offset recorded in the
+        journal, as long as the temporary file still holds that many bytes and the last chunk before the offset matches
+        the source, or 0 when the copy has to start over.
+
+        Args:
+            source_path: str
+            temporary_path: str
+            verified_offset: int
+
+        Returns:
+            offset: int
+        """
+
+        try:
+            if verified_offset <= 0 or os.path.getsize(temporary_path) < verified_offset:
+                return 0
+            length = min(CHUNK_SIZE, verified_offset)
+            with open(source_path, "rb") as source_file, open(temporary_path, "rb") as temporary_file:
+                source_file.seek(verified_offset - length)
+                temporary_file.seek(verified_offset - length)
+                if source_file.read(length) != temporary_file.read(length):
+                    return 0
+            return verified_offset
+        except OSError:
+            return 0
+
+    @staticmethod
+    def copy_file_data(source_path: str, target_path: str, throttle=None, offset: int = 0, checkpoint=None) -> CopyResult:
+        """
+        This function copies the content of the source file into the target path, using the first copy method, from the
+        cheapest to the most expensive, that works for the pair of files. A method is only abandoned if it fails before
+        moving any byte, otherwise its error is raised.
+
+        With a throttle, the data is moved in smaller chunks, each one taken from the bytes budget before it's copied.
+        A reflink moves no data, so it's not throttled.
+
+        With an offset, the target is kept up to that offset and only the rest of the source is copied. With a
+        checkpoint callback, the target is flushed to disk every CHECKPOINT_BYTES, and the callback is called with the
+        offset flushed up to. The target is always flushed to disk before returning.
+
+        A source that gets shorter while it's copied makes the copy fail, instead of the missing end of the target being
+        filled with zeros up to the size the source had, so the file is copied again by the next cycle.
+
+        Args:
+            source_path: str
+            target_path: str
+            throttle: Throttle | None
+            offset: int
+            checkpoint: callable(verified_offset) | None
+
+        Returns:
+            CopyResult: the copy method used and the bytes moved, without the ones kept from the offset.
+
+        Raises:
+            OSError: When the copy fails after it started moving data, or the source ends before the size it had.
+        """
+
+        def shrunk() -> OSError:
+            return OSError(f"{source_path} got shorter while it was copied")
+
+        with open(source_path, "rb", buffering=0) as source_file, open(target_path, "r+b" if offset else "wb", buffering=0) as target_file:
+            source_fd = source_file.fileno()
+            target_fd = target_file.fileno()
+            size = os.fstat(source_fd).st_size
+            last_checkpoint = offset
+
+            def flush(position: int) -> int:
+                if checkpoint is None or position - last_checkpoint < CHECKPOINT_BYTES:
+                    return last_checkpoint
+                os.fsync(target_fd)
+                checkpoint(position)
+                return position
+
+            if offset:
+                target_file.truncate(offset)
+            elif fcntl is not None:
+                try:
+                    fcntl.ioctl(target_fd, FICLONE, source_fd)
+                    os.fsync(target_fd)
+                    return CopyResult(REFLINK, size)
+                except OSError as e:
+                    if e.errno not in UNSUPPORTED_COPY_ERRORS:
+                        raise
+
+            # only the data extents are copied, the holes are left unwritten and the target is extended to the source
+            # size at the end, so a sparse source stays sparse in the replica
+            extents = FileOperator.data_extents(source_fd, offset, size)
+
+            kernel_chunk_size = throttle.chunk_size(CHUNK_SIZE * 64) if throttle is not None else CHUNK_SIZE * 64
+            result = None
+            for method, copy_chunk in ((COPY_FILE_RANGE, getattr(os, "copy_file_range", None)), (SENDFILE, getattr(os, "sendfile", None))):
+                if copy_chunk is None:
+                    continue
+                copied = 0
+                try:
+                    for start, end in extents:
+                        os.lseek(source_fd, start, os.SEEK_SET)
+                        os.lseek(target_fd, start, os.SEEK_SET)
+                        position = start
+                        while position < end:
+                            count = min(kernel_chunk_size, end - position)
+                            if throttle is not None:
+                                throttle.transfer(count)
+                            if method == COPY_FILE_RANGE:
+                                sent = copy_chunk(source_fd, target_fd, count)
+                            else:
+                                sent = copy_chunk(target_fd, source_fd, position, count)
+                            if not sent:
+                                raise shrunk()
+                            copied += sent
+                            position += sent
+                            last_checkpoint = flush(position)
+                    result = CopyResult(method, copied)
+                    break
+                except OSError as e:
+                    if copied or e.errno not in UNSUPPORTED_COPY_ERRORS:
+                        raise
+
+            if result is None:
+                copied = 0
+                buffer = bytearray(throttle.chunk_size(CHUNK_SIZE) if throttle is not None else CHUNK_SIZE)
+                view = memoryview(buffer)
+                for start, end in extents:
+                    source_file.seek(start)
+                    target_file.seek(start)
+                    position = start
+                    while position < end:
+                        read_size = FileOperator.read_chunk(source_file, view[:min(len(view), end - position)])
+                        if not read_size:
+                            raise shrunk()
+                        if throttle is not None:
+                            throttle.transfer(read_size)
+                        written = 0
+                        while written < read_size:
+                            written += target_file.write(view[written:read_size])
+                        copied += read_size
+                        position += read_size
+                        last_checkpoint = flush(position)
+                result = CopyResult(BUFFERED, copied)
+
+            if os.fstat(target_fd).st_size < size:
+                os.ftruncate(target_fd, size)
+            os.fsync(target_fd)
+            return result
+
+    @staticmethod
+    def data_extents(file_descriptor: int, start: int, end: int) -> list:
+        """
+        This function returns the ranges of the file between start and end that hold data, found with SEEK_DATA and
+        SEEK_HOLE, so the holes of a sparse file are never read. When the platform or the file system does not report
+        holes, the whole range is returned as a single extent. The position of the file descriptor is moved.
+
+        Args:
+            file_descriptor: int
+            start: int
+            end: int
+
+        Returns:
+            extents: list of (start, end) tuples, sorted and not overlapping
+        """
+
+        if start >= end:
+            return []
+        if not hasattr(os, "SEEK_DATA"):
+            return [(start, end)]
+
+        extents = []
+        position = start
+        try:
+            while position < end:
+                try:
+                    data_start = os.lseek(file_descriptor, position, os.SEEK_DATA)
+                except OSError as e:
+                    # ENXIO means there is no data after the position, only a hole up to the end of the file
+                    if e.errno == errno.ENXIO:
+                        break
+                    raise
+                if data_start >= end:
+                    break
+                data_end = min(os.lseek(file_descriptor, data_start, os.SEEK_HOLE), end)
+                extents.append((data_start, data_end))
+                position = data_end
+        except OSError as e:
+            if e.errno in (errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY):
+                return [(start, end)]
+            raise
+        return extents
+
+    @staticmethod
+    def merge_extents(*extent_lists: list) -> list:
+        merged = []
+        for start, end in sorted(extent for extents in extent_lists for extent in extents):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def compare_file(source_path: str, destiny_path: str, logger, algorithm: str = DEFAULT_DIGEST) -> bool:
+        """
+        This function takes in two files paths, and checks if the two files are equal. Files with different sizes are
+        reported as different right away, otherwise both files are hashed while streamed in fixed size chunks.
 
         Args:
             source_path: str
             destiny_path: str
             logger: logger
+            algorithm: str
 
         Returns:
-            None
+            bool
         
         Raises:
             FileNotFoundError: When the source file path passed is not found or inexistent in the disk
             PermissionError: When the current user used to run the program does not have enough permissions to copy files from source folder to destiny folder. 
-            UnicodeDecodeError: This exception happens when the decoding process fails.
             TypeError: When there's an error with the format string passed as a path, for source and or for destiny path.
             Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged.
         """
         try:
-            logger.info(f"starting comparison of two files: {source_path} - {destiny_path}")
-            with open(source_path, "rb") as source_file:
-                source_file_data = source_file.read()
-                source_file_md5 = hashlib.md5(source_file_data).hexdigest()
+            logger.debug(f"starting comparison of two files: {source_path} - {destiny_path}")
+            if os.path.getsize(source_path) != os.path.getsize(destiny_path):
+                logger.debug("comparison operation successfull!")
+                return False
 
-            with open(destiny_path, "rb") as destiny_file:
-                destiny_file_data = destiny_file.read()
-                destiny_file_md5 = hashlib.md5(destiny_file_data).hexdigest()
+            source_digest = FileOperator.hash_file(source_path, logger, algorithm)
+            destiny_digest = FileOperator.hash_file(destiny_path, logger, algorithm)
 
-            logger.info("comparison operation successfull!")
-            return (source_file_md5 == destiny_file_md5)
+            logger.debug("comparison operation successfull!")
+            return source_digest is not None and source_digest == destiny_digest
         except FileNotFoundError as e:
             logger.error(f"ERROR: specified source file for copy was not found: {source_path}")
             logger.error(f"{e}")
         except PermissionError as e:
             logger.error(f"ERROR: os user does not have the permissions to open the files.")
             logger.error(f"{e}")
-        except UnicodeDecodeError as u:
-            logger.error(f"ERROR: there was an error decoding the files.")
-            logger.error(f"{e}")
-        except IsADirectoryError as d:
+        except IsADirectoryError as e:
             logger.error("ERROR: the path passed for source is a directory, not a file.")
             logger.error(f"{e}")
         except Exception as e:
             logger.error("ERROR: unknown exception occured.")
             logger.error(f"{e}")
+
+    @staticmethod
+    def new_digest(algorithm: str = DEFAULT_DIGEST):
+        """
+        This function returns a new hash object for one of the supported digest algorithms. xxh3 is a non
+        cryptographic hash only available when the optional xxhash package is installed.
+
+        Args:
+            algorithm: str
+
+        Returns:
+            hash object
+
+        Raises:
+            ValueError: When the algorithm is not one of the supported ones.
+        """
+
+        if algorithm == "xxh3" and xxhash is not None:
+            return xxhash.xxh3_128()
+        if algorithm in ("blake2b", "md5", "sha256"):
+            return hashlib.new(algorithm)
+        raise ValueError(f"Unsupported digest algorithm: {algorithm}. Expected one of {', '.join(DIGEST_ALGORITHMS)}.")
+
+    @staticmethod
+    def hash_file(file_path: str, logger, algorithm: str = DEFAULT_DIGEST, chunk_size: int = CHUNK_SIZE, throttle=None) -> str:
+        """
+        This function takes in a file path and returns the hex digest of its content, streaming the file in fixed size
+        chunks, so the memory used does not depend on the file size. Only the data extents are read, see update_digest.
+
+        Args:
+            file_path: str
+            logger: logger
+            algorithm: str
+            chunk_size: int
+            throttle: Throttle | None, every chunk read is taken from its bytes budget
+
+        Returns:
+            digest: str
+
+        Raises:
+            FileNotFoundError: When the file path passed is not found or inexistent in the disk
+            PermissionError: When the current user used to run the program does not have enough permissions to open the file.
+            Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged.
+        """
+        try:
+            file_hash = FileOperator.new_digest(algorithm)
+            with open(file_path, "rb", buffering=0) as file:
+                FileOperator.update_digest(file_hash, file, 0, os.fstat(file.fileno()).st_size, chunk_size, throttle)
+            return file_hash.hexdigest()
+        except FileNotFoundError as e:
+            logger.error(f"ERROR: specified file for hashing was not found: {file_path}")
+            logger.error(f"{e}")
+        except PermissionError as e:
+            logger.error(f"ERROR: os user does not have the permissions to open the file.")
+            logger.error(f"{e}")
+        except Exception as e:
+            logger.error("ERROR: unknown exception occured.")
+            logger.error(f"{e}")
+
+    @staticmethod
+    def update_digest(file_hash, file, offset: int, length: int, chunk_size: int = CHUNK_SIZE, throttle=None) -> None:
+        """
+        This function feeds `length` bytes of the open file, starting at `offset`, to the passed hash object. Only the
+        data extents are read from the disk: the holes are fed as zeros from a buffer in memory, so the digest of a
+        sparse file is the same as the one of the same content written out in full. The data is read through one reused
+        buffer, never through a memory mapping, so a file truncated by another program while it is read only ends the
+        digest early, instead of killing the process with SIGBUS.
+
+        Args:
+            file_hash: hash object
+            file: file object opened in binary mode, without buffering
+            offset: int
+            length: int
+            chunk_size: int
+            throttle: Throttle | None, every chunk read is taken from its bytes budget
+
+        Returns:
+            None
+        """
+
+        file_descriptor = file.fileno()
+        size = os.fstat(file_descriptor).st_size
+        end = min(offset + length, size)
+        extents = FileOperator.data_extents(file_descriptor, offset, end)
+        zeros = memoryview(bytes(min(chunk_size, max(end - offset, 1))))
+
+        def update_zeros(count: int) -> None:
+            while count > 0:
+                file_hash.update(zeros[:min(len(zeros), count)])
+                count -= len(zeros)
+
+        position = offset
+        buffer = bytearray(min(chunk_size, max(end - offset, 1)))
+        view = memoryview(buffer)
+        for start, stop in extents:
+            update_zeros(start - position)
+            file.seek(start)
+            position = start
+            while position < stop:
+                read_size = FileOperator.read_chunk(file, view[:min(len(view), stop - position)])
+                # the file was truncated since its size was taken
+                if not read_size:
+                    return
+                if throttle is not None:
+                    throttle.transfer(read_size)
+                file_hash.update(view[:read_size])
+                position += read_size
+        update_zeros(end - position)
+
+    @staticmethod
+    def read_chunk(file, view: memoryview) -> int:
+        """
+        This function fills the passed buffer view from the file with readinto, retrying short reads, and returns the
+        number of bytes read, which is only smaller than the buffer at the end of the file.
+
+        Args:
+            file: file object opened in binary mode
+            view: memoryview
+
+        Returns:
+            read_size: int
+        """
+
+        read_size = 0
+        while read_size < len(view):
+            size = file.readinto(view[read_size:])
+            if not size:
+                break
+            read_size += size
+        return read_size
+
+    @staticmethod
+    def compare_file_bytes(source_path: str, destiny_path: str, logger, chunk_size: int = CHUNK_SIZE, throttle=None) -> bool:
+        """
+        This function takes in two files paths, and compares their content byte by byte, reporting different sizes right away
+        and stopping at the first chunk that differs. The ranges that are a hole in both files are skipped. Both files are
+        read through reused buffers, so one truncated by another program during the comparison is reported as different
+        instead of killing the process with SIGBUS, as a memory mapping would.
+
+        Args:
+            source_path: str
+            destiny_path: str
+            logger: logger
+            chunk_size: int
+            throttle: Throttle | None, the chunks read from both files are taken from its bytes budget
+
+        Returns:
+            bool
+
+        Raises:
+            FileNotFoundError: When one of the file paths passed is not found or inexistent in the disk
+            PermissionError: When the current user used to run the program does not have enough permissions to open the files.
+            Exception: Any other exception not expecified throught the except blocks specificly will be thrown freely and logged.
+        """
+        try:
+            logger.debug(f"starting byte comparison of two files: {source_path} - {destiny_path}")
+            if os.path.getsize(source_path) != os.path.getsize(destiny_path):
+                return False
+
+            with open(source_path, "rb", buffering=0) as source_file, open(destiny_path, "rb", buffering=0) as destiny_file:
+                source_fd = source_file.fileno()
+                destiny_fd = destiny_file.fileno()
+                size = os.fstat(source_fd).st_size
+                # the ranges that are a hole in both files are equal without reading them
+                extents = FileOperator.merge_extents(FileOperator.data_extents(source_fd, 0, size),
+                                                     FileOperator.data_extents(destiny_fd, 0, size))
+
+                source_buffer = bytearray(chunk_size)
+                destiny_buffer = bytearray(chunk_size)
+                source_view = memoryview(source_buffer)
+                destiny_view = memoryview(destiny_buffer)
+                for start, end in extents:
+                    source_file.seek(start)
+                    destiny_file.seek(start)
+                    position = start
+                    while position < end:
+                        read_length = min(chunk_size, end - position)
+                        source_size = FileOperator.read_chunk(source_file, source_view[:read_length])
+                        destiny_size = FileOperator.read_chunk(destiny_file, destiny_view[:read_length])
+                        if throttle is not None:
+                            throttle.transfer(source_size + destiny_size)
+                        if source_size != read_length or destiny_size != read_length:
+                            return False
+                        # comparing the bytearrays is a memcmp, comparing memoryviews goes byte by byte
+                        if read_length == chunk_size:
+                            if source_buffer != destiny_buffer:
+                                return False
+                        elif source_buffer[:read_length] != destiny_buffer[:read_length]:
+                            return False
+                        position += read_length
+                return True
+        except FileNotFoundError as e:
+            logger.error(f"ERROR: specified file for comparison was not found: {source_path} - {destiny_path}")
+            logger.error(f"{e}")
+        except PermissionError as e:
+            logger.error(f"ERROR: os user does not have the permissions to open the files.")
+            logger.error(f"{e}")
+        except Exception as e:
+            logger.error("ERROR: unknown exception occured.")
+            logger.error(f"{e}")
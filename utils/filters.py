@@ -0,0 +1,209 @@
+from typing import NamedTuple
+import re
+import os
+
+
+class FilterRule(NamedTuple):
+    """
+    This class represents one line of a filter file, translated to a regular expression matched against the whole
+    relative path of an entry, with "/" as separator.
+
+    Attributes:
+        pattern: str, the line it comes from
+        regex: str
+        negated: bool, the line started with "!", so the entries it matches are included back
+        directory_only: bool, the line ended with "/", so it only matches directories
+    """
+
+    pattern: str
+    regex: str
+    negated: bool
+    directory_only: bool
+
+
+class PathFilter:
+    """
+    This class represents a set of include and exclude rules written with the gitignore syntax, compiled once into a
+    few regular expressions so every path is matched with one regex search per run of rules of the same kind.
+
+    - blank lines and lines starting with "#" are ignored
+    - a line starting with "!" includes back what a previous line excluded
+    - a line ending with "/" only matches directories
+    - a line with a "/" at the start or in the middle is matched from the root of the tree, otherwise it matches the
+      name of an entry at any depth
+    - "*" matches anything but "/", "?" one character but "/", "[...]" one character of the class, and "**" any number
+      of directories
+
+    As with gitignore, the last rule matching a path decides, and nothing inside an excluded directory can be included
+    back, since the scanner never enters it.
+
+    Attributes:
+        rules: list of FilterRule
+    """
+
+    def __init__(self, patterns: list = None):
+        self.rules = [rule for rule in map(PathFilter.translate, patterns or []) if rule is not None]
+        self.compile()
+
+    @staticmethod
+    def from_file(file_path: str, patterns: list = None):
+        """
+        This function loads the rules of a filter file, followed by the extra patterns passed, which take precedence
+        since they come last.
+
+        Args:
+            file_path: str
+            patterns: list | None
+
+        Returns:
+            PathFilter
+
+        Raises:
+            OSError: When the filter file could not be read.
+        """
+
+        with open(file_path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        return PathFilter(lines + list(patterns or []))
+
+    def compile(self) -> None:
+        """
+        This function joins every run of consecutive rules of the same kind, exclude or include, into one regular
+        expression for the files and one for the directories, so matching a path costs one search per run instead of
+        one per rule.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        self.groups = []
+        for rule in self.rules:
+            if not self.groups or self.groups[-1][0] != rule.negated:
+                self.groups.append((rule.negated, [], []))
+            _, file_regexes, directory_regexes = self.groups[-1]
+            directory_regexes.append(rule.regex)
+            if not rule.directory_only:
+                file_regexes.append(rule.regex)
+
+        join = lambda regexes: re.compile("(?:" + "|".join(regexes) + r")\Z", re.DOTALL) if regexes else None
+        self.groups = [(negated, join(file_regexes), join(directory_regexes))
+                       for negated, file_regexes, directory_regexes in reversed(self.groups)]
+
+    def is_excluded(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        This function tells if the entry at the passed relative path is excluded by the rules. Only the path itself is
+        matched, not its parent directories, which the scanner already left out when they are excluded.
+
+        Args:
+            relative_path: str
+            is_dir: bool
+
+        Returns:
+            bool
+        """
+
+        if os.sep != "/":
+            relative_path = relative_path.replace(os.sep, "/")
+        for negated, file_regex, directory_regex in self.groups:
+            regex = directory_regex if is_dir else file_regex
+            if regex is not None and regex.match(relative_path):
+                return not negated
+        return False
+
+    def is_inside_excluded(self, relative_path: str) -> bool:
+        """
+        This function tells if the passed relative directory, or any of its parents, is excluded by the rules, for the
+        paths that are reached without walking the tree from its root.
+
+        Args:
+            relative_path: str
+
+        Returns:
+            bool
+        """
+
+        parts = relative_path.split(os.sep) if relative_path else []
+        for depth in range(1, len(parts) + 1):
+            if self.is_excluded(os.sep.join(parts[:depth]), True):
+                return True
+        return False
+
+    @staticmethod
+    def translate(pattern: str):
+        """
+        This function translates one line with the gitignore syntax to a FilterRule.
+
+        Args:
+            pattern: str
+
+        Returns:
+            FilterRule, or None for blank lines and comments
+
+        Raises:
+            ValueError: When the line does not hold any pattern, like a lone "!" or "/".
+        """
+
+        line = pattern.rstrip("\n\r")
+        # trailing spaces are ignored unless escaped
+        while line.endswith(" ") and not line.endswith("\\ "):
+            line = line[:-1]
+        if not line or line.startswith("#"):
+            return None
+
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+
+        directory_only = line.endswith("/") and not line.endswith("\\/")
+        line = line.rstrip("/") if directory_only else line
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            raise ValueError(f"Invalid filter pattern: {pattern!r}.")
+
+        regex = []
+        position = 0
+        while position < len(line):
+            character = line[position]
+            if line.startswith("**", position):
+                at_start = position == 0 or line[position - 1] == "/"
+                if at_start and line.startswith("**/", position):
+                    regex.append("(?:.*/)?")
+                    position += 3
+                    continue
+                if at_start and position + 2 == len(line):
+                    regex.append(".*")
+                    position += 2
+                    continue
+                regex.append("[^/]*")
+                position += 2
+                continue
+            if character == "*":
+                regex.append("[^/]*")
+            elif character == "?":
+                regex.append("[^/]")
+            elif character == "[":
+                end = line.find("]", position + 2 if line.startswith("[!", position) or line.startswith("[^", position) else position + 1)
+                if end == -1:
+                    regex.append(re.escape(character))
+                else:
+                    members = line[position + 1:end]
+                    negated_class = members[:1] in ("!", "^")
+                    members = members[1:] if negated_class else members
+                    members = members.replace("\\", "\\\\")
+                    regex.append(f"[{'^/' if negated_class else ''}{members}]")
+                    position = end
+            elif character == "\\" and position + 1 < len(line):
+                position += 1
+                regex.append(re.escape(line[position]))
+            else:
+                regex.append(re.escape(character))
+            position += 1
+
+        prefix = "" if anchored else "(?:.*/)?"
+        return FilterRule(pattern, prefix + "".join(regex), negated, directory_only)
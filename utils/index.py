@@ -0,0 +1,317 @@
+import threading
+import sqlite3
+import os
+
+SOURCE = "source"
+DESTINY = "destiny"
+
+# sorts the stored paths the way TreeScanner.walk yields them: the separator sorts before any character of a name, so
+# comparing the strings compares the paths component by component
+WALK_ORDER = f"replace(path, '{os.sep}', char(0))"
+# stored paths read, and stale ones deleted, at once while a walk prunes the index
+PRUNE_PAGE = 1000
+
+
+class HashIndex:
+    """
+    This class represents the persistent index of file digests, kept in a SQLite database so the digests computed
+    in one cycle are reused by the next cycles, and by the next runs of the program after a restart.
+
+    A stored digest is only reused while the (size, mtime_ns, inode) tuple of the file is the same one recorded with it,
+    so any change to the file makes its digest be computed again. The database runs in WAL mode and every cycle is
+    committed as one transaction, so a crash in the middle of a cycle leaves the index as it was in the previous one.
+
+    The index also keeps, for the directories that were in sync in the last cycle, their mtime and Merkle digests,
+    which is what allows a scan to skip the files of the directories that did not change since.
+
+    Attributes:
+        index_path: str
+        logger: logger
+    """
+
+    def __init__(self, index_path: str, logger):
+        self.index_path = index_path
+        self.logger = logger
+        self.lock = threading.Lock()
+
+        index_folder = os.path.dirname(os.path.abspath(index_path))
+        os.makedirs(index_folder, exist_ok=True)
+
+        self.connection = sqlite3.connect(index_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                side TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (side, path)
+            )
+            """
+        )
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS entries_walk_order ON entries (side, {WALK_ORDER})")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS directories (
+                side TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                files_digest TEXT NOT NULL,
+                rollup TEXT NOT NULL,
+                PRIMARY KEY (side, path)
+            )
+            """
+        )
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def default_path(destiny_folder: str) -> str:
+        """
+        This function returns the default location of the index for a replica folder, a hidden file next to the replica,
+        so the index itself is never scanned as part of the replica.
+
+        Args:
+            destiny_folder: str
+
+        Returns:
+            index_path: str
+        """
+
+        destiny_folder = os.path.abspath(destiny_folder)
+        parent_folder, folder_name = os.path.split(destiny_folder.rstrip(os.sep))
+        return os.path.join(parent_folder, f".{folder_name}.syncfold-index.sqlite")
+
+    def lookup(self, side: str, path: str, entry, algorithm: str):
+        """
+        This function returns the stored digest of a file, or None when there's no digest for it or the file changed
+        since the digest was stored.
+
+        Args:
+            side: str
+            path: str
+            entry: ManifestEntry
+            algorithm: str
+
+        Returns:
+            digest: str | None
+        """
+
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, inode, algorithm, digest FROM entries WHERE side = ? AND path = ?",
+                (side, path),
+            ).fetchone()
+
+        if row is None:
+            return None
+        if (row[0], row[1], row[2], row[3]) != (entry.size, entry.mtime_ns, entry.inode, algorithm):
+            return None
+        return row[4]
+
+    def stored_entry(self, side: str, path: str):
+        """
+        This function returns what was stored for a path, whether or not the file still matches it, which is used to
+        recognize a file by its previous inode after it was moved.
+
+        Args:
+            side: str
+            path: str
+
+        Returns:
+            (size, mtime_ns, inode, algorithm, digest): tuple | None
+        """
+
+        with self.lock:
+            return self.connection.execute(
+                "SELECT size, mtime_ns, inode, algorithm, digest FROM entries WHERE side = ? AND path = ?",
+                (side, path),
+            ).fetchone()
+
+    def store(self, side: str, path: str, entry, algorithm: str, digest: str) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (side, path, size, mtime_ns, inode, algorithm, digest) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (side, path, entry.size, entry.mtime_ns, entry.inode, algorithm, digest),
+            )
+
+    def forget(self, side: str, path: str) -> None:
+        """
+        This function removes the stored digest of a path, and of every path below it when the path is a directory.
+
+        Args:
+            side: str
+            path: str
+
+        Returns:
+            None
+        """
+
+        prefix = path + os.sep
+        with self.lock:
+            self.connection.execute(
+                "DELETE FROM entries WHERE side = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+                (side, path, len(prefix), prefix),
+            )
+
+    def prune(self, side: str, manifest: dict) -> None:
+        """
+        This function removes the stored digests of the paths that are no longer present in the passed manifest.
+
+        Args:
+            side: str
+            manifest: dict
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            stored_paths = [row[0] for row in self.connection.execute("SELECT path FROM entries WHERE side = ?", (side,))]
+            self.connection.executemany(
+                "DELETE FROM entries WHERE side = ? AND path = ?",
+                [(side, path) for path in stored_paths if path not in manifest],
+            )
+
+    def prune_walk(self, side: str, entries):
+        """
+        This function passes through the (relative_path, ManifestEntry) tuples of a walk sorted the way
+        TreeScanner.walk yields them, and removes the stored digests of the paths the walk goes past without finding,
+        by reading the stored paths a page at a time in the same order. Neither the walked nor the stored paths are
+        kept, so the memory used does not depend on the number of files. The paths stored after the last one walked
+        are only removed once the walk is complete.
+
+        Args:
+            side: str
+            entries: iterable of (relative_path, ManifestEntry) tuples
+
+        Yields:
+            (relative_path, entry): tuple
+        """
+
+        stored_paths = self.paths_in_walk_order(side)
+        stored_path = next(stored_paths, None)
+        stale_paths = []
+
+        def remove_stale() -> None:
+            with self.lock:
+                self.connection.executemany("DELETE FROM entries WHERE side = ? AND path = ?",
+                                            [(side, path) for path in stale_paths])
+            stale_paths.clear()
+
+        for relative_path, entry in entries:
+            if entry.is_file:
+                key = relative_path.split(os.sep)
+                while stored_path is not None and stored_path.split(os.sep) < key:
+                    stale_paths.append(stored_path)
+                    stored_path = next(stored_paths, None)
+                if stored_path == relative_path:
+                    stored_path = next(stored_paths, None)
+                if len(stale_paths) >= PRUNE_PAGE:
+                    remove_stale()
+            yield relative_path, entry
+
+        while stored_path is not None:
+            stale_paths.append(stored_path)
+            stored_path = next(stored_paths, None)
+        remove_stale()
+
+    def paths_in_walk_order(self, side: str):
+        last_key = ""
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f"SELECT path FROM entries WHERE side = ? AND {WALK_ORDER} > ? ORDER BY {WALK_ORDER} LIMIT ?",
+                    (side, last_key, PRUNE_PAGE),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[0]
+            last_key = rows[-1][0].replace(os.sep, "\0")
+
+    def directory_states(self, side: str) -> dict:
+        """
+        This function returns the stored state of every directory of one of the sides.
+
+        Args:
+            side: str
+
+        Returns:
+            states: dict mapping each relative directory to its (mtime_ns, files_digest, rollup) tuple
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT path, mtime_ns, files_digest, rollup FROM directories WHERE side = ?", (side,)
+            ).fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def store_directories(self, side: str, states: dict, replace: bool = False) -> None:
+        """
+        This function stores the state of the passed directories of one of the sides, dropping the stored state of
+        every other directory of that side when replace is True.
+
+        Args:
+            side: str
+            states: dict mapping each relative directory to its (mtime_ns, files_digest, rollup) tuple
+            replace: bool
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            if replace:
+                self.connection.execute("DELETE FROM directories WHERE side = ?", (side,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO directories (side, path, mtime_ns, files_digest, rollup) VALUES (?, ?, ?, ?, ?)",
+                [(side, path) + state for path, state in states.items()],
+            )
+
+    def forget_directories(self, side: str, paths) -> None:
+        with self.lock:
+            self.connection.executemany(
+                "DELETE FROM directories WHERE side = ? AND path = ?", [(side, path) for path in paths]
+            )
+
+    def state(self, key: str):
+        """
+        This function returns a value stored with store_state, like the position of the scrubber in the replica, or
+        None when there's none.
+
+        Args:
+            key: str
+
+        Returns:
+            value: str | None
+        """
+
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def store_state(self, key: str, value: str) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
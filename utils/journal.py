@@ -0,0 +1,107 @@
+from typing import NamedTuple
+import threading
+import sqlite3
+import os
+
+
+class JournalEntry(NamedTuple):
+    """
+    This class represents a copy in flight: the file being copied, the temporary file it's being written to, the size
+    and mtime_ns the source had when the copy started, and the offset up to which the temporary file was flushed to disk.
+
+    Attributes:
+        target_path: str
+        source_path: str
+        temporary_path: str
+        size: int
+        mtime_ns: int
+        verified_offset: int
+    """
+
+    target_path: str
+    source_path: str
+    temporary_path: str
+    size: int
+    mtime_ns: int
+    verified_offset: int
+
+
+class OperationJournal:
+    """
+    This class represents the on-disk journal of the copies in flight, kept in a SQLite database next to the replica.
+    A copy is recorded before it starts, its progress is recorded every time the temporary file is flushed to disk, and
+    the record is removed once the temporary file was renamed over the target. After a crash, the records left are the
+    exact list of the copies that were interrupted, and how far each one got.
+
+    Attributes:
+        journal_path: str
+        logger: logger
+    """
+
+    def __init__(self, journal_path: str, logger):
+        self.journal_path = journal_path
+        self.logger = logger
+        self.lock = threading.Lock()
+
+        journal_folder = os.path.dirname(os.path.abspath(journal_path))
+        os.makedirs(journal_folder, exist_ok=True)
+
+        self.connection = sqlite3.connect(journal_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS copies (
+                target_path TEXT PRIMARY KEY,
+                source_path TEXT NOT NULL,
+                temporary_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                verified_offset INTEGER NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def default_path(destiny_folder: str) -> str:
+        destiny_folder = os.path.abspath(destiny_folder)
+        parent_folder, folder_name = os.path.split(destiny_folder.rstrip(os.sep))
+        return os.path.join(parent_folder, f".{folder_name}.syncfold-journal.sqlite")
+
+    def begin(self, entry: JournalEntry) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO copies (target_path, source_path, temporary_path, size, mtime_ns, verified_offset) VALUES (?, ?, ?, ?, ?, ?)",
+                entry,
+            )
+            self.connection.commit()
+
+    def checkpoint(self, target_path: str, verified_offset: int) -> None:
+        with self.lock:
+            self.connection.execute("UPDATE copies SET verified_offset = ? WHERE target_path = ?", (verified_offset, target_path))
+            self.connection.commit()
+
+    def finish(self, target_path: str) -> None:
+        with self.lock:
+            self.connection.execute("DELETE FROM copies WHERE target_path = ?", (target_path,))
+            self.connection.commit()
+
+    def entry(self, target_path: str):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT target_path, source_path, temporary_path, size, mtime_ns, verified_offset FROM copies WHERE target_path = ?",
+                (target_path,),
+            ).fetchone()
+        return JournalEntry(*row) if row is not None else None
+
+    def entries(self) -> list:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT target_path, source_path, temporary_path, size, mtime_ns, verified_offset FROM copies"
+            ).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
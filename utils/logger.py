@@ -1,30 +1,99 @@
 from loguru import logger
+import threading
+import time
 import sys
 
-def configure_logger(log_file_path: str) -> logger:
+# Level of the lines that sum up a whole cycle, above INFO so the per operation lines can be left out
+SUMMARY = "SUMMARY"
+SUMMARY_LEVEL_NUMBER = 23
+LOG_LEVELS = ("DEBUG", "INFO", SUMMARY)
+DEFAULT_DEBUG_RATE = 100
+# the note on the lines dropped by the rate limiter is kept in the extra values of the record, out of its message
+SUPPRESSED = "suppressed"
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} - {level} - {message}{extra[" + SUPPRESSED + "]}"
+
+try:
+    logger.level(SUMMARY)
+except ValueError:
+    logger.level(SUMMARY, no=SUMMARY_LEVEL_NUMBER)
+
+
+class DebugRateLimiter:
+    """
+    This class is a loguru filter that lets through at most `rate` debug lines per second, so the per file debug lines
+    of a large tree do not slow the cycle down. The number of lines dropped is noted on the first debug line let
+    through in the next second, in the "suppressed" extra value of the record, since the record itself is shared by
+    every sink. Lines of any other level always pass.
+
+    Attributes:
+        rate: int | None, no limit when None or 0
+    """
+
+    def __init__(self, rate: int = DEFAULT_DEBUG_RATE):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.window_start = 0.0
+        self.emitted = 0
+        self.suppressed = 0
+
+    def __call__(self, record) -> bool:
+        # every sink runs its filter right before formatting the record, so the note is set again for each one
+        record["extra"][SUPPRESSED] = ""
+        if not self.rate or record["level"].name != "DEBUG":
+            return True
+
+        now = time.monotonic()
+        with self.lock:
+            if now - self.window_start >= 1:
+                if self.suppressed:
+                    record["extra"][SUPPRESSED] = f" ({self.suppressed} debug lines suppressed)"
+                self.window_start = now
+                self.emitted = 0
+                self.suppressed = 0
+            if self.emitted >= self.rate:
+                self.suppressed += 1
+                return False
+            self.emitted += 1
+            return True
+
+
+def configure_logger(log_file_path: str, level: str = "INFO", enqueue: bool = False, debug_rate: int = DEFAULT_DEBUG_RATE) -> logger:
     """
     This function configures the loguru logger instance, that will be used throught the application.
 
+    With the INFO level every change made in the replica is logged, with the SUMMARY level only one line per cycle
+    and the errors are, and the DEBUG level adds the steps of every file, rate limited. With enqueue, the lines are
+    handed to a background thread that writes them, instead of being written by the thread doing the work. The
+    handlers added before, like the default one of loguru, are removed, so no line skips the level and the rate limit.
+
     Args:
         log_file_path: str
+        level: str
+        enqueue: bool
+        debug_rate: int
 
     Returns:
         logger: logger
     """
 
+    logger.remove()
     logger.add(
         log_file_path,
-        level="INFO",
-        format="{time:YYYY-MM-DD HH:mm:ss} - {level} - {message}",
+        level=level,
+        format=LOG_FORMAT,
         rotation="10 MB", 
         retention="7 days", 
-        compression="zip"
+        compression="zip",
+        enqueue=enqueue,
+        filter=DebugRateLimiter(debug_rate),
     )
 
     logger.add(
         sys.stdout,
-        level="INFO",
-        format="{time:YYYY-MM-DD HH:mm:ss} - {level} - {message}"
+        level=level,
+        format=LOG_FORMAT,
+        enqueue=enqueue,
+        filter=DebugRateLimiter(debug_rate),
     )
     logger.info("Logger configured successfully.")
     return logger
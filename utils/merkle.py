@@ -0,0 +1,61 @@
+import hashlib
+import os
+
+
+class DirectoryDigests:
+    """
+    This class has the method operations used to compute the Merkle digests of the directories of a manifest. Every
+    directory gets a digest of its own files, over their (name, size, mtime_ns), and a rollup digest over that files
+    digest plus the (name, rollup) of every subdirectory, so the rollup of a directory changes whenever anything below
+    it changes. The mtime of the directories themselves is left out, which makes a source directory and its replica
+    have the same rollup while they are in sync.
+
+    Attributes:
+        None
+    """
+
+    @staticmethod
+    def compute(manifest: dict, stored_files_digests: dict = None) -> dict:
+        """
+        This function computes the digests of every directory of the manifest, the root included as "".
+
+        Args:
+            manifest: dict
+            stored_files_digests: dict | None, files digests to use for the directories whose files were left out of
+                the manifest by a pruned scan, keyed by relative path
+
+        Returns:
+            digests: dict mapping each directory to its (files_digest, rollup) tuple
+        """
+
+        stored_files_digests = stored_files_digests or {}
+        files = {"": []}
+        subdirectories = {"": []}
+        for path, entry in manifest.items():
+            parent, name = os.path.split(path)
+            if entry.is_dir:
+                files.setdefault(path, [])
+                subdirectories.setdefault(path, [])
+                subdirectories.setdefault(parent, []).append(name)
+            else:
+                files.setdefault(parent, []).append((name, entry.size, entry.mtime_ns))
+
+        digests = {}
+        # deepest directories first, so every child rollup is ready before its parent's
+        for directory in sorted(files, key=lambda path: path.count(os.sep) + (1 if path else 0), reverse=True):
+            if directory in stored_files_digests:
+                files_digest = stored_files_digests[directory]
+            else:
+                files_hash = hashlib.blake2b(digest_size=16)
+                for name, size, mtime_ns in sorted(files[directory]):
+                    files_hash.update(f"{name}\0{size}\0{mtime_ns}\n".encode("utf-8", "surrogateescape"))
+                files_digest = files_hash.hexdigest()
+
+            rollup_hash = hashlib.blake2b(digest_size=16)
+            rollup_hash.update(files_digest.encode())
+            for name in sorted(subdirectories[directory]):
+                child = os.path.join(directory, name) if directory else name
+                rollup_hash.update(f"{name}\0{digests[child][1]}\n".encode("utf-8", "surrogateescape"))
+            digests[directory] = (files_digest, rollup_hash.hexdigest())
+
+        return digests
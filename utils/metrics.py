@@ -0,0 +1,139 @@
+import json
+import os
+
+
+class MetricsExporter:
+    """
+    This class exports the report of every synchronization cycle, as a Prometheus textfile, to be picked up by the
+    node_exporter textfile collector, and as a JSON document. The gauges describe the last cycle, while the counters
+    add up every cycle since the program started. Both files are written to a temporary file first and then renamed,
+    so a reader never sees a file written halfway.
+
+    Attributes:
+        textfile_path: str | None
+        json_path: str | None
+        logger: logger
+        labels: dict, added to every Prometheus sample
+    """
+
+    def __init__(self, logger, textfile_path: str = None, json_path: str = None, labels: dict = None):
+        self.logger = logger
+        self.textfile_path = textfile_path
+        self.json_path = json_path
+        self.labels = labels or {}
+        self.cycles_total = 0
+        self.errors_total = 0
+        self.bytes_copied_total = 0
+        self.last_success_at = None
+
+    def export(self, report) -> None:
+        """
+        This function adds the passed cycle report to the counters and writes the configured files. An error while
+        writing them is logged, without stopping the synchronization.
+
+        Args:
+            report: CycleReport
+
+        Returns:
+            None
+        """
+
+        self.cycles_total += 1
+        self.errors_total += len(report.errors)
+        self.bytes_copied_total += report.bytes_copied
+        if not report.has_errors():
+            self.last_success_at = report.finished_at
+
+        try:
+            if self.textfile_path:
+                self.write_atomically(self.textfile_path, self.prometheus_text(report))
+            if self.json_path:
+                self.write_atomically(self.json_path, json.dumps(self.json_document(report), indent=2) + "\n")
+        except OSError as e:
+            self.logger.error(f"An unexpected error occurred while exporting the metrics: {type(e).__name__} - {e}")
+
+    def json_document(self, report) -> dict:
+        document = report.to_dict()
+        document["labels"] = dict(self.labels)
+        document["totals"] = {
+            "cycles": self.cycles_total,
+            "errors": self.errors_total,
+            "bytes_copied": self.bytes_copied_total,
+            "last_success_at": self.last_success_at,
+        }
+        return document
+
+    def prometheus_text(self, report) -> str:
+        """
+        This function renders the cycle report in the Prometheus text exposition format.
+
+        Args:
+            report: CycleReport
+
+        Returns:
+            text: str
+        """
+
+        lines = []
+
+        def metric(name: str, metric_type: str, help_text: str, samples: list) -> None:
+            lines.append(f"# HELP syncfold_{name} {help_text}")
+            lines.append(f"# TYPE syncfold_{name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"syncfold_{name}{self.format_labels(labels)} {value}")
+
+        metric("cycle_duration_seconds", "gauge", "Duration of the last cycle.", [({}, report.duration)])
+        metric("last_cycle_timestamp_seconds", "gauge", "Unix time the last cycle finished at.", [({}, report.finished_at or 0)])
+        if self.last_success_at is not None:
+            metric("last_success_timestamp_seconds", "gauge", "Unix time the last cycle without errors finished at.",
+                   [({}, self.last_success_at)])
+        metric("phase_duration_seconds", "gauge", "Time spent in every phase of the last cycle.",
+               [({"phase": phase}, seconds) for phase, seconds in sorted(report.phases.items())])
+        metric("operations", "gauge", "Operations applied in the last cycle.",
+               [({"kind": kind}, totals["count"]) for kind, totals in sorted(report.operations.items())])
+        metric("operation_bytes", "gauge", "Bytes involved in the operations applied in the last cycle.",
+               [({"kind": kind}, totals["bytes"]) for kind, totals in sorted(report.operations.items())])
+        metric("copied_bytes", "gauge", "Bytes written to the replica in the last cycle, per copy method.",
+               [({"method": method}, totals["bytes"]) for method, totals in sorted(report.copy_methods.items())])
+        metric("hashed_files", "gauge", "Files hashed in the last cycle.", [({}, report.hashed["count"])])
+        metric("hashed_bytes", "gauge", "Bytes hashed in the last cycle.", [({}, report.hashed["bytes"])])
+        metric("unchanged_files", "gauge", "Files found unchanged in the last cycle.", [({}, report.unchanged["count"])])
+        metric("unchanged_bytes", "gauge", "Bytes of the files found unchanged in the last cycle.", [({}, report.unchanged["bytes"])])
+        metric("throughput_bytes_per_second", "gauge", "Bytes written to the replica per second in the last cycle.",
+               [({}, report.throughput)])
+        metric("errors", "gauge", "Operations that failed in the last cycle.", [({}, len(report.errors))])
+        metric("worker_queue_depth_max", "gauge", "Deepest the worker pool queue got in the last cycle.",
+               [({}, report.max_queue_depth)])
+        if report.scrub is not None:
+            scrub = report.scrub
+            metric("scrub_passes_total", "counter", "Complete scrub passes over the replica.", [({}, scrub["passes"])])
+            metric("scrub_pass_bytes", "gauge", "Bytes of the replica scrubbed in the current pass.", [({}, scrub["pass_bytes"])])
+            if scrub["coverage"] is not None:
+                metric("scrub_coverage_ratio", "gauge", "Part of the replica scrubbed in the current pass.", [({}, scrub["coverage"])])
+            metric("scrub_checked_bytes_total", "counter", "Bytes of the replica scrubbed since the program started.",
+                   [({}, scrub["checked"]["bytes"])])
+            metric("scrub_mismatches_total", "counter", "Replica files found not matching their source since the program started.",
+                   [({}, scrub["mismatches"])])
+            metric("scrub_repaired_total", "counter", "Replica files repaired by the scrubber since the program started.",
+                   [({}, scrub["repaired"])])
+        metric("cycles_total", "counter", "Cycles run since the program started.", [({}, self.cycles_total)])
+        metric("errors_total", "counter", "Operations that failed since the program started.", [({}, self.errors_total)])
+        metric("copied_bytes_total", "counter", "Bytes written to the replica since the program started.",
+               [({}, self.bytes_copied_total)])
+        return "\n".join(lines) + "\n"
+
+    def format_labels(self, labels: dict) -> str:
+        labels = {**self.labels, **labels}
+        if not labels:
+            return ""
+        escape = lambda value: str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+    @staticmethod
+    def write_atomically(path: str, content: str) -> None:
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        temporary_path = os.path.join(folder, f".{os.path.basename(path)}.tmp")
+        with open(temporary_path, "w") as file:
+            file.write(content)
+        os.replace(temporary_path, path)
@@ -0,0 +1,211 @@
+from utils.index import SOURCE, DESTINY
+import os
+
+
+class MoveDetector:
+    """
+    This class has the method operations used to recognize the files and directories that were moved or renamed in
+    the source, so the replica can rename its copies instead of deleting them and copying everything again.
+
+    A file that only exists in the source is matched with a file that only exists in the destiny when both have the
+    same size and either the destiny path was last seen in the source with the same inode, size and mtime, or both
+    files have the same digest. Files matched under a directory that only exists in the destiny, and that land under a
+    directory that only exists in the source, turn into a single rename of the whole directory.
+
+    Attributes:
+        comparator: FileComparator
+        index: HashIndex | None
+        logger: logger
+    """
+
+    def __init__(self, comparator, index, logger):
+        self.comparator = comparator
+        self.index = index
+        self.logger = logger
+
+    def detect(self, source_manifest: dict, destiny_manifest: dict) -> list:
+        """
+        This function finds the moves between the two manifests. The destiny candidates are grouped once by the stored
+        state of their path and, for the sizes that are still left unmatched, by their digest, so every file is hashed
+        at most once and each new source file is matched through a dictionary lookup.
+
+        Args:
+            source_manifest: dict
+            destiny_manifest: dict
+
+        Returns:
+            moves: list of (origin, target) relative paths, directories first, to be applied in order on the destiny
+        """
+
+        destiny_only = {}
+        for path, entry in destiny_manifest.items():
+            # empty files are not worth matching, creating them again costs nothing
+            if entry.is_file and entry.size > 0 and path not in source_manifest:
+                destiny_only.setdefault(entry.size, []).append(path)
+        if not destiny_only:
+            return []
+
+        source_only = [(path, entry) for path, entry in source_manifest.items()
+                       if entry.is_file and path not in destiny_manifest and entry.size in destiny_only]
+        if not source_only:
+            return []
+
+        # the destiny paths last seen in the source, by the (size, mtime_ns, inode) they had there
+        by_identity = {}
+        if self.index is not None:
+            sizes = {entry.size for _, entry in source_only}
+            for size in sizes:
+                for candidate in destiny_only[size]:
+                    stored = self.index.stored_entry(SOURCE, candidate)
+                    if stored is not None and stored[0] == size:
+                        by_identity.setdefault(stored[:3], []).append(candidate)
+
+        by_digest = {}
+        matched = set()
+
+        def take(candidates):
+            while candidates:
+                candidate = candidates.pop(0)
+                if candidate not in matched:
+                    matched.add(candidate)
+                    return candidate
+            return None
+
+        def digest_candidates(size: int) -> dict:
+            if size not in by_digest:
+                by_digest[size] = {}
+                for candidate in destiny_only[size]:
+                    if candidate in matched:
+                        continue
+                    digest = self.comparator.file_digest(DESTINY, candidate, destiny_manifest[candidate])
+                    if digest is not None:
+                        by_digest[size].setdefault(digest, []).append(candidate)
+            return by_digest[size]
+
+        file_moves = []
+        unmatched = []
+        for path, entry in source_only:
+            candidate = take(by_identity.get((entry.size, entry.mtime_ns, entry.inode)))
+            if candidate is not None:
+                file_moves.append((candidate, path))
+            else:
+                unmatched.append((path, entry))
+
+        # the digests are only read once the matches through the index are known, so those files are never hashed
+        for path, entry in unmatched:
+            candidates = digest_candidates(entry.size)
+            if not candidates:
+                continue
+            digest = self.comparator.file_digest(SOURCE, path, entry)
+            candidate = take(candidates.get(digest)) if digest is not None else None
+            if candidate is not None:
+                file_moves.append((candidate, path))
+
+        directory_moves = self.directory_moves(file_moves, source_manifest, destiny_manifest)
+        moves = list(directory_moves)
+        directory_targets = dict(directory_moves)
+        for origin, target in file_moves:
+            origin = MoveDetector.relocate(origin, directory_targets)
+            if origin != target:
+                moves.append((origin, target))
+        return moves
+
+    def directory_moves(self, file_moves: list, source_manifest: dict, destiny_manifest: dict) -> list:
+        """
+        This function turns the file moves that share the same outermost pair of directories, one only present in the
+        destiny and the other only present in the source, into directory renames.
+
+        Args:
+            file_moves: list of (origin, target) tuples
+            source_manifest: dict
+            destiny_manifest: dict
+
+        Returns:
+            directory_moves: list of (origin, target) tuples
+        """
+
+        votes = {}
+        for origin, target in file_moves:
+            origin_parts = origin.split(os.sep)
+            target_parts = target.split(os.sep)
+            best = None
+            # walk up both paths while they keep the same trailing components
+            while len(origin_parts) > 1 and len(target_parts) > 1 and origin_parts[-1] == target_parts[-1]:
+                origin_parts.pop()
+                target_parts.pop()
+                origin_dir = os.sep.join(origin_parts)
+                target_dir = os.sep.join(target_parts)
+                if origin_dir in source_manifest or target_dir in destiny_manifest:
+                    break
+                best = (origin_dir, target_dir)
+            if best is not None:
+                votes[best] = votes.get(best, 0) + 1
+
+        chosen = []
+        for origin_dir, target_dir in sorted(votes, key=lambda pair: -votes[pair]):
+            overlaps = any(
+                MoveDetector.is_inside(origin_dir, other_origin) or MoveDetector.is_inside(other_origin, origin_dir)
+                or MoveDetector.is_inside(target_dir, other_target) or MoveDetector.is_inside(other_target, target_dir)
+                for other_origin, other_target in chosen
+            )
+            if not overlaps and destiny_manifest.get(origin_dir) is not None and destiny_manifest[origin_dir].is_dir:
+                chosen.append((origin_dir, target_dir))
+        return chosen
+
+    @staticmethod
+    def is_inside(path: str, directory: str) -> bool:
+        return path == directory or path.startswith(directory + os.sep)
+
+    @staticmethod
+    def moved_ancestor(path: str, moves: dict):
+        """
+        This function returns the longest of the passed path and its ancestors that is a key of the moves, or None
+        when none of them is, looking each one up instead of going through every move.
+
+        Args:
+            path: str
+            moves: dict of origin -> target relative paths
+
+        Returns:
+            ancestor: str | None
+        """
+
+        while path:
+            if path in moves:
+                return path
+            path = os.path.dirname(path)
+        return None
+
+    @staticmethod
+    def relocate(path: str, moves: dict) -> str:
+        ancestor = MoveDetector.moved_ancestor(path, moves)
+        return path if ancestor is None else moves[ancestor] + path[len(ancestor):]
+
+    @staticmethod
+    def apply_to_manifest(destiny_manifest: dict, moves: list) -> dict:
+        """
+        This function returns a copy of the destiny manifest as it will be once the moves are applied, so the rest of
+        the diff compares the moved entries at their new paths. The moves are first folded into a single map from the
+        paths the entries have now to the ones they end up at, then every entry is relocated in one pass.
+
+        Args:
+            destiny_manifest: dict
+            moves: list of (origin, target) tuples, in the order they are applied
+
+        Returns:
+            manifest: dict
+        """
+
+        origins = {}
+        targets = {}
+        for origin, target in moves:
+            # a move of an entry that an earlier move carried is keyed by the path the entry has before both
+            ancestor = MoveDetector.moved_ancestor(origin, targets)
+            if ancestor is not None:
+                origin = targets[ancestor] + origin[len(ancestor):]
+            origins[origin] = target
+            targets[target] = origin
+
+        if not origins:
+            return dict(destiny_manifest)
+        return {MoveDetector.relocate(path, origins): entry for path, entry in destiny_manifest.items()}
@@ -0,0 +1,321 @@
+from utils.workers import WorkerPool
+from typing import NamedTuple
+import os
+
+MKDIR = "mkdir"
+COPY = "copy"
+UPDATE = "update"
+DELETE = "delete"
+RMDIR = "rmdir"
+MOVE = "move"
+
+# Order in which the operations of a plan have to be applied on the replica: moves go first so nothing they carry gets
+# removed, then stale entries are removed so a path that changed its type can be recreated, and directories exist
+# before any file is written inside them.
+EXECUTION_ORDER = (MOVE, RMDIR, DELETE, MKDIR, UPDATE, COPY)
+
+# Orders the copies and updates of a plan can be run in: by path, the smallest files first, so most of the files get
+# to the replica early, or the largest first, which keeps the disks streaming
+PATH_ORDER = "path"
+SMALL_FIRST = "small_first"
+LARGE_FIRST = "large_first"
+ORDER_POLICIES = (PATH_ORDER, SMALL_FIRST, LARGE_FIRST)
+
+
+class PlanOperation(NamedTuple):
+    """
+    This class represents a single operation of a sync plan, to be applied on the replica.
+
+    Attributes:
+        kind: str
+        path: str
+        size: int
+        origin: str | None, the path the entry is moved from, for move operations
+    """
+
+    kind: str
+    path: str
+    size: int
+    origin: str = None
+
+    def describe(self) -> str:
+        return f"{self.kind:<6} {self.origin + ' -> ' if self.origin else ''}{self.path} ({self.size} bytes)"
+
+
+class SyncPlan:
+    """
+    This class holds the operations needed to bring the replica to the same state as the source, grouped by kind.
+
+    Attributes:
+        operations: dict
+    """
+
+    def __init__(self):
+        self.operations = {kind: [] for kind in EXECUTION_ORDER}
+
+    def add(self, kind: str, path: str, size: int = 0, origin: str = None) -> None:
+        self.operations[kind].append(PlanOperation(kind, path, size, origin))
+
+    def of_kind(self, kind: str) -> list:
+        return self.operations[kind]
+
+    def order_transfers(self, policy: str = PATH_ORDER) -> None:
+        """
+        This function sorts the copies and the updates of the plan following one of the order policies. The other kinds
+        keep their order, since directories have to be created from the top.
+
+        Args:
+            policy: str
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: When the policy is not one of the order policies.
+        """
+
+        if policy not in ORDER_POLICIES:
+            raise ValueError(f"Invalid order policy: {policy}. Expected one of {', '.join(ORDER_POLICIES)}.")
+        for kind in (UPDATE, COPY):
+            if policy == PATH_ORDER:
+                self.operations[kind].sort(key=lambda operation: operation.path)
+            else:
+                self.operations[kind].sort(key=lambda operation: (operation.size, operation.path), reverse=policy == LARGE_FIRST)
+
+    def __iter__(self):
+        for kind in EXECUTION_ORDER:
+            yield from self.operations[kind]
+
+    def __len__(self) -> int:
+        return sum(len(operations) for operations in self.operations.values())
+
+    def is_empty(self) -> bool:
+        return len(self) == 0
+
+    def totals(self) -> dict:
+        """
+        This function sums the number of operations and the bytes involved for every kind of operation of the plan.
+
+        Args:
+            None
+
+        Returns:
+            totals: dict
+        """
+
+        return {
+            kind: {"count": len(operations), "bytes": sum(operation.size for operation in operations)}
+            for kind, operations in self.operations.items()
+        }
+
+    def describe(self) -> list:
+        """
+        This function returns a human readable line for every operation of the plan, followed by the totals.
+
+        Args:
+            None
+
+        Returns:
+            lines: list
+        """
+
+        lines = [operation.describe() for operation in self]
+        for kind, total in self.totals().items():
+            lines.append(f"total {kind}: {total['count']} operations, {total['bytes']} bytes")
+        return lines
+
+
+class DiffEngine:
+    """
+    This class has the method operations used to compare a source manifest against a destiny manifest, producing the
+    SyncPlan that makes the destiny equal to the source. Both manifests are dictionaries, so every lookup is O(1) and
+    the whole diff is linear in the number of entries.
+
+    Attributes:
+        None
+    """
+
+    @staticmethod
+    def build_plan(source_manifest: dict, destiny_manifest: dict, is_same_file, pool=None, prepare=None) -> SyncPlan:
+        """
+        This function walks both manifests once and builds the plan of operations for the replica.
+
+        Args:
+            source_manifest: dict
+            destiny_manifest: dict
+            is_same_file: callable(relative_path, source_entry, destiny_entry) -> bool, used for the files present on both sides
+            pool: WorkerPool | None, used to compare the files present on both sides concurrently
+            prepare: callable(common_files) | None, called once with every file present on both sides before they are compared
+
+        Returns:
+            plan: SyncPlan
+        """
+
+        plan = SyncPlan()
+        removed_directories = {}
+
+        for path, destiny_entry in destiny_manifest.items():
+            source_entry = source_manifest.get(path)
+            if source_entry is not None and source_entry.kind == destiny_entry.kind:
+                continue
+            if destiny_entry.is_dir:
+                removed_directories[path] = 0
+
+        for path, destiny_entry in destiny_manifest.items():
+            source_entry = source_manifest.get(path)
+            if source_entry is not None and source_entry.kind == destiny_entry.kind:
+                continue
+
+            removed_ancestor = DiffEngine.top_removed_ancestor(path, removed_directories)
+            if removed_ancestor is not None:
+                # the entry goes away together with the directory, only its bytes are accounted there
+                removed_directories[removed_ancestor] += destiny_entry.size
+            elif not destiny_entry.is_dir:
+                plan.add(DELETE, path, destiny_entry.size)
+
+        for path in sorted(removed_directories):
+            if DiffEngine.top_removed_ancestor(path, removed_directories) is None:
+                plan.add(RMDIR, path, removed_directories[path])
+
+        common_files = []
+        for path, source_entry in source_manifest.items():
+            destiny_entry = destiny_manifest.get(path)
+            if destiny_entry is None or destiny_entry.kind != source_entry.kind:
+                if source_entry.is_dir:
+                    plan.add(MKDIR, path)
+                else:
+                    plan.add(COPY, path, source_entry.size)
+            elif source_entry.is_file:
+                common_files.append((path, source_entry, destiny_entry))
+
+        if prepare is not None:
+            prepare(common_files)
+
+        compare = lambda candidate: is_same_file(*candidate)
+        if pool is not None:
+            results = pool.run_all(compare, common_files)
+        else:
+            results = [(candidate, compare(candidate), None) for candidate in common_files]
+        for (path, source_entry, _), is_same, error in results:
+            # a comparison that failed is treated as a different file, so the replica gets copied again
+            if error is not None or not is_same:
+                plan.add(UPDATE, path, source_entry.size)
+
+        # sorting the paths keeps every parent directory before its children
+        plan.of_kind(MKDIR).sort()
+        return plan
+
+    @staticmethod
+    def stream_plan(source_entries, destiny_entries, is_same_file, pool=None):
+        """
+        This function merge-joins two streams of entries sorted the way TreeScanner.walk yields them, and yields the
+        operations for the replica as soon as they are known, without holding either tree in memory. Since both streams
+        are in depth first order, a directory is always yielded before the entries inside it, and the removal of a
+        replica entry before the creation of a source entry at the same path.
+
+        When a pool is passed, the files present on both sides are compared by its workers, a few per worker at a time,
+        while the walks go on. The operations are still yielded in the order of the walks.
+
+        Args:
+            source_entries: iterable of (relative_path, ManifestEntry) tuples
+            destiny_entries: iterable of (relative_path, ManifestEntry) tuples
+            is_same_file: callable(relative_path, source_entry, destiny_entry) -> bool, used for the files present on both sides
+            pool: WorkerPool | None
+
+        Yields:
+            operation: PlanOperation
+        """
+
+        # the operations found by the merge run inline, so only the comparisons are handed to the workers
+        is_operation = lambda item: isinstance(item, PlanOperation)
+        compare = lambda item: item if is_operation(item) else is_same_file(*item)
+        pool = pool if pool is not None else WorkerPool(1)
+
+        for item, is_same, error in pool.run_stream(compare, DiffEngine.merge_entries(source_entries, destiny_entries), is_operation):
+            if is_operation(item):
+                yield item
+            # a comparison that failed is treated as a different file, so the replica gets copied again
+            elif error is not None or not is_same:
+                path, source_entry, _ = item
+                yield PlanOperation(UPDATE, path, source_entry.size)
+
+    @staticmethod
+    def merge_entries(source_entries, destiny_entries):
+        """
+        This function walks the two sorted streams of entries of stream_plan side by side, and yields the operations
+        that follow from the entries present on a single side, and a (relative_path, source_entry, destiny_entry) tuple
+        for every file present on both sides, still to be compared.
+
+        Args:
+            source_entries: iterable of (relative_path, ManifestEntry) tuples
+            destiny_entries: iterable of (relative_path, ManifestEntry) tuples
+
+        Yields:
+            item: PlanOperation | tuple
+        """
+
+        source_entries = iter(source_entries)
+        destiny_entries = iter(destiny_entries)
+
+        def advance(entries):
+            item = next(entries, None)
+            # comparing the paths component by component gives the order both walks follow
+            return None if item is None else (item[0].split(os.sep), item[0], item[1])
+
+        source_item = advance(source_entries)
+        destiny_item = advance(destiny_entries)
+
+        while source_item is not None or destiny_item is not None:
+            if destiny_item is None or (source_item is not None and source_item[0] < destiny_item[0]):
+                _, path, source_entry = source_item
+                source_item = advance(source_entries)
+                if source_entry.is_dir:
+                    yield PlanOperation(MKDIR, path, 0)
+                else:
+                    yield PlanOperation(COPY, path, source_entry.size)
+                continue
+
+            _, path, destiny_entry = destiny_item
+            destiny_item = advance(destiny_entries)
+            matched = source_item is not None and source_item[1] == path
+            source_entry = source_item[2] if matched else None
+
+            if source_entry is not None and source_entry.kind == destiny_entry.kind:
+                source_item = advance(source_entries)
+                if source_entry.is_file:
+                    yield path, source_entry, destiny_entry
+                continue
+
+            if destiny_entry.is_dir:
+                # the entries below a removed directory go away with it, only their bytes are accounted there
+                removed_bytes = 0
+                prefix = path + os.sep
+                while destiny_item is not None and destiny_item[1].startswith(prefix):
+                    removed_bytes += destiny_item[2].size
+                    destiny_item = advance(destiny_entries)
+                yield PlanOperation(RMDIR, path, removed_bytes)
+            else:
+                yield PlanOperation(DELETE, path, destiny_entry.size)
+            # the source entry with the same path, if any, is created by the next iteration
+
+    @staticmethod
+    def top_removed_ancestor(path: str, removed_directories: dict):
+        """
+        This function returns the outermost ancestor of the passed path that is being removed, or None when the path
+        is not inside any of the removed directories.
+
+        Args:
+            path: str
+            removed_directories: dict
+
+        Returns:
+            ancestor: str | None
+        """
+
+        ancestor = None
+        parent = os.path.dirname(path)
+        while parent:
+            if parent in removed_directories:
+                ancestor = parent
+            parent = os.path.dirname(parent)
+        return ancestor
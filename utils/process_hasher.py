@@ -0,0 +1,155 @@
+from concurrent.futures import ProcessPoolExecutor
+from utils.files import FileOperator, DEFAULT_DIGEST
+import multiprocessing
+import copy
+import os
+
+BATCH_BYTES = 64 * 1024 * 1024
+BATCH_FILES = 512
+RANGE_SIZE = 64 * 1024 * 1024
+LARGE_FILE_THRESHOLD = 256 * 1024 * 1024
+
+
+def hash_range(file_path: str, offset: int, length: int, algorithm: str):
+    """
+    This function hashes `length` bytes of a file starting at `offset`, and returns the raw digest, or None when the
+    file could not be read. It runs inside the worker processes, so it does not use the logger.
+
+    Args:
+        file_path: str
+        offset: int
+        length: int
+        algorithm: str
+
+    Returns:
+        digest: bytes | None
+    """
+
+    try:
+        file_hash = FileOperator.new_digest(algorithm)
+        with open(file_path, "rb", buffering=0) as file:
+            FileOperator.update_digest(file_hash, file, offset, length)
+        return file_hash.digest()
+    except OSError:
+        return None
+
+
+def hash_batch(files: list, algorithm: str) -> list:
+    """
+    This function hashes a batch of small files in one task, so the cost of sending the task to a worker process is
+    paid once for many files.
+
+    Args:
+        files: list of (file_path, size) tuples
+        algorithm: str
+
+    Returns:
+        digests: list of hex digests, None for the files that could not be read
+    """
+
+    digests = []
+    for file_path, size in files:
+        digest = hash_range(file_path, 0, size, algorithm)
+        digests.append(digest.hex() if digest is not None else None)
+    return digests
+
+
+class ProcessPoolHasher:
+    """
+    This class represents the hashing backend that spreads the digest computation over a pool of processes, using every
+    core when hashing is CPU bound. Small files are hashed in batches per task, and files above the large file threshold
+    are split in ranges hashed in parallel, whose digests are combined into a tree digest.
+
+    Since the digest of a large file is a tree digest, it differs from the flat digest of the in-process path, which is
+    why the backend has its own label, used by the index to tell both kinds of digests apart.
+
+    Attributes:
+        processes: int
+        algorithm: str
+        range_size: int
+        large_file_threshold: int
+        label: str
+    """
+
+    def __init__(self, processes: int = None, algorithm: str = DEFAULT_DIGEST, range_size: int = RANGE_SIZE,
+                 large_file_threshold: int = LARGE_FILE_THRESHOLD):
+        self.processes = processes or os.cpu_count() or 1
+        self.algorithm = algorithm
+        self.range_size = range_size
+        self.large_file_threshold = max(large_file_threshold, range_size)
+        self.label = f"{algorithm}-tree{range_size}"
+        # spawn keeps the worker processes independent from the threads of the main process
+        self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def with_algorithm(self, algorithm: str):
+        """
+        This function returns a hasher computing the digests with another algorithm, and the label that goes with
+        them, over the same worker processes, so the synchronizers using different digests can share one pool.
+
+        Args:
+            algorithm: str
+
+        Returns:
+            hasher: ProcessPoolHasher
+        """
+
+        if algorithm == self.algorithm:
+            return self
+        hasher = copy.copy(self)
+        hasher.algorithm = algorithm
+        hasher.label = f"{algorithm}-tree{self.range_size}"
+        return hasher
+
+    def hash_files(self, files: list) -> dict:
+        """
+        This function hashes every file of the passed list in the process pool.
+
+        Args:
+            files: list of (file_path, size) tuples
+
+        Returns:
+            digests: dict mapping each file path to its hex digest, or None when the file could not be read
+        """
+
+        batches = [[]]
+        batch_bytes = 0
+        large_files = []
+        for file_path, size in files:
+            if size >= self.large_file_threshold:
+                large_files.append((file_path, size))
+                continue
+            if len(batches[-1]) >= BATCH_FILES or batch_bytes + size > BATCH_BYTES:
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append((file_path, size))
+            batch_bytes += size
+
+        batch_futures = [(batch, self.executor.submit(hash_batch, batch, self.algorithm)) for batch in batches if batch]
+        range_futures = []
+        for file_path, size in large_files:
+            ranges = [
+                self.executor.submit(hash_range, file_path, offset, min(self.range_size, size - offset), self.algorithm)
+                for offset in range(0, size, self.range_size)
+            ]
+            range_futures.append((file_path, size, ranges))
+
+        digests = {}
+        for batch, future in batch_futures:
+            for (file_path, _), digest in zip(batch, future.result()):
+                digests[file_path] = digest
+
+        for file_path, size, ranges in range_futures:
+            range_digests = [future.result() for future in ranges]
+            if any(digest is None for digest in range_digests):
+                digests[file_path] = None
+                continue
+            tree_hash = FileOperator.new_digest(self.algorithm)
+            tree_hash.update(size.to_bytes(8, "little"))
+            for digest in range_digests:
+                tree_hash.update(digest)
+            digests[file_path] = tree_hash.hexdigest()
+
+        return digests
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,774 @@
+from concurrent.futures import Future
+from utils.replica import LocalReplica
+from utils.scanner import ManifestEntry, TreeScanner
+from utils.filters import PathFilter
+from utils.delta import DeltaTransfer, DeltaOperation, BLOCK_SIZE
+from utils.files import FileOperator, CopyResult, CHUNK_SIZE, DEFAULT_DIGEST
+import socketserver
+import collections
+import itertools
+import threading
+import socket
+import struct
+import stat
+import json
+import hmac
+import zlib
+import os
+
+PROTOCOL_VERSION = 2
+# every message is this frame, followed by a JSON header and a binary body, compressed with zlib when the flag is set
+FRAME = struct.Struct("!IIB")
+COMPRESSED = 1
+MAX_HEADER_SIZE = 64 * 1024 * 1024
+MAX_BODY_SIZE = 256 * 1024 * 1024
+# bodies smaller than this are sent as they are, compressing them would not pay off
+COMPRESS_MIN_SIZE = 512
+# entries of the replica sent per scan message, so a manifest of any size goes through in bounded messages
+SCAN_PAGE = 10000
+# walks of the replica a connection keeps open between two pages, the oldest one is dropped past this
+MAX_OPEN_WALKS = 8
+
+# small files are sent many per message, up to this many bytes, the bigger ones are streamed in chunks of WRITE_CHUNK
+BATCH_BYTES = 4 * 1024 * 1024
+WRITE_CHUNK = 4 * CHUNK_SIZE
+SIGNATURE_ENTRY = struct.Struct(f"!IQ{len(DeltaTransfer.strong_digest(b''))}s")
+
+REMOTE = "remote"
+REMOTE_BATCH = "remote_batch"
+
+# the exceptions raised by the receiver are raised again by the sender with the same type when it's one of these
+REMOTE_ERRORS = {error.__name__: error for error in (FileNotFoundError, FileExistsError, PermissionError, IsADirectoryError,
+                                                      NotADirectoryError, ValueError, OSError)}
+
+
+def parse_address(address: str) -> tuple:
+    host, separator, port = address.rpartition(":")
+    if not separator or not port.isdigit():
+        raise ValueError(f"Invalid address: {address}. Expected host:port.")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+def state_folder(source_folder: str) -> str:
+    # the index of a remote replica is kept on the sending side, named after the source it replicates
+    return os.path.abspath(source_folder).rstrip(os.sep) + ".remote"
+
+
+def to_wire(relative_path: str) -> str:
+    return relative_path.replace(os.sep, "/") if os.sep != "/" else relative_path
+
+
+def from_wire(relative_path: str) -> str:
+    return relative_path.replace("/", os.sep) if os.sep != "/" else relative_path
+
+
+def receive_exactly(connection: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = connection.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("the connection was closed in the middle of a message")
+        received += count
+    return buffer
+
+
+def send_message(connection: socket.socket, header: dict, body=b"", compress: bool = False) -> None:
+    """
+    This function sends one message: the frame with the sizes and the flags, the JSON header, and the body, compressed
+    when asked to and when it makes the body smaller.
+
+    Args:
+        connection: socket.socket
+        header: dict
+        body: bytes-like
+        compress: bool
+
+    Returns:
+        None
+    """
+
+    header_data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    flags = 0
+    if compress and len(body) >= COMPRESS_MIN_SIZE:
+        compressed = zlib.compress(body, 1)
+        if len(compressed) < len(body):
+            body = compressed
+            flags |= COMPRESSED
+    connection.sendall(FRAME.pack(len(header_data), len(body), flags) + header_data)
+    if len(body):
+        connection.sendall(body)
+
+
+def receive_message(connection: socket.socket):
+    """
+    This function receives one message sent with send_message.
+
+    Args:
+        connection: socket.socket
+
+    Returns:
+        (header, body): tuple, or None when the connection was closed between two messages
+
+    Raises:
+        ConnectionError: When the connection was closed in the middle of a message, or the message is too big, also
+        once decompressed.
+    """
+
+    first = connection.recv(FRAME.size)
+    if not first:
+        return None
+    frame = first + receive_exactly(connection, FRAME.size - len(first))
+    header_size, body_size, flags = FRAME.unpack(frame)
+    if header_size > MAX_HEADER_SIZE or body_size > MAX_BODY_SIZE:
+        raise ConnectionError(f"message too big: {header_size} bytes of header and {body_size} bytes of body")
+    header = json.loads(bytes(receive_exactly(connection, header_size)).decode("utf-8"))
+    body = bytes(receive_exactly(connection, body_size)) if body_size else b""
+    if flags & COMPRESSED:
+        decompressor = zlib.decompressobj()
+        body = decompressor.decompress(body, MAX_BODY_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ConnectionError(f"message too big: more than {MAX_BODY_SIZE} bytes of body once decompressed")
+    return header, body
+
+
+def file_metadata(file_stat: os.stat_result) -> dict:
+    return {"size": file_stat.st_size, "atime_ns": file_stat.st_atime_ns, "mtime_ns": file_stat.st_mtime_ns,
+            "mode": stat.S_IMODE(file_stat.st_mode)}
+
+
+def filter_patterns(path_filter) -> list:
+    return [rule.pattern for rule in path_filter.rules] if path_filter is not None else None
+
+
+class RemoteReplica:
+    """
+    This class represents the sending end of the replication protocol, the replica backend of a folder served by a
+    ReplicaReceiver on another machine. Every worker thread shares one connection, on which the requests are pipelined:
+    they are sent without waiting for the responses of the previous ones, which the receiver sends back in the same
+    order and a reader thread hands to the requests waiting for them. This way a round trip is paid per batch of work
+    instead of per file.
+
+    The manifests are walked by the receiver and sent in pages of SCAN_PAGE entries, the small files are sent many per message, the big ones in
+    chunks of their data extents, and the files modified in part are updated with DeltaTransfer: the receiver sends
+    the signature of its copy, and only the literals of the delta are sent back. Bodies are compressed with zlib,
+    unless compression is disabled.
+
+    Attributes:
+        address: str, host:port of the receiver
+        logger: logger
+        compress: bool
+        remote: bool, True, the replica files can only be reached through the receiver
+        batch_bytes: int, size of the batches of small files
+    """
+
+    remote = True
+    batch_bytes = BATCH_BYTES
+
+    def __init__(self, address: str, logger, compress: bool = True, token: str = None, timeout: float = 30.0):
+        self.address = address
+        self.root_folder = address
+        self.logger = logger
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.error = None
+        self.closed = False
+
+        self.connection = socket.create_connection(parse_address(address), timeout)
+        self.connection.settimeout(None)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = threading.Thread(target=self.read_responses, name="syncfold-remote-reader", daemon=True)
+        self.reader.start()
+        try:
+            self.call("hello", {"version": PROTOCOL_VERSION, "token": token, "compress": compress})
+        except Exception:
+            self.close()
+            raise
+
+    def request(self, kind: str, header: dict = None, body=b"") -> Future:
+        """
+        This function sends one request without waiting for its response, and returns the future the response is
+        handed to by the reader thread.
+
+        Args:
+            kind: str
+            header: dict | None
+            body: bytes-like
+
+        Returns:
+            future: Future of the (header, body) response
+
+        Raises:
+            ConnectionError: When the connection to the receiver was lost.
+        """
+
+        future = Future()
+        with self.lock:
+            if self.error is not None:
+                raise ConnectionError(f"the connection to {self.address} was lost: {self.error}")
+            self.pending.append(future)
+            send_message(self.connection, {"kind": kind, **(header or {})}, body, self.compress)
+        return future
+
+    def call(self, kind: str, header: dict = None, body=b"") -> tuple:
+        return self.request(kind, header, body).result()
+
+    def read_responses(self) -> None:
+        try:
+            while True:
+                message = receive_message(self.connection)
+                if message is None:
+                    raise ConnectionError("the receiver closed the connection")
+                header, body = message
+                future = self.pending.popleft()
+                if header.get("ok"):
+                    future.set_result((header, body))
+                else:
+                    future.set_exception(REMOTE_ERRORS.get(header.get("error"), OSError)(header.get("message")))
+        except Exception as e:
+            with self.lock:
+                self.error = e
+                pending = list(self.pending)
+                self.pending.clear()
+            if not self.closed:
+                self.logger.error(f"Error: the connection to the replica receiver {self.address} was lost: {type(e).__name__} - {e}")
+            for future in pending:
+                future.set_exception(ConnectionError(f"the connection to {self.address} was lost: {e}"))
+
+    def scan(self, subtree: str = "", prune=None, path_filter=None) -> dict:
+        return dict(self.walk(path_filter, subtree=subtree))
+
+    def scan_subtrees(self, subtrees: list, path_filter=None) -> dict:
+        manifest = {}
+        for subtree in subtrees:
+            manifest.update(self.walk(path_filter, subtree=subtree))
+        return manifest
+
+    def walk(self, path_filter=None, after: str = None, subtree: str = ""):
+        """
+        This function walks the replica the way TreeScanner.walk does, yielding the entries as the pages of the walk
+        of the receiver arrive. The next page is asked for before the entries of the current one are yielded, so the
+        receiver walks while they are processed here.
+
+        Args:
+            path_filter: PathFilter | None
+            after: str | None, relative path the walk resumes right after
+            subtree: str
+
+        Yields:
+            (relative_path, ManifestEntry): tuple
+        """
+
+        header = {"subtree": to_wire(subtree), "filter": filter_patterns(path_filter), "limit": SCAN_PAGE}
+        future = self.request("scan", {**header, "after": to_wire(after) if after is not None else None})
+        while future is not None:
+            response, body = future.result()
+            entries = json.loads(body)
+            future = None
+            if not response["done"]:
+                future = self.request("scan", {**header, "after": entries[-1][0]})
+            for path, *entry in entries:
+                yield from_wire(path), ManifestEntry(*entry)
+
+    def is_dir(self, relative_path: str) -> bool:
+        return self.call("stat", {"path": to_wire(relative_path)})[0]["is_dir"]
+
+    def directory_mtime(self, relative_path: str):
+        return self.call("stat", {"path": to_wire(relative_path)})[0]["mtime_ns"]
+
+    def file_digests(self, relative_paths: list, algorithm: str = DEFAULT_DIGEST, throttle=None) -> dict:
+        header, _ = self.call("digests", {"paths": [to_wire(path) for path in relative_paths], "algorithm": algorithm})
+        return dict(zip(relative_paths, header["digests"]))
+
+    def file_digest(self, relative_path: str, algorithm: str = DEFAULT_DIGEST, throttle=None) -> str:
+        return self.file_digests([relative_path], algorithm, throttle)[relative_path]
+
+    def make_directory(self, relative_path: str) -> None:
+        self.call("mkdir", {"path": to_wire(relative_path)})
+
+    def move(self, origin: str, target: str) -> None:
+        self.call("move", {"origin": to_wire(origin), "path": to_wire(target)})
+
+    def remove_file(self, relative_path: str) -> None:
+        self.call("remove", {"path": to_wire(relative_path)})
+
+    def remove_directory(self, relative_dir: str, path_filter=None) -> bool:
+        return self.call("rmdir", {"path": to_wire(relative_dir), "filter": filter_patterns(path_filter)})[0]["removed"]
+
+    def copy_file(self, source_path: str, relative_path: str, throttle=None, journal=None):
+        """
+        This function sends a file to the replica, in a batch of its own when it's small, and otherwise streaming its
+        data extents in pipelined chunks to a temporary file the receiver renames over the target once complete.
+
+        Args:
+            source_path: str
+            relative_path: str
+            throttle: Throttle | None
+            journal: OperationJournal | None, not used, the receiver writes through temporary files instead
+
+        Returns:
+            CopyResult: the bytes sent, or None when an error was logged instead.
+        """
+
+        try:
+            if os.path.getsize(source_path) <= self.batch_bytes // 10:
+                result = self.copy_files([(source_path, relative_path)], throttle)[0]
+                if isinstance(result, Exception):
+                    raise result
+                return result
+
+            path = to_wire(relative_path)
+            futures = [self.request("begin", {"path": path})]
+            sent = 0
+            try:
+                with open(source_path, "rb", buffering=0) as source_file:
+                    metadata = file_metadata(os.fstat(source_file.fileno()))
+                    chunk_size = throttle.chunk_size(WRITE_CHUNK) if throttle is not None else WRITE_CHUNK
+                    for start, end in FileOperator.data_extents(source_file.fileno(), 0, metadata["size"]):
+                        source_file.seek(start)
+                        position = start
+                        while position < end:
+                            data = source_file.read(min(chunk_size, end - position))
+                            if not data:
+                                # the receiver would fill the missing end with zeros up to the size sent in the commit
+                                raise OSError(f"{source_path} got shorter while it was sent")
+                            if throttle is not None:
+                                throttle.transfer(len(data))
+                            futures.append(self.request("write", {"path": path, "offset": position}, data))
+                            position += len(data)
+                            sent += len(data)
+                futures.append(self.request("commit", {"path": path, **metadata}))
+                for future in futures:
+                    future.result()
+            except BaseException:
+                if self.error is None:
+                    self.request("abort", {"path": path})
+                raise
+            return CopyResult(REMOTE, sent)
+        except Exception as e:
+            self.logger.error(f"ERROR: could not send {source_path} to the replica {self.address}: {type(e).__name__} - {e}")
+            return None
+
+    def copy_files(self, items: list, throttle=None, journal=None) -> list:
+        """
+        This function sends many small files in a single message, and returns for every one of them its CopyResult,
+        or the exception it failed with.
+
+        Args:
+            items: list of (source_path, relative_path) tuples
+            throttle: Throttle | None
+            journal: OperationJournal | None, not used
+
+        Returns:
+            results: list of CopyResult | Exception
+        """
+
+        results = [None] * len(items)
+        files = []
+        sent = []
+        body = bytearray()
+        for position, (source_path, relative_path) in enumerate(items):
+            try:
+                with open(source_path, "rb") as source_file:
+                    metadata = file_metadata(os.fstat(source_file.fileno()))
+                    data = source_file.read()
+            except OSError as e:
+                results[position] = e
+                continue
+            metadata["size"] = len(data)
+            files.append({"path": to_wire(relative_path), **metadata})
+            sent.append(position)
+            body += data
+        if not files:
+            return results
+
+        if throttle is not None:
+            throttle.transfer(len(body))
+        try:
+            errors = self.call("write_batch", {"files": files}, body)[0]["errors"]
+        except Exception as e:
+            errors = [[type(e).__name__, str(e)]] * len(files)
+        for position, file, error in zip(sent, files, errors):
+            if error is None:
+                results[position] = CopyResult(REMOTE_BATCH, file["size"])
+            else:
+                results[position] = REMOTE_ERRORS.get(error[0], OSError)(error[1])
+        return results
+
+    def update_file(self, source_path: str, relative_path: str, throttle=None):
+        """
+        This function updates a replica file modified in part: the receiver sends the block signature of its copy, the
+        delta against it is computed here with DeltaTransfer, and only its literals are sent for the receiver to apply.
+
+        Args:
+            source_path: str
+            relative_path: str
+            throttle: Throttle | None
+
+        Returns:
+            CopyResult: the delta method used by the receiver and the bytes it wrote, or None when the file has to be
+            copied in full instead.
+        """
+
+        path = to_wire(relative_path)
+        try:
+            _, body = self.call("signature", {"path": path, "block_size": BLOCK_SIZE})
+            signature = {}
+            for weak, offset, strong in SIGNATURE_ENTRY.iter_unpack(body):
+                signature.setdefault(weak, []).append((strong, offset))
+            # the literals are held in memory to be sent, which the literal budget also bounds
+            operations = DeltaTransfer.compute_delta(source_path, signature, BLOCK_SIZE, throttle,
+                                                     DeltaTransfer.literal_budget(os.path.getsize(source_path)))
+            if operations is None:
+                self.logger.debug(f"too much of {relative_path} changed for a delta update, sending the whole file")
+                return None
+
+            literals = bytearray()
+            with open(source_path, "rb") as source_file:
+                metadata = file_metadata(os.fstat(source_file.fileno()))
+                for operation in operations:
+                    if operation.basis_offset is None:
+                        source_file.seek(operation.target_offset)
+                        literals += source_file.read(operation.length)
+            if throttle is not None:
+                throttle.transfer(len(literals))
+            header, _ = self.call("apply_delta", {"path": path, "operations": [list(operation) for operation in operations],
+                                                  **metadata}, literals)
+            return CopyResult(header["method"], header["bytes"])
+        except Exception as e:
+            self.logger.error(f"ERROR: delta update failed: {source_path} - {relative_path} in {self.address}")
+            self.logger.error(f"{type(e).__name__} - {e}")
+            return None
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+        self.reader.join(timeout=5)
+
+
+class ReceiverServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ReceiverHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        self.server.receiver.handle_connection(self.request)
+
+
+class ReceiverSession:
+    """
+    This class holds the state of one connection to the receiver: whether it said hello, whether its responses are
+    compressed, the temporary files of the copies it is streaming, and the walks of the replica it is reading.
+
+    Attributes:
+        authenticated: bool
+        compress: bool
+        open_files: dict, relative path to (file, temporary_path, target_path)
+        walks: dict, (subtree, filter, last path sent) to the walk that goes on from there
+    """
+
+    def __init__(self):
+        self.authenticated = False
+        self.compress = False
+        self.open_files = {}
+        self.walks = {}
+
+
+class ReplicaReceiver:
+    """
+    This class represents the receiving end of the replication protocol, serving a local folder to RemoteReplica
+    senders, one thread per connection. The requests of a connection are applied in the order they arrive, through a
+    LocalReplica of the folder, and answered in that same order. Every path is checked to stay inside the folder.
+
+    The protocol has no encryption: the receiver is meant for trusted networks, or to be reached through an SSH tunnel.
+    When a token is set, the connections that do not present it in their hello are closed.
+
+    Attributes:
+        root_folder: str
+        logger: logger
+        token: str | None
+        address: str, host:port the receiver listens on
+    """
+
+    def __init__(self, root_folder: str, logger, address: str = "127.0.0.1:0", token: str = None):
+        self.root_folder = root_folder
+        self.logger = logger
+        self.token = token
+        self.replica = LocalReplica(root_folder, logger)
+        os.makedirs(root_folder, exist_ok=True)
+        self.server = ReceiverServer(parse_address(address), ReceiverHandler)
+        self.server.receiver = self
+        self.thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.serve_forever, name="syncfold-receiver", daemon=True)
+        self.thread.start()
+
+    def serve_forever(self) -> None:
+        self.logger.info(f"receiving the replica {self.root_folder} on {self.address}")
+        self.server.serve_forever()
+
+    def shutdown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+
+    def handle_connection(self, connection: socket.socket) -> None:
+        """
+        This function answers the requests of one connection until it's closed. The error raised by a request is sent
+        back in its response, without closing the connection, except for a failed hello.
+
+        Args:
+            connection: socket.socket
+
+        Returns:
+            None
+        """
+
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = ReceiverSession()
+        try:
+            while True:
+                message = receive_message(connection)
+                if message is None:
+                    break
+                header, body = message
+                kind = header.get("kind")
+                try:
+                    if not session.authenticated and kind != "hello":
+                        raise PermissionError("the connection has to start with a hello")
+                    handler = getattr(self, f"handle_{kind}", None) if kind in REQUEST_KINDS else None
+                    if handler is None:
+                        raise ValueError(f"Unknown request: {kind}.")
+                    response_header, response_body = handler(session, header, body)
+                    response_header["ok"] = True
+                except Exception as e:
+                    response_header, response_body = {"ok": False, "error": type(e).__name__, "message": str(e)}, b""
+                send_message(connection, response_header, response_body, session.compress)
+                if not session.authenticated:
+                    break
+        except (ConnectionError, OSError, ValueError) as e:
+            self.logger.error(f"Error: the connection of a sender was lost: {type(e).__name__} - {e}")
+        finally:
+            for file, temporary_path, _ in session.open_files.values():
+                file.close()
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+
+    def resolve(self, relative_path: str) -> str:
+        """
+        This function checks that a relative path sent by a sender stays inside the replica folder, and returns it
+        with the separators of this system.
+
+        Args:
+            relative_path: str
+
+        Returns:
+            relative_path: str, "" for the root of the replica
+
+        Raises:
+            PermissionError: When the path is absolute or goes out of the replica folder.
+        """
+
+        normalized = os.path.normpath(from_wire(relative_path or "."))
+        if os.path.isabs(normalized) or normalized == os.pardir or normalized.startswith(os.pardir + os.sep):
+            raise PermissionError(f"path out of the replica folder: {relative_path}")
+        return "" if normalized == os.curdir else normalized
+
+    @staticmethod
+    def apply_metadata(file_path: str, header: dict) -> None:
+        os.chmod(file_path, header["mode"])
+        os.utime(file_path, ns=(header["atime_ns"], header["mtime_ns"]))
+
+    def handle_hello(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        if header.get("version") != PROTOCOL_VERSION:
+            raise ValueError(f"Unsupported protocol version: {header.get('version')}. Expected {PROTOCOL_VERSION}.")
+        if self.token is not None and not hmac.compare_digest(str(header.get("token") or ""), self.token):
+            raise PermissionError("invalid token")
+        session.authenticated = True
+        session.compress = bool(header.get("compress"))
+        return {}, b""
+
+    def handle_scan(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        """
+        This function sends the next page of a walk of the replica, the entries that follow the path passed in after.
+        The walk a page stops in is kept in the session, so the next page goes on from there, and a walk that is not
+        found there anymore is resumed from the path instead.
+
+        Args:
+            session: ReceiverSession
+            header: dict
+            body: bytes
+
+        Returns:
+            (header, body): tuple, the body holding the JSON list of [path, *ManifestEntry] entries
+        """
+
+        subtree = self.resolve(header["subtree"])
+        after = self.resolve(header["after"]) if header.get("after") is not None else None
+        limit = max(1, min(int(header.get("limit") or SCAN_PAGE), SCAN_PAGE))
+        key = (subtree, json.dumps(header.get("filter")))
+        walk = session.walks.pop(key + (after,), None)
+        if walk is None:
+            path_filter = PathFilter(header["filter"]) if header.get("filter") is not None else None
+            walk = TreeScanner.walk(self.replica.root_folder, self.logger, subtree, path_filter, after)
+
+        entries = [[to_wire(path), *entry] for path, entry in itertools.islice(walk, limit)]
+        done = len(entries) < limit
+        if not done:
+            session.walks[key + (from_wire(entries[-1][0]),)] = walk
+            while len(session.walks) > MAX_OPEN_WALKS:
+                session.walks.pop(next(iter(session.walks)))
+        return {"done": done}, json.dumps(entries, separators=(",", ":")).encode("utf-8")
+
+    def handle_stat(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        relative_path = self.resolve(header["path"])
+        return {"is_dir": self.replica.is_dir(relative_path), "mtime_ns": self.replica.directory_mtime(relative_path)}, b""
+
+    def handle_digests(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        FileOperator.new_digest(header["algorithm"])
+        relative_paths = [self.resolve(path) for path in header["paths"]]
+        digests = self.replica.file_digests(relative_paths, header["algorithm"])
+        return {"digests": [digests[path] for path in relative_paths]}, b""
+
+    def handle_mkdir(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        self.replica.make_directory(self.resolve(header["path"]))
+        return {}, b""
+
+    def handle_move(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        self.replica.move(self.resolve(header["origin"]), self.resolve(header["path"]))
+        return {}, b""
+
+    def handle_remove(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        self.replica.remove_file(self.resolve(header["path"]))
+        return {}, b""
+
+    def handle_rmdir(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        path_filter = PathFilter(header["filter"]) if header.get("filter") is not None else None
+        relative_path = self.resolve(header["path"])
+        if not relative_path:
+            raise PermissionError("the root of the replica can not be removed")
+        return {"removed": self.replica.remove_directory(relative_path, path_filter)}, b""
+
+    def handle_begin(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        target_path = self.replica.path(self.resolve(header["path"]))
+        temporary_path = FileOperator.temporary_path(target_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        session.open_files[header["path"]] = (open(temporary_path, "wb"), temporary_path, target_path)
+        return {}, b""
+
+    def handle_write(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        if header["path"] not in session.open_files:
+            raise OSError(f"no copy of {header['path']} in progress")
+        file = session.open_files[header["path"]][0]
+        file.seek(header["offset"])
+        file.write(body)
+        return {}, b""
+
+    def handle_commit(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        if header["path"] not in session.open_files:
+            raise OSError(f"no copy of {header['path']} in progress")
+        file, temporary_path, target_path = session.open_files.pop(header["path"])
+        try:
+            # the holes of a sparse source were not sent, extending the file to its size leaves them as holes here too
+            file.truncate(header["size"])
+            file.close()
+            self.apply_metadata(temporary_path, header)
+            os.replace(temporary_path, target_path)
+        except BaseException:
+            file.close()
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return {}, b""
+
+    def handle_abort(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        file, temporary_path, _ = session.open_files.pop(header["path"], (None, None, None))
+        if file is not None:
+            file.close()
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return {}, b""
+
+    def handle_write_batch(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        errors = []
+        offset = 0
+        for file in header["files"]:
+            data = memoryview(body)[offset:offset + file["size"]]
+            offset += file["size"]
+            temporary_path = None
+            try:
+                target_path = self.replica.path(self.resolve(file["path"]))
+                temporary_path = FileOperator.temporary_path(target_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                with open(temporary_path, "wb") as temporary_file:
+                    temporary_file.write(data)
+                self.apply_metadata(temporary_path, file)
+                os.replace(temporary_path, target_path)
+                errors.append(None)
+            except Exception as e:
+                if temporary_path is not None and os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                errors.append([type(e).__name__, str(e)])
+        return {"errors": errors}, b""
+
+    def handle_signature(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        basis_path = self.replica.path(self.resolve(header["path"]))
+        signature = DeltaTransfer.build_signature(basis_path, header["block_size"])
+        packed = bytearray()
+        for weak, blocks in signature.items():
+            for strong, offset in blocks:
+                packed += SIGNATURE_ENTRY.pack(weak, offset, strong)
+        return {}, packed
+
+    def handle_apply_delta(self, session: ReceiverSession, header: dict, body: bytes) -> tuple:
+        """
+        This function applies a delta sent with its literals only. The literals are written at their offsets in a
+        sparse temporary file of the size of the new target, which DeltaTransfer.apply_delta then reads as the source.
+
+        Args:
+            session: ReceiverSession
+            header: dict
+            body: bytes
+
+        Returns:
+            (header, body): tuple
+        """
+
+        basis_path = self.replica.path(self.resolve(header["path"]))
+        operations = [DeltaOperation(*operation) for operation in header["operations"]]
+        literals_path = os.path.join(os.path.dirname(basis_path), f".{os.path.basename(basis_path)}.syncfold-literals")
+        try:
+            with open(literals_path, "wb") as literals_file:
+                literals_file.truncate(header["size"])
+                offset = 0
+                for operation in operations:
+                    if operation.basis_offset is None:
+                        literals_file.seek(operation.target_offset)
+                        literals_file.write(memoryview(body)[offset:offset + operation.length])
+                        offset += operation.length
+            result = DeltaTransfer.apply_delta(literals_path, basis_path, operations)
+            self.apply_metadata(basis_path, header)
+        finally:
+            if os.path.exists(literals_path):
+                os.remove(literals_path)
+        return {"method": result.method, "bytes": result.bytes_copied}, b""
+
+
+REQUEST_KINDS = ("hello", "scan", "stat", "digests", "mkdir", "move", "remove", "rmdir", "begin", "write", "commit", "abort",
+                 "write_batch", "signature", "apply_delta")
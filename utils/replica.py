@@ -0,0 +1,131 @@
+from utils.scanner import TreeScanner
+from utils.delta import DeltaTransfer
+from utils.files import FileOperator, DEFAULT_DIGEST
+import shutil
+import os
+
+
+class LocalReplica:
+    """
+    This class represents the replica backend of a folder reachable through the local file system, which is the default
+    one. Every change the synchronizer makes in the replica goes through a backend, so the same plan can be applied to a
+    local folder or, with a RemoteReplica, to a folder on another machine. The paths passed to the methods are relative
+    to the root folder of the replica.
+
+    Attributes:
+        root_folder: str
+        logger: logger
+        remote: bool, False, the files of the replica can be read directly with the paths from path()
+        batch_bytes: int, 0, the copies of small files are not worth grouping
+    """
+
+    remote = False
+    batch_bytes = 0
+
+    def __init__(self, root_folder: str, logger):
+        self.root_folder = root_folder
+        self.logger = logger
+
+    def path(self, relative_path: str) -> str:
+        return os.path.join(self.root_folder, relative_path) if relative_path else self.root_folder
+
+    def scan(self, subtree: str = "", prune=None, path_filter=None) -> dict:
+        return TreeScanner.scan(self.root_folder, self.logger, subtree, prune, path_filter)
+
+    def scan_subtrees(self, subtrees: list, path_filter=None) -> dict:
+        return TreeScanner.scan_subtrees(self.root_folder, subtrees, self.logger, path_filter)
+
+    def walk(self, path_filter=None, after: str = None):
+        return TreeScanner.walk(self.root_folder, self.logger, path_filter=path_filter, after=after)
+
+    def is_dir(self, relative_path: str) -> bool:
+        return os.path.isdir(self.path(relative_path))
+
+    def directory_mtime(self, relative_path: str):
+        try:
+            return os.stat(self.path(relative_path)).st_mtime_ns
+        except OSError:
+            return None
+
+    def file_digests(self, relative_paths: list, algorithm: str = DEFAULT_DIGEST, throttle=None) -> dict:
+        digests = {}
+        for relative_path in relative_paths:
+            digests[relative_path] = FileOperator.hash_file(self.path(relative_path), self.logger, algorithm, throttle=throttle)
+        return digests
+
+    def file_digest(self, relative_path: str, algorithm: str = DEFAULT_DIGEST, throttle=None) -> str:
+        return self.file_digests([relative_path], algorithm, throttle)[relative_path]
+
+    def make_directory(self, relative_path: str) -> None:
+        os.makedirs(self.path(relative_path), exist_ok=True)
+
+    def move(self, origin: str, target: str) -> None:
+        # parent directories created here are also in the plan, which is why MKDIR tolerates existing ones
+        os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+        os.rename(self.path(origin), self.path(target))
+
+    def remove_file(self, relative_path: str) -> None:
+        os.remove(self.path(relative_path))
+
+    def remove_directory(self, relative_dir: str, path_filter=None) -> bool:
+        """
+        This function removes a directory of the replica with everything inside it, except for the entries the path
+        filter excludes, which are kept together with the directories holding them.
+
+        Args:
+            relative_dir: str
+            path_filter: PathFilter | None
+
+        Returns:
+            removed: bool, False when the directory was kept for the excluded entries inside it
+        """
+
+        directory_path = self.path(relative_dir)
+        if path_filter is None:
+            shutil.rmtree(directory_path)
+            return True
+
+        kept = False
+        with os.scandir(directory_path) as entries:
+            entries = list(entries)
+        for entry in entries:
+            relative_path = os.path.join(relative_dir, entry.name)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if path_filter.is_excluded(relative_path, is_dir):
+                kept = True
+            elif is_dir:
+                kept = not self.remove_directory(relative_path, path_filter) or kept
+            else:
+                os.remove(entry.path)
+        if not kept:
+            os.rmdir(directory_path)
+        return not kept
+
+    def copy_file(self, source_path: str, relative_path: str, throttle=None, journal=None):
+        return FileOperator.replicate_file(source_path, self.path(relative_path), self.logger, throttle, journal)
+
+    def copy_files(self, items: list, throttle=None, journal=None) -> list:
+        """
+        This function copies many files, returning for every one of them its CopyResult, or the exception it failed
+        with, so the backends that send the files in batches can be used the same way.
+
+        Args:
+            items: list of (source_path, relative_path) tuples
+            throttle: Throttle | None
+            journal: OperationJournal | None
+
+        Returns:
+            results: list of CopyResult | Exception
+        """
+
+        results = []
+        for source_path, relative_path in items:
+            result = self.copy_file(source_path, relative_path, throttle, journal)
+            results.append(result if result is not None else OSError(f"could not copy {relative_path} to the replica."))
+        return results
+
+    def update_file(self, source_path: str, relative_path: str, throttle=None):
+        return DeltaTransfer.update_file(source_path, self.path(relative_path), self.logger, throttle=throttle)
+
+    def close(self) -> None:
+        pass
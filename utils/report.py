@@ -0,0 +1,149 @@
+import threading
+import time
+
+# phases that only read the trees, left out of the time the throughput is measured over
+SCAN = "scan"
+DIFF = "diff"
+INDEX = "index"
+NON_TRANSFER_PHASES = (SCAN, DIFF, INDEX)
+
+
+class CycleReport:
+    """
+    This class collects what happened during one synchronization cycle: how many operations of each kind were applied,
+    the bytes they involved, and the errors raised by the operations that failed, so one failing file does not stop
+    the rest of the cycle.
+
+    It also keeps the metrics of the cycle: the time spent in every phase, the files hashed and the files found
+    unchanged, with their bytes, and the deepest the worker pool queue got.
+
+    Attributes:
+        started_at: float
+        finished_at: float | None
+        operations: dict
+        copy_methods: dict
+        errors: list
+        phases: dict
+        hashed: dict
+        unchanged: dict
+        max_queue_depth: int
+        scrub: dict | None, progress of the scrubber when the cycle finished, when there's one
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.finished_at = None
+        self.operations = {}
+        self.copy_methods = {}
+        self.errors = []
+        self.phases = {}
+        self.hashed = {"count": 0, "bytes": 0}
+        self.unchanged = {"count": 0, "bytes": 0}
+        self.max_queue_depth = 0
+        self.scrub = None
+
+    def record_success(self, operation) -> None:
+        with self.lock:
+            totals = self.operations.setdefault(operation.kind, {"count": 0, "bytes": 0})
+            totals["count"] += 1
+            totals["bytes"] += operation.size
+
+    def record_copy(self, result) -> None:
+        with self.lock:
+            totals = self.copy_methods.setdefault(result.method, {"count": 0, "bytes": 0})
+            totals["count"] += 1
+            totals["bytes"] += result.bytes_copied
+
+    def record_error(self, operation, error: Exception) -> None:
+        with self.lock:
+            self.errors.append({
+                "kind": operation.kind,
+                "path": operation.path,
+                "error": f"{type(error).__name__} - {error}",
+            })
+
+    def record_phase(self, phase: str, seconds: float) -> None:
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def record_hash(self, size: int) -> None:
+        with self.lock:
+            self.hashed["count"] += 1
+            self.hashed["bytes"] += size
+
+    def record_unchanged(self, size: int) -> None:
+        with self.lock:
+            self.unchanged["count"] += 1
+            self.unchanged["bytes"] += size
+
+    def finish(self) -> None:
+        self.finished_at = time.time()
+
+    @property
+    def duration(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def bytes_copied(self) -> int:
+        return sum(totals["bytes"] for totals in self.copy_methods.values())
+
+    @property
+    def throughput(self) -> float:
+        """
+        This property returns the bytes written to the replica per second of the phases that applied operations, or
+        of the whole cycle when no phase was timed.
+        """
+
+        seconds = sum(seconds for phase, seconds in self.phases.items() if phase not in NON_TRANSFER_PHASES) or self.duration
+        return self.bytes_copied / seconds if seconds > 0 else 0.0
+
+    def has_errors(self) -> bool:
+        return len(self.errors) > 0
+
+    def summary(self) -> str:
+        """
+        This function returns a single line with the totals of the cycle, logged in place of a line per file.
+
+        Args:
+            None
+
+        Returns:
+            summary: str
+        """
+
+        with self.lock:
+            parts = [f"{kind} {totals['count']} ({totals['bytes']} bytes)" for kind, totals in sorted(self.operations.items())]
+            parts.append(f"unchanged {self.unchanged['count']} ({self.unchanged['bytes']} bytes)")
+            parts.append(f"hashed {self.hashed['count']} ({self.hashed['bytes']} bytes)")
+            parts.append(f"errors {len(self.errors)}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        """
+        This function returns the report of the cycle as a dictionary that can be serialized to JSON.
+
+        Args:
+            None
+
+        Returns:
+            report: dict
+        """
+
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "duration_seconds": self.duration,
+                "phases": dict(self.phases),
+                "operations": {kind: dict(totals) for kind, totals in self.operations.items()},
+                "copy_methods": {method: dict(totals) for method, totals in self.copy_methods.items()},
+                "hashed": dict(self.hashed),
+                "unchanged": dict(self.unchanged),
+                "bytes_copied": self.bytes_copied,
+                "throughput_bytes_per_second": self.throughput,
+                "max_queue_depth": self.max_queue_depth,
+                "scrub": dict(self.scrub) if self.scrub is not None else None,
+                "error_count": len(self.errors),
+                "errors": list(self.errors),
+            }
@@ -0,0 +1,256 @@
+from typing import NamedTuple
+import os
+
+FILE = "file"
+DIRECTORY = "dir"
+
+
+class ManifestEntry(NamedTuple):
+    """
+    This class represents a single entry of a tree manifest, holding the metadata collected for a path while scanning.
+
+    Attributes:
+        kind: str
+        size: int
+        mtime_ns: int
+        inode: int
+        mode: int
+    """
+
+    kind: str
+    size: int
+    mtime_ns: int
+    inode: int
+    mode: int
+
+    @property
+    def is_dir(self) -> bool:
+        return self.kind == DIRECTORY
+
+    @property
+    def is_file(self) -> bool:
+        return self.kind == FILE
+
+
+class TreeScanner:
+    """
+    This class has the method operations used to walk a directory tree a single time, building an in-memory manifest
+    that maps every relative path inside the tree to the metadata of the entry.
+
+    Attributes:
+        None
+    """
+
+    @staticmethod
+    def scan(root_folder: str, logger, subtree: str = "", prune=None, path_filter=None) -> dict:
+        """
+        This function walks the passed folder with one os.scandir pass per directory, and returns a manifest with
+        the relative path of every file and directory found, mapped to its ManifestEntry. When a subtree is passed,
+        only the entries below that relative directory are walked, still keyed by their path relative to the root.
+
+        When a prune callback is passed, it's called with the relative path and the mtime_ns of every directory before
+        it's listed. For the directories it returns True for, only the subdirectories are stat'ed, recorded and walked,
+        while the rest of the entries are left out of the manifest.
+
+        When a path filter is passed, the excluded entries are left out before they are stat'ed, and the excluded
+        directories are never entered.
+
+        Args:
+            root_folder: str
+            logger: logger
+            subtree: str
+            prune: callable(relative_dir, mtime_ns) -> bool | None
+            path_filter: PathFilter | None
+
+        Returns:
+            manifest: dict
+
+        Raises:
+            PermissionError: When the user that run the program does not have enough permissions to read a directory, the directory is skipped and logged.
+            OSError: Whenever there's some type of error or crash originated in the Operative System, the directory is skipped and logged.
+        """
+
+        manifest = {}
+        if not os.path.isdir(os.path.join(root_folder, subtree)):
+            return manifest
+        if path_filter is not None and path_filter.is_inside_excluded(subtree):
+            return manifest
+
+        pending = [(subtree, None)]
+        while pending:
+            relative_dir, mtime_ns = pending.pop()
+            current_dir = os.path.join(root_folder, relative_dir) if relative_dir else root_folder
+            try:
+                if prune is not None and mtime_ns is None:
+                    mtime_ns = os.stat(current_dir).st_mtime_ns
+                only_directories = prune is not None and prune(relative_dir, mtime_ns)
+
+                with os.scandir(current_dir) as entries:
+                    for entry in entries:
+                        if only_directories and not entry.is_dir(follow_symlinks=False):
+                            continue
+                        relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                        try:
+                            if path_filter is not None and path_filter.is_excluded(relative_path, entry.is_dir()):
+                                continue
+                            manifest_entry = TreeScanner.entry_from_dir_entry(entry)
+                        except OSError as e:
+                            logger.error(f"An unexpected error occurred while reading {entry.path}: {str(e)}")
+                            continue
+
+                        manifest[relative_path] = manifest_entry
+                        # Symlinked directories are listed but not descended into, same as os.walk does by default
+                        if manifest_entry.is_dir and not entry.is_symlink():
+                            pending.append((relative_path, manifest_entry.mtime_ns))
+            except PermissionError:
+                logger.error(f"Error: Permission denied while accessing files in the {current_dir} folder.")
+            except OSError as e:
+                logger.error(f"An unexpected error occurred while walking through the folder: {str(e)}")
+
+        return manifest
+
+    @staticmethod
+    def walk(root_folder: str, logger, subtree: str = "", path_filter=None, after: str = None):
+        """
+        This function walks the passed folder lazily, in depth first order with the entries of every directory sorted by
+        name, yielding the entries one at a time instead of building a manifest. The resulting order is the one of the
+        paths compared component by component, so two trees walked this way can be merge-joined in a single pass, and
+        only the pending entries of the directories being walked are kept in memory.
+
+        A directory that disappears before its entries are listed, for instance because it was just removed from the
+        replica, is treated as empty. The entries excluded by the path filter are left out, the same way scan does.
+
+        When a path is passed in after, the walk resumes right after it: the directories that sort entirely before it
+        are never listed, only the ones along its chain of ancestors are, so resuming costs one listing per ancestor.
+
+        Args:
+            root_folder: str
+            logger: logger
+            subtree: str
+            path_filter: PathFilter | None
+            after: str | None, relative path inside the subtree, the walk yields the entries that sort after it
+
+        Yields:
+            (relative_path, ManifestEntry): tuple
+        """
+
+        if not os.path.isdir(os.path.join(root_folder, subtree)):
+            return
+        if path_filter is not None and path_filter.is_inside_excluded(subtree):
+            return
+
+        pending = []
+        if after:
+            relative_dir = subtree
+            for name in (after[len(subtree) + 1:] if subtree else after).split(os.sep):
+                entries = TreeScanner.sorted_entries(root_folder, relative_dir, logger, path_filter, start=name)
+                ancestor = entries[0] if entries and os.path.basename(entries[0][0]) == name else None
+                pending.append(iter(entries[1:] if ancestor is not None else entries))
+                if ancestor is None or not ancestor[1].is_dir or ancestor[2]:
+                    break
+                relative_dir = ancestor[0]
+            else:
+                # the path walked last is a directory, whose entries all come after it
+                pending.append(iter(TreeScanner.sorted_entries(root_folder, relative_dir, logger, path_filter)))
+        else:
+            pending.append(iter(TreeScanner.sorted_entries(root_folder, subtree, logger, path_filter)))
+        while pending:
+            item = next(pending[-1], None)
+            if item is None:
+                pending.pop()
+                continue
+
+            relative_path, manifest_entry, is_symlink = item
+            yield relative_path, manifest_entry
+            # Symlinked directories are listed but not descended into, same as os.walk does by default
+            if manifest_entry.is_dir and not is_symlink:
+                pending.append(iter(TreeScanner.sorted_entries(root_folder, relative_path, logger, path_filter)))
+
+    @staticmethod
+    def sorted_entries(root_folder: str, relative_dir: str, logger, path_filter=None, start: str = None) -> list:
+        """
+        This function lists a single directory of the tree, sorted by name, without the entries the path filter excludes,
+        nor, when a start name is passed, the entries whose name sorts before it, which are not even stat'ed.
+
+        Args:
+            root_folder: str
+            relative_dir: str
+            logger: logger
+            path_filter: PathFilter | None
+            start: str | None
+
+        Returns:
+            entries: list of (relative_path, ManifestEntry, is_symlink) tuples
+        """
+
+        current_dir = os.path.join(root_folder, relative_dir) if relative_dir else root_folder
+        entries = []
+        try:
+            with os.scandir(current_dir) as directory_entries:
+                for entry in directory_entries:
+                    if start is not None and entry.name < start:
+                        continue
+                    relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                    try:
+                        if path_filter is not None and path_filter.is_excluded(relative_path, entry.is_dir()):
+                            continue
+                        entries.append((relative_path, TreeScanner.entry_from_dir_entry(entry), entry.is_symlink()))
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        logger.error(f"An unexpected error occurred while reading {entry.path}: {str(e)}")
+        except FileNotFoundError:
+            return []
+        except PermissionError:
+            logger.error(f"Error: Permission denied while accessing files in the {current_dir} folder.")
+        except OSError as e:
+            logger.error(f"An unexpected error occurred while walking through the folder: {str(e)}")
+
+        entries.sort(key=lambda item: os.path.basename(item[0]))
+        return entries
+
+    @staticmethod
+    def entry_from_dir_entry(entry: os.DirEntry) -> ManifestEntry:
+        """
+        This function converts an os.DirEntry into a ManifestEntry, reusing the stat information cached by os.scandir
+        whenever the platform provides it.
+
+        Args:
+            entry: os.DirEntry
+
+        Returns:
+            ManifestEntry
+        """
+
+        stat = entry.stat()
+        kind = DIRECTORY if entry.is_dir() else FILE
+        return ManifestEntry(kind, stat.st_size if kind == FILE else 0, stat.st_mtime_ns, stat.st_ino, stat.st_mode)
+
+    @staticmethod
+    def scan_subtrees(root_folder: str, subtrees: list, logger, path_filter=None) -> dict:
+        """
+        This function builds one manifest with the entries below every one of the passed relative directories.
+        The subtrees must not be nested inside each other.
+
+        Args:
+            root_folder: str
+            subtrees: list
+            logger: logger
+            path_filter: PathFilter | None
+
+        Returns:
+            manifest: dict
+        """
+
+        manifest = {}
+        for subtree in subtrees:
+            manifest.update(TreeScanner.scan(root_folder, logger, subtree, path_filter=path_filter))
+        return manifest
+
+    @staticmethod
+    def files(manifest: dict) -> list:
+        return [path for path, entry in manifest.items() if entry.is_file]
+
+    @staticmethod
+    def directories(manifest: dict) -> list:
+        return [path for path, entry in manifest.items() if entry.is_dir]
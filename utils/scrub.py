@@ -0,0 +1,240 @@
+from utils.index import SOURCE
+from utils.scanner import ManifestEntry, FILE
+from utils.files import FileOperator, DEFAULT_DIGEST
+from utils.throttle import Throttle
+from utils.logger import SUMMARY
+import threading
+import json
+import os
+
+# bytes of the replica re-read after every cycle, unless another slice size is set
+DEFAULT_SCRUB_SLICE_BYTES = 1024 * 1024 * 1024
+# key the position of the scrubber is kept under in the index, so a restart resumes the pass where it was
+SCRUB_STATE = "scrub"
+
+
+class ReplicaScrubber:
+    """
+    This class represents the scrubber of a replica. The comparisons of the synchronization trust the metadata of the
+    files, so a replica file whose content rots on disk while its size and mtime stay the same would never be noticed.
+    After every cycle the scrubber re-reads, in a background thread and within its own bytes per second budget, the
+    next slice of the replica files in walk order, and compares their digests with the ones of their source files,
+    taken from the index when stored there. A file that does not match is confirmed by reading it a second time, and
+    repaired through the copy operation of the synchronizer, out of the cycles.
+
+    The files whose size or mtime differ from their source are left to the synchronization. Once the end of the
+    replica is reached, a pass is complete and the next one starts over from its first file.
+
+    Attributes:
+        source_folder: str
+        replica: LocalReplica | RemoteReplica
+        logger: logger
+        repair: callable, copies a file of the source over the replica, returns whether it succeeded
+        cycle_lock: threading.Lock, held by the synchronization cycles, and by the repairs so they never run during one
+        throttle: Throttle, the bytes per second budget of the scrubber
+        slice_bytes: int
+        index: HashIndex | None
+        algorithm: str
+        path_filter: PathFilter | None
+    """
+
+    def __init__(self, source_folder: str, replica, logger, repair, cycle_lock, bytes_per_second: int,
+                 slice_bytes: int = DEFAULT_SCRUB_SLICE_BYTES, index=None, algorithm: str = DEFAULT_DIGEST, path_filter=None):
+        self.source_folder = source_folder
+        self.replica = replica
+        self.logger = logger
+        self.repair = repair
+        self.cycle_lock = cycle_lock
+        self.throttle = Throttle(bytes_per_second)
+        self.slice_bytes = max(1, slice_bytes)
+        self.index = index
+        self.algorithm = algorithm
+        self.path_filter = path_filter
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+        state = json.loads(index.state(SCRUB_STATE) or "{}") if index is not None else {}
+        self.cursor = state.get("cursor")
+        self.passes = state.get("passes", 0)
+        self.pass_bytes = state.get("pass_bytes", 0)
+        self.replica_bytes = state.get("replica_bytes")
+        self.checked = {"count": 0, "bytes": 0}
+        self.mismatches = 0
+        self.repaired = 0
+        self.errors = 0
+
+    def start_slice(self) -> bool:
+        """
+        This function starts scrubbing the next slice of the replica in a background thread, unless the previous slice
+        is still running, which then goes on instead.
+
+        Args:
+            None
+
+        Returns:
+            started: bool
+        """
+
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self.thread = threading.Thread(target=self.run_slice, name="syncfold-scrubber", daemon=True)
+        self.thread.start()
+        return True
+
+    def run_slice(self) -> None:
+        """
+        This function scrubs the replica files that follow the position reached by the previous slice, until the slice
+        size is read or the end of the replica is reached, and saves the new position. The walk of the replica resumes
+        right after that position, so only the directories along its chain of ancestors are listed again.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+
+        scrubbed = 0
+        try:
+            for relative_path, entry in self.replica.walk(self.path_filter, after=self.cursor):
+                if self.stopping.is_set() or scrubbed >= self.slice_bytes:
+                    break
+                if entry.kind != FILE:
+                    continue
+                self.scrub_file(relative_path, entry)
+                scrubbed += entry.size
+                with self.lock:
+                    self.cursor = relative_path
+                    self.pass_bytes += entry.size
+            else:
+                with self.lock:
+                    self.passes += 1
+                    self.replica_bytes = self.pass_bytes
+                    self.pass_bytes = 0
+                    self.cursor = None
+                self.logger.log(SUMMARY, f"scrub pass {self.passes} of the replica completed ({self.replica_bytes} bytes).")
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred while scrubbing the replica: {type(e).__name__} - {e}")
+
+        self.save_state()
+        progress = self.progress()
+        coverage = f"{progress['coverage'] * 100:.1f}%" if progress["coverage"] is not None else "first pass"
+        self.logger.log(SUMMARY, f"scrub slice finished: {scrubbed} bytes checked, pass {progress['passes'] + 1} at {coverage}, "
+                                 f"mismatches {progress['mismatches']}, repaired {progress['repaired']}, errors {progress['errors']}")
+
+    def scrub_file(self, relative_path: str, entry: ManifestEntry) -> None:
+        """
+        This function compares the digest of a replica file, read again from the disk, with the digest of its source,
+        and repairs the replica file when they differ twice in a row while its source did not change.
+
+        Args:
+            relative_path: str
+            entry: ManifestEntry, of the replica file
+
+        Returns:
+            None
+        """
+
+        source_path = os.path.join(self.source_folder, relative_path)
+        try:
+            source_entry = self.stat_source(source_path)
+        except OSError:
+            return
+        if (source_entry.size, source_entry.mtime_ns) != (entry.size, entry.mtime_ns):
+            return
+
+        source_digest = self.source_digest(relative_path, source_path, source_entry)
+        replica_digest = self.replica_digest(relative_path, entry)
+        if source_digest is None or replica_digest is None:
+            with self.lock:
+                self.errors += 1
+            return
+        with self.lock:
+            self.checked["count"] += 1
+            self.checked["bytes"] += entry.size
+        if source_digest == replica_digest:
+            return
+
+        # a cycle may have been writing the file while it was read, so the mismatch is only trusted when it's read again
+        if self.replica_digest(relative_path, entry) == source_digest:
+            return
+        self.logger.error(f"Error: the replica file {relative_path} does not match its source, its content changed on disk.")
+        with self.lock:
+            self.mismatches += 1
+
+        with self.cycle_lock:
+            try:
+                unchanged = self.stat_source(source_path)[1:3] == source_entry[1:3]
+            except OSError:
+                unchanged = False
+            repaired = unchanged and self.repair(relative_path, source_entry.size)
+        if repaired:
+            with self.lock:
+                self.repaired += 1
+
+    @staticmethod
+    def stat_source(source_path: str) -> ManifestEntry:
+        source_stat = os.stat(source_path)
+        return ManifestEntry(FILE, source_stat.st_size, source_stat.st_mtime_ns, source_stat.st_ino, source_stat.st_mode)
+
+    def source_digest(self, relative_path: str, source_path: str, source_entry: ManifestEntry):
+        if self.index is not None:
+            digest = self.index.lookup(SOURCE, relative_path, source_entry, self.algorithm)
+            if digest is not None:
+                return digest
+        digest = FileOperator.hash_file(source_path, self.logger, self.algorithm, throttle=self.throttle)
+        if digest is not None and self.index is not None:
+            self.index.store(SOURCE, relative_path, source_entry, self.algorithm, digest)
+        return digest
+
+    def replica_digest(self, relative_path: str, entry: ManifestEntry):
+        # the receiver of a remote replica reads the file, the budget is taken here before asking for it
+        if self.replica.remote:
+            self.throttle.transfer(entry.size)
+        return self.replica.file_digest(relative_path, self.algorithm, self.throttle)
+
+    def progress(self) -> dict:
+        """
+        This function returns how far the scrubber got: the passes completed, the bytes read in the current pass and
+        the part of the replica they cover, known once a first pass completed, and the totals since the program started.
+
+        Args:
+            None
+
+        Returns:
+            progress: dict
+        """
+
+        with self.lock:
+            coverage = min(1.0, self.pass_bytes / self.replica_bytes) if self.replica_bytes else None
+            return {
+                "running": self.thread is not None and self.thread.is_alive(),
+                "passes": self.passes,
+                "cursor": self.cursor,
+                "pass_bytes": self.pass_bytes,
+                "replica_bytes": self.replica_bytes,
+                "coverage": coverage,
+                "checked": dict(self.checked),
+                "mismatches": self.mismatches,
+                "repaired": self.repaired,
+                "errors": self.errors,
+            }
+
+    def save_state(self) -> None:
+        if self.index is None:
+            return
+        with self.lock:
+            state = {"cursor": self.cursor, "passes": self.passes, "pass_bytes": self.pass_bytes, "replica_bytes": self.replica_bytes}
+        try:
+            self.index.store_state(SCRUB_STATE, json.dumps(state))
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred while saving the scrub position: {type(e).__name__} - {e}")
+
+    def wait(self, timeout: float = None) -> None:
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.wait()
@@ -0,0 +1,143 @@
+import random
+import os
+
+# mtime given to every generated file, so two trees generated with the same seed are identical, metadata included
+BASE_MTIME_NS = 1_600_000_000 * 1_000_000_000
+WRITE_BLOCK = 1024 * 1024
+
+
+class SyntheticTree:
+    """
+    This class generates reproducible synthetic trees to benchmark the synchronization on: the names, the sizes and the
+    contents of the files all come from a random generator seeded with the passed seed, so the same calls with the same
+    seed always build the same tree.
+
+    Attributes:
+        root_folder: str
+        seed: int
+    """
+
+    def __init__(self, root_folder: str, seed: int = 0):
+        self.root_folder = root_folder
+        self.seed = seed
+        self.random = random.Random(seed)
+        os.makedirs(root_folder, exist_ok=True)
+
+    def write_file(self, relative_path: str, size: int) -> None:
+        """
+        This function writes a file of the passed size with pseudo random content, one block at a time so huge files
+        do not need to fit in memory.
+
+        Args:
+            relative_path: str
+            size: int
+
+        Returns:
+            None
+        """
+
+        file_path = os.path.join(self.root_folder, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as file:
+            written = 0
+            while written < size:
+                block_size = min(WRITE_BLOCK, size - written)
+                file.write(self.random.randbytes(block_size))
+                written += block_size
+        os.utime(file_path, ns=(BASE_MTIME_NS, BASE_MTIME_NS))
+
+    def tiny_files(self, count: int, max_size: int = 4096, per_directory: int = 1000) -> None:
+        for number in range(count):
+            self.write_file(os.path.join("tiny", f"d{number // per_directory:04}", f"f{number:07}.dat"),
+                            self.random.randint(0, max_size))
+
+    def huge_files(self, count: int, size: int) -> None:
+        for number in range(count):
+            self.write_file(os.path.join("huge", f"file{number:03}.bin"), size)
+
+    def deep_nesting(self, depth: int, files_per_level: int = 2, size: int = 1024) -> None:
+        relative_dir = "deep"
+        for level in range(depth):
+            relative_dir = os.path.join(relative_dir, f"level{level:03}")
+            for number in range(files_per_level):
+                self.write_file(os.path.join(relative_dir, f"f{number}.dat"), size)
+
+    def wide_directory(self, count: int, size: int = 512) -> None:
+        for number in range(count):
+            self.write_file(os.path.join("wide", f"entry{number:07}.dat"), size)
+
+    def files(self) -> list:
+        """
+        This function returns the relative path of every file of the tree, sorted, so the files picked by the
+        modifications below only depend on the seed.
+
+        Args:
+            None
+
+        Returns:
+            files: list
+        """
+
+        files = []
+        for current_dir, _, file_names in os.walk(self.root_folder):
+            relative_dir = os.path.relpath(current_dir, self.root_folder)
+            for file_name in file_names:
+                files.append(os.path.normpath(os.path.join(relative_dir, file_name)))
+        return sorted(files)
+
+    def modify_files(self, fraction: float, length: int = 4096) -> list:
+        """
+        This function overwrites `length` bytes at a random offset of a fraction of the files, keeping their size, and
+        moves their mtime forward, the way an application editing files in place would.
+
+        Args:
+            fraction: float
+            length: int
+
+        Returns:
+            modified: list of the relative paths modified
+        """
+
+        files = self.files()
+        modified = sorted(self.random.sample(files, max(1, int(len(files) * fraction)) if files else 0))
+        for relative_path in modified:
+            file_path = os.path.join(self.root_folder, relative_path)
+            size = os.path.getsize(file_path)
+            offset = self.random.randint(0, max(0, size - length))
+            with open(file_path, "r+b") as file:
+                file.seek(offset)
+                file.write(self.random.randbytes(min(length, size)))
+            os.utime(file_path, ns=(BASE_MTIME_NS + 1_000_000_000, BASE_MTIME_NS + 1_000_000_000))
+        return modified
+
+    def rename_entries(self, file_count: int, directory_count: int = 1) -> list:
+        """
+        This function renames some of the files and of the directories of the tree, without touching their content.
+
+        Args:
+            file_count: int
+            directory_count: int
+
+        Returns:
+            renames: list of (old_relative_path, new_relative_path) tuples
+        """
+
+        renames = []
+        directories = sorted(
+            os.path.relpath(os.path.join(current_dir, name), self.root_folder)
+            for current_dir, names, _ in os.walk(self.root_folder) for name in names
+        )
+        # only leaf directories, so renaming one does not change the paths of the others picked
+        leaves = [path for path in directories if not any(other.startswith(path + os.sep) for other in directories)]
+        for relative_dir in sorted(self.random.sample(leaves, min(directory_count, len(leaves)))):
+            renamed = relative_dir + "_renamed"
+            os.rename(os.path.join(self.root_folder, relative_dir), os.path.join(self.root_folder, renamed))
+            renames.append((relative_dir, renamed))
+
+        files = self.files()
+        for relative_path in sorted(self.random.sample(files, min(file_count, len(files)))):
+            base, extension = os.path.splitext(relative_path)
+            renamed = f"{base}_renamed{extension}"
+            os.rename(os.path.join(self.root_folder, relative_path), os.path.join(self.root_folder, renamed))
+            renames.append((relative_path, renamed))
+        return renames
@@ -0,0 +1,45 @@
+from utils.logger import configure_logger
+from utils.compare import FileComparator, METADATA, HASH, PARANOID
+from utils.scanner import TreeScanner
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+# Creates two files with the same size and the same mtime, but different content, so only a policy that
+# reads the files can tell them apart
+def create_lookalike_files() -> tuple:
+    os.makedirs(".testing_compare/source", exist_ok=True)
+    os.makedirs(".testing_compare/destiny", exist_ok=True)
+    with open(".testing_compare/source/file.txt", "w") as file:
+        file.write("abc")
+    with open(".testing_compare/destiny/file.txt", "w") as file:
+        file.write("xyz")
+    mtime_ns = os.stat(".testing_compare/source/file.txt").st_mtime_ns
+    os.utime(".testing_compare/destiny/file.txt", ns=(mtime_ns, mtime_ns))
+
+    source_entry = TreeScanner.scan(".testing_compare/source", logger)["file.txt"]
+    destiny_entry = TreeScanner.scan(".testing_compare/destiny", logger)["file.txt"]
+    return source_entry, destiny_entry
+
+# This function checks if the metadata policy trusts equal size and mtime without reading the files content
+def test_metadata_policy_skips_content():
+    source_entry, destiny_entry = create_lookalike_files()
+    comparator = FileComparator(".testing_compare/source", ".testing_compare/destiny", logger, METADATA)
+    assert comparator.is_same_file("file.txt", source_entry, destiny_entry)
+    shutil.rmtree(".testing_compare/")
+
+# This function checks if the hash and paranoid policies read the content and detect the different files
+def test_content_policies_detect_difference():
+    source_entry, destiny_entry = create_lookalike_files()
+    for policy in (HASH, PARANOID):
+        comparator = FileComparator(".testing_compare/source", ".testing_compare/destiny", logger, policy)
+        assert not comparator.is_same_file("file.txt", source_entry, destiny_entry)
+    shutil.rmtree(".testing_compare/")
+
+# This function checks if the metadata policy falls back to hashing when the mtime differs but the size is the same
+def test_metadata_policy_hashes_when_ambiguous():
+    source_entry, destiny_entry = create_lookalike_files()
+    comparator = FileComparator(".testing_compare/source", ".testing_compare/destiny", logger, METADATA)
+    assert not comparator.is_same_file("file.txt", source_entry, destiny_entry._replace(mtime_ns=destiny_entry.mtime_ns + 1))
+    shutil.rmtree(".testing_compare/")
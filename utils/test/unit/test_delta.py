@@ -0,0 +1,88 @@
+from utils.logger import configure_logger
+from utils.delta import DeltaTransfer, DELTA_IN_PLACE, DELTA_REBUILD
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+BLOCK = 4 * 1024
+
+def write(file_path: str, data: bytes) -> None:
+    with open(file_path, "wb") as file:
+        file.write(data)
+
+def read(file_path: str) -> bytes:
+    with open(file_path, "rb") as file:
+        return file.read()
+
+def count_fsyncs(monkeypatch) -> list:
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda file_descriptor: synced.append(file_descriptor) or fsync(file_descriptor))
+    return synced
+
+# This function checks if a file modified in place only gets the changed block written over the replica, flushed to
+# disk before its metadata is copied
+def test_delta_in_place_writes_changed_block(monkeypatch):
+    os.makedirs(".testing_delta", exist_ok=True)
+    data = os.urandom(64 * BLOCK)
+    changed = data[:10 * BLOCK] + os.urandom(BLOCK) + data[11 * BLOCK:]
+    write(".testing_delta/source.bin", changed)
+    write(".testing_delta/replica.bin", data)
+
+    synced = count_fsyncs(monkeypatch)
+    result = DeltaTransfer.update_file(".testing_delta/source.bin", ".testing_delta/replica.bin", logger, BLOCK)
+
+    assert result.method == DELTA_IN_PLACE
+    assert len(synced) == 1
+    assert result.bytes_copied == BLOCK
+    assert read(".testing_delta/replica.bin") == changed
+    assert os.stat(".testing_delta/replica.bin").st_mtime_ns == os.stat(".testing_delta/source.bin").st_mtime_ns
+    shutil.rmtree(".testing_delta/")
+
+# This function checks if bytes inserted in the middle of a file are found with the rolling checksum, and the
+# replica rebuilt with the blocks it already had, the rebuilt file and its rename being flushed to disk
+def test_delta_rebuild_after_insertion(monkeypatch):
+    os.makedirs(".testing_delta", exist_ok=True)
+    data = os.urandom(32 * BLOCK + 100)
+    changed = data[:5 * BLOCK + 7] + b"inserted bytes" + data[5 * BLOCK + 7:]
+    write(".testing_delta/source.bin", changed)
+    write(".testing_delta/replica.bin", data)
+
+    signature = DeltaTransfer.build_signature(".testing_delta/replica.bin", BLOCK)
+    operations = DeltaTransfer.compute_delta(".testing_delta/source.bin", signature, BLOCK)
+    literal_bytes = sum(operation.length for operation in operations if operation.basis_offset is None)
+    synced = count_fsyncs(monkeypatch)
+    result = DeltaTransfer.apply_delta(".testing_delta/source.bin", ".testing_delta/replica.bin", operations)
+
+    assert len(synced) == 2
+    assert literal_bytes < 2 * BLOCK + 200
+    assert result.method == DELTA_REBUILD
+    assert read(".testing_delta/replica.bin") == changed
+    assert not os.path.exists(".testing_delta/.replica.bin.syncfold-delta")
+    shutil.rmtree(".testing_delta/")
+
+# This function checks if rolling the weak checksum one byte forward gives the same value as computing it again
+def test_roll_checksum_matches_full_checksum():
+    data = os.urandom(3 * BLOCK)
+    checksum = DeltaTransfer.weak_checksum(data[:BLOCK])
+    for position in range(2 * BLOCK):
+        checksum = DeltaTransfer.roll_checksum(checksum, data[position], data[position + BLOCK], BLOCK)
+        assert checksum == DeltaTransfer.weak_checksum(data[position + 1:position + 1 + BLOCK])
+
+# This function checks if the scan of a file that shares no block with the replica stops once the literal budget is
+# spent, so the update falls back to a full copy
+def test_delta_gives_up_over_literal_budget():
+    os.makedirs(".testing_delta", exist_ok=True)
+    write(".testing_delta/source.bin", os.urandom(64 * BLOCK))
+    write(".testing_delta/replica.bin", os.urandom(64 * BLOCK))
+
+    signature = DeltaTransfer.build_signature(".testing_delta/replica.bin", BLOCK)
+    full_delta = DeltaTransfer.compute_delta(".testing_delta/source.bin", signature, BLOCK)
+    budgeted_delta = DeltaTransfer.compute_delta(".testing_delta/source.bin", signature, BLOCK, max_literal_bytes=8 * BLOCK)
+    result = DeltaTransfer.update_file(".testing_delta/source.bin", ".testing_delta/replica.bin", logger, BLOCK)
+
+    assert full_delta == [(0, None, 64 * BLOCK)]
+    assert budgeted_delta is None
+    assert result is None
+    shutil.rmtree(".testing_delta/")
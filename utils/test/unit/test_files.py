@@ -1,6 +1,9 @@
 from utils.logger import configure_logger
 from utils.files import FileOperator
+from utils import files
+from utils.journal import OperationJournal, JournalEntry
 import hashlib
+import pytest
 import shutil
 import os
 
@@ -88,3 +91,187 @@ def test_compare_files_with_different():
     compare_result = (file1_md5 == file2_md5)
     assert function_result == compare_result
     shutil.rmtree(".testing/")
+
+# This function checks if hash_file streams a file bigger than its buffer and returns the same digest hashlib does
+# for every supported algorithm
+def test_hash_file_streams_in_chunks():
+    os.makedirs(".testing/")
+    data = os.urandom(300 * 1024)
+    with open(".testing/big.bin", "wb") as file:
+        file.write(data)
+
+    for algorithm in ("blake2b", "md5", "sha256"):
+        expected = hashlib.new(algorithm, data).hexdigest()
+        assert FileOperator.hash_file(".testing/big.bin", logger, algorithm, chunk_size=64 * 1024) == expected
+    shutil.rmtree(".testing/")
+
+# This function checks if compare_file_bytes detects a difference in the last chunk of two files of the same size,
+# and reports files with different sizes as different
+def test_compare_file_bytes():
+    os.makedirs(".testing/")
+    data = os.urandom(200 * 1024)
+    with open(".testing/test1.bin", "wb") as file:
+        file.write(data)
+    with open(".testing/test2.bin", "wb") as file:
+        file.write(data[:-1] + bytes([data[-1] ^ 1]))
+    with open(".testing/test3.bin", "wb") as file:
+        file.write(data + b"x")
+
+    assert FileOperator.compare_file_bytes(".testing/test1.bin", ".testing/test1.bin", logger, chunk_size=64 * 1024)
+    assert not FileOperator.compare_file_bytes(".testing/test1.bin", ".testing/test2.bin", logger, chunk_size=64 * 1024)
+    assert not FileOperator.compare_file_bytes(".testing/test1.bin", ".testing/test3.bin", logger)
+    assert not FileOperator.compare_file(".testing/test1.bin", ".testing/test3.bin", logger)
+    shutil.rmtree(".testing/")
+
+# This function checks if replicate_file reports the copy method used and the bytes moved, and keeps the
+# modification time and the permissions of the source file like shutil.copy2 does
+def test_replicate_file_result_and_metadata():
+    os.makedirs(".testing/source")
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    with open(".testing/source/data.bin", "wb") as file:
+        file.write(data)
+    os.chmod(".testing/source/data.bin", 0o640)
+    os.utime(".testing/source/data.bin", ns=(1_000_000_000, 2_000_000_123))
+
+    result = FileOperator.replicate_file(".testing/source/data.bin", ".testing/replica/data.bin", logger)
+
+    assert result.method in ("reflink", "copy_file_range", "sendfile", "buffered")
+    assert result.bytes_copied == len(data)
+    with open(".testing/replica/data.bin", "rb") as file:
+        assert file.read() == data
+    replica_stat = os.stat(".testing/replica/data.bin")
+    assert replica_stat.st_mtime_ns == 2_000_000_123
+    assert replica_stat.st_mode & 0o777 == 0o640
+    shutil.rmtree(".testing/")
+
+# This function checks if the buffered fallback used when no kernel copy method works produces the same file
+def test_copy_file_data_buffered_fallback(monkeypatch):
+    os.makedirs(".testing/")
+    data = os.urandom(2 * 1024 * 1024 + 5)
+    with open(".testing/source.bin", "wb") as file:
+        file.write(data)
+
+    monkeypatch.setattr("utils.files.fcntl", None)
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+    result = FileOperator.copy_file_data(".testing/source.bin", ".testing/target.bin")
+
+    assert result == ("buffered", len(data))
+    with open(".testing/target.bin", "rb") as file:
+        assert file.read() == data
+    shutil.rmtree(".testing/")
+
+# This function checks if a copy is written through a temporary file that is gone once the copy is complete, and if
+# the journal is left empty
+def test_replicate_file_is_atomic():
+    os.makedirs(".testing/source")
+    with open(".testing/source/data.bin", "wb") as file:
+        file.write(os.urandom(1024))
+    journal = OperationJournal(".testing/journal.sqlite", logger)
+
+    journal.begin = lambda entry: pytest.fail("a copy smaller than a checkpoint was journaled")
+
+    FileOperator.replicate_file(".testing/source/data.bin", ".testing/replica/data.bin", logger, journal=journal)
+
+    assert os.listdir(".testing/replica") == ["data.bin"]
+    assert journal.entries() == []
+    journal.close()
+    shutil.rmtree(".testing/")
+
+# This function checks if a copy interrupted after a checkpoint resumes from the offset recorded in the journal,
+# copying only the rest of the file, with a checkpoint size that makes the file big enough to be journaled
+def test_replicate_file_resumes_from_journal(monkeypatch):
+    monkeypatch.setattr(files, "CHECKPOINT_BYTES", 1024 * 1024)
+    os.makedirs(".testing/source")
+    os.makedirs(".testing/replica")
+    data = os.urandom(3 * 1024 * 1024 + 11)
+    offset = 2 * 1024 * 1024
+    with open(".testing/source/data.bin", "wb") as file:
+        file.write(data)
+    source_stat = os.stat(".testing/source/data.bin")
+    target_path = os.path.join(".testing/replica", "data.bin")
+    temporary_path = FileOperator.temporary_path(target_path)
+    with open(temporary_path, "wb") as file:
+        file.write(data[:offset])
+    journal = OperationJournal(".testing/journal.sqlite", logger)
+    journal.begin(JournalEntry(target_path, ".testing/source/data.bin", temporary_path, source_stat.st_size,
+                               source_stat.st_mtime_ns, offset))
+
+    result = FileOperator.replicate_file(".testing/source/data.bin", target_path, logger, journal=journal)
+
+    assert result.bytes_copied == len(data) - offset
+    with open(target_path, "rb") as file:
+        assert file.read() == data
+    assert not os.path.exists(temporary_path)
+    assert journal.entries() == []
+    journal.close()
+    shutil.rmtree(".testing/")
+
+def write_sparse_file(file_path: str, size: int, extents: list) -> None:
+    with open(file_path, "wb") as file:
+        file.truncate(size)
+        for offset, data in extents:
+            file.seek(offset)
+            file.write(data)
+
+# This function checks if a sparse file is copied without its holes being written, keeping the same content, and if
+# its digest and the byte comparison match the ones of the same content written out in full
+def test_sparse_file_copy_hash_and_compare():
+    os.makedirs(".testing/source")
+    size = 64 * 1024 * 1024
+    extents = [(0, os.urandom(4096)), (32 * 1024 * 1024, os.urandom(8192))]
+    write_sparse_file(".testing/source/sparse.bin", size, extents)
+    with open(".testing/source/sparse.bin", "rb") as file:
+        content = file.read()
+    with open(".testing/dense.bin", "wb") as file:
+        file.write(content)
+
+    result = FileOperator.replicate_file(".testing/source/sparse.bin", ".testing/replica/sparse.bin", logger)
+
+    with open(".testing/replica/sparse.bin", "rb") as file:
+        assert file.read() == content
+    with open(".testing/source/sparse.bin", "rb") as file:
+        source_extents = FileOperator.data_extents(file.fileno(), 0, size)
+    if source_extents != [(0, size)]:
+        # the file system reports holes, so only the data extents were copied and the replica kept the holes
+        assert result.method == "reflink" or result.bytes_copied < size
+        assert os.stat(".testing/replica/sparse.bin").st_blocks * 512 < size
+
+    dense_digest = FileOperator.hash_file(".testing/dense.bin", logger)
+    assert FileOperator.hash_file(".testing/source/sparse.bin", logger) == dense_digest
+    assert FileOperator.hash_file(".testing/replica/sparse.bin", logger) == dense_digest
+    assert FileOperator.compare_file_bytes(".testing/source/sparse.bin", ".testing/dense.bin", logger)
+
+    write_sparse_file(".testing/changed.bin", size, [(0, extents[0][1]), (48 * 1024 * 1024, b"x")])
+    assert not FileOperator.compare_file_bytes(".testing/source/sparse.bin", ".testing/changed.bin", logger)
+    shutil.rmtree(".testing/")
+
+# This function checks if a file truncated by another program while it's hashed or compared ends the read early,
+# instead of killing the process as a memory mapped read would, and if a copy of it fails instead of being padded
+# with zeros up to its former size
+def test_hash_compare_and_copy_truncated_while_read(monkeypatch):
+    os.makedirs(".testing/replica")
+    data = os.urandom(3 * 1024 * 1024)
+    for name in ("one.bin", "two.bin"):
+        with open(f".testing/{name}", "wb") as file:
+            file.write(data)
+
+    class TruncatingThrottle:
+        def chunk_size(self, size: int) -> int:
+            return 1024 * 1024
+
+        def transfer(self, size: int) -> None:
+            os.truncate(".testing/one.bin", 1024)
+
+    assert FileOperator.hash_file(".testing/one.bin", logger, throttle=TruncatingThrottle()) is not None
+    with open(".testing/one.bin", "wb") as file:
+        file.write(data)
+    assert not FileOperator.compare_file_bytes(".testing/one.bin", ".testing/two.bin", logger, throttle=TruncatingThrottle())
+
+    # the reflink would copy the file at once, before the throttle gets to truncate it
+    monkeypatch.setattr("utils.files.fcntl", None)
+    with open(".testing/one.bin", "wb") as file:
+        file.write(data)
+    assert FileOperator.replicate_file(".testing/one.bin", ".testing/replica/one.bin", logger, TruncatingThrottle()) is None
+    assert os.listdir(".testing/replica") == []
+    shutil.rmtree(".testing/")
@@ -0,0 +1,39 @@
+from utils.filters import PathFilter
+import pytest
+import os
+
+# This function checks the gitignore rules: names matched at any depth, anchored paths, directory only rules, "**"
+# and the last matching rule deciding, so "!" includes back what was excluded before
+def test_path_filter_rules():
+    path_filter = PathFilter([
+        "# comment",
+        "",
+        "node_modules/",
+        "*.pyc",
+        "!keep.pyc",
+        "/build",
+        "docs/**/*.tmp",
+        "cache?/",
+    ])
+
+    assert path_filter.is_excluded("node_modules", True)
+    assert path_filter.is_excluded(os.path.join("app", "node_modules"), True)
+    assert not path_filter.is_excluded(os.path.join("app", "node_modules"), False)
+    assert path_filter.is_excluded(os.path.join("src", "module.pyc"), False)
+    assert not path_filter.is_excluded(os.path.join("src", "keep.pyc"), False)
+    assert path_filter.is_excluded("build", True)
+    assert not path_filter.is_excluded(os.path.join("src", "build"), True)
+    assert path_filter.is_excluded(os.path.join("docs", "a.tmp"), False)
+    assert path_filter.is_excluded(os.path.join("docs", "a", "b", "c.tmp"), False)
+    assert not path_filter.is_excluded(os.path.join("other", "c.tmp"), False)
+    assert path_filter.is_excluded("cache1", True)
+    assert not path_filter.is_excluded("cache12", True)
+    assert not path_filter.is_excluded("src", True)
+
+    assert path_filter.is_inside_excluded(os.path.join("app", "node_modules", "lib"))
+    assert not path_filter.is_inside_excluded(os.path.join("app", "src"))
+
+# This function checks if a line without any pattern is rejected
+def test_path_filter_invalid_pattern():
+    with pytest.raises(ValueError):
+        PathFilter(["!/"])
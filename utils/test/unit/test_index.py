@@ -0,0 +1,72 @@
+from utils.logger import configure_logger
+from utils.index import HashIndex, SOURCE, DESTINY
+from utils.compare import FileComparator, HASH
+from utils.scanner import TreeScanner, ManifestEntry, FILE, DIRECTORY
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+# This function checks if a stored digest is returned while the stat tuple is the same, ignored once the file
+# changes, and kept after the index is closed and opened again
+def test_index_lookup_and_persistence():
+    os.makedirs(".testing_index", exist_ok=True)
+    with open(".testing_index/file.txt", "w") as file:
+        file.write("abc")
+    entry = TreeScanner.scan(".testing_index", logger)["file.txt"]
+
+    index = HashIndex(".testing_index_db/index.sqlite", logger)
+    index.store(SOURCE, "file.txt", entry, "md5", "digest")
+    index.close()
+
+    index = HashIndex(".testing_index_db/index.sqlite", logger)
+    assert index.lookup(SOURCE, "file.txt", entry, "md5") == "digest"
+    assert index.lookup(DESTINY, "file.txt", entry, "md5") is None
+    assert index.lookup(SOURCE, "file.txt", entry._replace(mtime_ns=entry.mtime_ns + 1), "md5") is None
+
+    index.prune(SOURCE, {})
+    assert index.lookup(SOURCE, "file.txt", entry, "md5") is None
+    index.close()
+    shutil.rmtree(".testing_index/")
+    shutil.rmtree(".testing_index_db/")
+
+# This function checks if the comparator takes the digests of unchanged files from the index instead of reading them
+def test_comparator_reuses_index_digests():
+    os.makedirs(".testing_index/source", exist_ok=True)
+    os.makedirs(".testing_index/destiny", exist_ok=True)
+    with open(".testing_index/source/file.txt", "w") as file:
+        file.write("abc")
+    with open(".testing_index/destiny/file.txt", "w") as file:
+        file.write("xyz")
+    source_entry = TreeScanner.scan(".testing_index/source", logger)["file.txt"]
+    destiny_entry = TreeScanner.scan(".testing_index/destiny", logger)["file.txt"]
+
+    index = HashIndex(".testing_index_db/index.sqlite", logger)
+    comparator = FileComparator(".testing_index/source", ".testing_index/destiny", logger, HASH, index)
+    assert not comparator.is_same_file("file.txt", source_entry, destiny_entry)
+
+    # the stored digests are the ones used while the files keep the same stat tuple
+    index.store(DESTINY, "file.txt", destiny_entry, comparator.algorithm, index.lookup(SOURCE, "file.txt", source_entry, comparator.algorithm))
+    assert comparator.is_same_file("file.txt", source_entry, destiny_entry)
+    index.close()
+    shutil.rmtree(".testing_index/")
+    shutil.rmtree(".testing_index_db/")
+
+# This function checks if pruning along a walk removes the stored paths the walk goes past, across pages of stored
+# paths and with names that sort differently as strings than component by component
+def test_prune_walk(monkeypatch):
+    monkeypatch.setattr("utils.index.PRUNE_PAGE", 2)
+    index = HashIndex(".testing_index_db/index.sqlite", logger)
+    entry = ManifestEntry(FILE, 1, 0, 0, 0o100644)
+    stored = ["a-b", os.path.join("a", "gone.txt"), os.path.join("a", "x"), "b", os.path.join("c", "d"), "zz"]
+    for path in stored:
+        index.store(SOURCE, path, entry, "md5", "digest")
+    walk = [("a", ManifestEntry(DIRECTORY, 0, 0, 0, 0o40755)), (os.path.join("a", "x"), entry), ("a-b", entry),
+            ("b", entry), ("new", entry)]
+
+    assert list(index.prune_walk(SOURCE, walk)) == walk
+
+    assert sorted(row[0] for row in index.connection.execute("SELECT path FROM entries")) == sorted(
+        ["a-b", os.path.join("a", "x"), "b"])
+    index.close()
+    shutil.rmtree(".testing_index_db/")
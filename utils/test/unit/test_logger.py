@@ -0,0 +1,39 @@
+from utils.logger import DebugRateLimiter, configure_logger
+from loguru import logger
+
+# This function checks if the rate limiter drops the debug lines above the rate, notes how many were dropped on the
+# first debug line of the next window, and never drops lines of other levels
+def test_debug_rate_limiter():
+    records = []
+    sink_id = logger.add(lambda message: records.append(message.record["message"]), level="DEBUG",
+                         filter=DebugRateLimiter(3), format="{message}")
+    for number in range(10):
+        logger.debug(f"debug {number}")
+    logger.warning("warning")
+    logger.remove(sink_id)
+
+    assert records == ["debug 0", "debug 1", "debug 2", "warning"]
+
+    limiter = DebugRateLimiter(1)
+    level = type("Level", (), {"name": "DEBUG"})()
+    first, second, third = ({"level": level, "message": name, "extra": {}} for name in ("first", "second", "third"))
+    assert limiter(first) and not limiter(second)
+    limiter.window_start -= 1
+    assert limiter(third) and third["message"] == "third"
+    assert third["extra"]["suppressed"] == " (1 debug lines suppressed)"
+
+# This function checks if the lines below the configured level are written nowhere, the default loguru handler being
+# removed
+def test_configure_logger_removes_default_handler(capfd):
+    configure_logger("logs/log_testing.log", "SUMMARY")
+    logger.debug("debug line")
+    logger.info("info line")
+    logger.log("SUMMARY", "summary line")
+    output = capfd.readouterr()
+    # the stdout sink is added again out of the capture of this test, which is closed once the test ends
+    with capfd.disabled():
+        configure_logger("logs/log_testing.log")
+
+    assert "debug line" not in output.out + output.err
+    assert "info line" not in output.out + output.err
+    assert "summary line" in output.out and "summary line" not in output.err
@@ -0,0 +1,28 @@
+from utils.scanner import ManifestEntry, FILE, DIRECTORY
+from utils.merkle import DirectoryDigests
+import os
+
+# This function checks if the rollup of a directory, and of every directory above it, changes when a file deep in
+# the tree changes, while the digests of the untouched directories stay the same
+def test_rollup_changes_up_to_the_root():
+    manifest = {
+        "a": ManifestEntry(DIRECTORY, 0, 1, 1, 0),
+        os.path.join("a", "b"): ManifestEntry(DIRECTORY, 0, 2, 2, 0),
+        os.path.join("a", "b", "file.txt"): ManifestEntry(FILE, 3, 3, 3, 0),
+        "other": ManifestEntry(DIRECTORY, 0, 4, 4, 0),
+        "top.txt": ManifestEntry(FILE, 5, 5, 5, 0),
+    }
+    before = DirectoryDigests.compute(manifest)
+    # the mtime of a directory is not part of its digests
+    assert DirectoryDigests.compute({**manifest, "a": manifest["a"]._replace(mtime_ns=9)}) == before
+
+    manifest[os.path.join("a", "b", "file.txt")] = ManifestEntry(FILE, 3, 30, 3, 0)
+    after = DirectoryDigests.compute(manifest)
+    for directory in ("", "a", os.path.join("a", "b")):
+        assert after[directory][1] != before[directory][1]
+    assert after["a"][0] == before["a"][0]
+    assert after["other"] == before["other"]
+
+    # a directory left out by a pruned scan keeps its stored files digest
+    pruned = {path: entry for path, entry in manifest.items() if path != os.path.join("a", "b", "file.txt")}
+    assert DirectoryDigests.compute(pruned, {os.path.join("a", "b"): after[os.path.join("a", "b")][0]}) == after
@@ -0,0 +1,38 @@
+from utils.logger import configure_logger
+from utils.metrics import MetricsExporter
+from utils.report import CycleReport, SCAN
+from utils.files import CopyResult
+from utils.plan import PlanOperation, COPY
+import shutil
+import json
+
+logger = configure_logger("logs/log_testing.log")
+
+# This function checks if the report of a cycle is written both as a Prometheus textfile and as JSON, with the
+# counters adding up the cycles exported so far
+def test_export_textfile_and_json():
+    exporter = MetricsExporter(logger, ".testing_metrics/syncfold.prom", ".testing_metrics/cycle.json", {"replica": "/backup"})
+    for _ in range(2):
+        report = CycleReport()
+        report.record_phase(SCAN, 0.5)
+        report.record_success(PlanOperation(COPY, "file.txt", 100))
+        report.record_copy(CopyResult("sendfile", 100))
+        report.record_hash(40)
+        report.finish()
+        exporter.export(report)
+
+    with open(".testing_metrics/syncfold.prom") as file:
+        text = file.read()
+    assert 'syncfold_phase_duration_seconds{replica="/backup",phase="scan"} 0.5' in text
+    assert 'syncfold_operation_bytes{replica="/backup",kind="copy"} 100' in text
+    assert 'syncfold_cycles_total{replica="/backup"} 2' in text
+    assert 'syncfold_copied_bytes_total{replica="/backup"} 200' in text
+    assert "# TYPE syncfold_errors_total counter" in text
+
+    with open(".testing_metrics/cycle.json") as file:
+        document = json.load(file)
+    assert document["hashed"] == {"count": 1, "bytes": 40}
+    assert document["operations"][COPY] == {"count": 1, "bytes": 100}
+    assert document["totals"]["cycles"] == 2
+    assert document["error_count"] == 0
+    shutil.rmtree(".testing_metrics/")
@@ -0,0 +1,72 @@
+from utils.moves import MoveDetector
+from utils.scanner import ManifestEntry, FILE, DIRECTORY
+from utils.index import SOURCE
+import os
+
+def file_entry(size: int, inode: int = 0) -> ManifestEntry:
+    return ManifestEntry(FILE, size, 0, inode, 0o100644)
+
+def dir_entry() -> ManifestEntry:
+    return ManifestEntry(DIRECTORY, 0, 0, 0, 0o40755)
+
+class CountingComparator:
+    def __init__(self):
+        self.hashed = []
+
+    def file_digest(self, side: str, relative_path: str, entry) -> str:
+        self.hashed.append((side, relative_path))
+        return os.path.basename(relative_path).split(".")[0]
+
+class StoredIndex:
+    def __init__(self, stored: dict):
+        self.stored = stored
+
+    def stored_entry(self, side: str, path: str):
+        return self.stored.get(path) if side == SOURCE else None
+
+# This function checks if many moved files of the same size are matched by their digests, with every file hashed
+# once, and turned into the move of their directory
+def test_detect_hashes_each_file_once():
+    source = {os.path.join("to", f"f{number}.bin"): file_entry(100) for number in range(50)}
+    source["to"] = dir_entry()
+    destiny = {os.path.join("from", f"f{number}.bin"): file_entry(100) for number in range(50)}
+    destiny["from"] = dir_entry()
+    destiny[os.path.join("from", "gone.bin")] = file_entry(100)
+    comparator = CountingComparator()
+
+    moves = MoveDetector(comparator, None, None).detect(source, destiny)
+
+    assert moves == [("from", "to")]
+    assert len(comparator.hashed) == len(set(comparator.hashed)) == 101
+
+# This function checks if a file is matched through the state its old path had in the index, without being hashed
+def test_detect_matches_through_index():
+    source = {"renamed.bin": file_entry(10, inode=7), "other.bin": file_entry(10, inode=8)}
+    destiny = {"original.bin": file_entry(10, inode=3), "unrelated.bin": file_entry(10, inode=4)}
+    comparator = CountingComparator()
+    index = StoredIndex({"original.bin": (10, 0, 7, "blake2b", "digest")})
+
+    moves = MoveDetector(comparator, index, None).detect(source, destiny)
+
+    assert moves == [("original.bin", "renamed.bin")]
+    assert ("source", "renamed.bin") not in comparator.hashed
+
+# This function checks if the manifest is relocated as if the moves were applied in order, including a file moved out
+# of a directory that was moved before it
+def test_apply_to_manifest():
+    manifest = {
+        "a": dir_entry(),
+        os.path.join("a", "x.txt"): file_entry(1),
+        os.path.join("a", "y.txt"): file_entry(2),
+        "ab.txt": file_entry(3),
+        "z.txt": file_entry(4),
+    }
+    moves = [("a", "b"), (os.path.join("b", "y.txt"), "y.txt"), ("z.txt", "w.txt")]
+
+    assert MoveDetector.apply_to_manifest(manifest, moves) == {
+        "b": dir_entry(),
+        os.path.join("b", "x.txt"): file_entry(1),
+        "y.txt": file_entry(2),
+        "ab.txt": file_entry(3),
+        "w.txt": file_entry(4),
+    }
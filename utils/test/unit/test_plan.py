@@ -0,0 +1,114 @@
+from utils.plan import DiffEngine, SyncPlan, PlanOperation, SMALL_FIRST, LARGE_FIRST, MKDIR, COPY, UPDATE, DELETE, RMDIR
+from utils.scanner import ManifestEntry, FILE, DIRECTORY
+from utils.workers import WorkerPool
+import threading
+import os
+
+def file_entry(size: int) -> ManifestEntry:
+    return ManifestEntry(FILE, size, 0, 0, 0o100644)
+
+def dir_entry() -> ManifestEntry:
+    return ManifestEntry(DIRECTORY, 0, 0, 0, 0o40755)
+
+# This function checks if build_plan can produce every kind of operation, with the byte counts of each one,
+# from a source and a destiny manifest
+def test_build_plan_operations():
+    source = {
+        "new_dir": dir_entry(),
+        os.path.join("new_dir", "new.txt"): file_entry(10),
+        "same.txt": file_entry(5),
+        "changed.txt": file_entry(7),
+    }
+    destiny = {
+        "same.txt": file_entry(5),
+        "changed.txt": file_entry(3),
+        "extra.txt": file_entry(4),
+        "old_dir": dir_entry(),
+        os.path.join("old_dir", "inner.txt"): file_entry(8),
+    }
+
+    plan = DiffEngine.build_plan(source, destiny, lambda path, source_entry, destiny_entry: path == "same.txt")
+
+    assert [operation.path for operation in plan.of_kind(MKDIR)] == ["new_dir"]
+    assert [(operation.path, operation.size) for operation in plan.of_kind(COPY)] == [(os.path.join("new_dir", "new.txt"), 10)]
+    assert [(operation.path, operation.size) for operation in plan.of_kind(UPDATE)] == [("changed.txt", 7)]
+    assert [(operation.path, operation.size) for operation in plan.of_kind(DELETE)] == [("extra.txt", 4)]
+    assert [(operation.path, operation.size) for operation in plan.of_kind(RMDIR)] == [("old_dir", 8)]
+    assert plan.totals()[COPY] == {"count": 1, "bytes": 10}
+
+# This function checks if a path that changed from file to directory is removed from the destiny before being recreated
+def test_build_plan_type_change():
+    source = {"item": dir_entry()}
+    destiny = {"item": file_entry(2)}
+
+    plan = DiffEngine.build_plan(source, destiny, lambda *args: True)
+
+    assert [operation.kind for operation in plan] == [DELETE, MKDIR]
+
+# This function checks if the streamed merge-join of two sorted walks finds the same operations as build_plan,
+# with every removal coming before the creation of the same path
+def test_stream_plan_matches_build_plan():
+    source = {
+        "item": dir_entry(),
+        os.path.join("item", "file.txt"): file_entry(6),
+        "new_dir": dir_entry(),
+        os.path.join("new_dir", "new.txt"): file_entry(10),
+        "same.txt": file_entry(5),
+        "changed.txt": file_entry(7),
+    }
+    destiny = {
+        "item": file_entry(2),
+        "same.txt": file_entry(5),
+        "changed.txt": file_entry(3),
+        "old_dir": dir_entry(),
+        os.path.join("old_dir", "inner"): dir_entry(),
+        os.path.join("old_dir", "inner", "deep.txt"): file_entry(8),
+        "zz.txt": file_entry(4),
+    }
+    sorted_entries = lambda manifest: sorted(manifest.items(), key=lambda item: item[0].split(os.sep))
+    is_same_file = lambda path, source_entry, destiny_entry: path == "same.txt"
+
+    streamed = list(DiffEngine.stream_plan(sorted_entries(source), sorted_entries(destiny), is_same_file))
+    plan = DiffEngine.build_plan(source, destiny, is_same_file)
+
+    assert sorted(streamed) == sorted(plan)
+    assert streamed.index(PlanOperation(DELETE, "item", 2)) < streamed.index(PlanOperation(MKDIR, "item", 0))
+    assert streamed.index(PlanOperation(MKDIR, "item", 0)) < streamed.index(PlanOperation(COPY, os.path.join("item", "file.txt"), 6))
+    assert PlanOperation(RMDIR, "old_dir", 8) in streamed
+
+# This function checks if the comparisons of a streamed plan run in the workers of the pool, while the operations keep
+# the order of the walks
+def test_stream_plan_compares_in_pool():
+    names = [f"file{number:02}.txt" for number in range(20)]
+    source = [(name, file_entry(1)) for name in names] + [("zz_new.txt", file_entry(2))]
+    destiny = [(name, file_entry(1)) for name in names]
+    threads = set()
+
+    def is_same_file(path, source_entry, destiny_entry):
+        threads.add(threading.current_thread().name)
+        if path == "file07.txt":
+            raise OSError("unreadable")
+        return path != "file03.txt"
+
+    pool = WorkerPool(4)
+    streamed = list(DiffEngine.stream_plan(source, destiny, is_same_file, pool))
+    pool.shutdown()
+
+    assert streamed == [PlanOperation(UPDATE, "file03.txt", 1), PlanOperation(UPDATE, "file07.txt", 1),
+                        PlanOperation(COPY, "zz_new.txt", 2)]
+    assert threading.current_thread().name not in threads
+
+# This function checks if the copies and updates of a plan can be ordered by size, while the directories keep the order
+# that creates parents first
+def test_order_transfers():
+    plan = SyncPlan()
+    for path, size in (("b.txt", 30), ("a.txt", 10), ("c.txt", 20)):
+        plan.add(COPY, path, size)
+    plan.add(MKDIR, "z")
+    plan.add(MKDIR, os.path.join("z", "a"))
+
+    plan.order_transfers(SMALL_FIRST)
+    assert [operation.size for operation in plan.of_kind(COPY)] == [10, 20, 30]
+    plan.order_transfers(LARGE_FIRST)
+    assert [operation.size for operation in plan.of_kind(COPY)] == [30, 20, 10]
+    assert [operation.path for operation in plan.of_kind(MKDIR)] == ["z", os.path.join("z", "a")]
@@ -0,0 +1,37 @@
+from utils.logger import configure_logger
+from utils.process_hasher import ProcessPoolHasher
+from utils.files import FileOperator
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+# This function checks if the process pool hasher returns the same digests as hash_file for the small files hashed in
+# batches, and if the tree digest of a large file split in ranges only matches a file with the same content
+def test_process_pool_hasher():
+    os.makedirs(".testing_hasher", exist_ok=True)
+    small_files = []
+    for number in range(5):
+        file_path = f".testing_hasher/small{number}.txt"
+        with open(file_path, "w") as file:
+            file.write(f"small file {number}")
+        small_files.append((file_path, os.path.getsize(file_path)))
+
+    data = os.urandom(100 * 1024)
+    with open(".testing_hasher/large1.bin", "wb") as file:
+        file.write(data)
+    with open(".testing_hasher/large2.bin", "wb") as file:
+        file.write(data)
+    with open(".testing_hasher/large3.bin", "wb") as file:
+        file.write(data[:-1] + b"\0")
+    large_files = [(f".testing_hasher/large{number}.bin", len(data)) for number in (1, 2, 3)]
+
+    hasher = ProcessPoolHasher(2, "blake2b", range_size=16 * 1024, large_file_threshold=32 * 1024)
+    digests = hasher.hash_files(small_files + large_files)
+    hasher.shutdown()
+
+    for file_path, _ in small_files:
+        assert digests[file_path] == FileOperator.hash_file(file_path, logger, "blake2b")
+    assert digests[".testing_hasher/large1.bin"] == digests[".testing_hasher/large2.bin"]
+    assert digests[".testing_hasher/large1.bin"] != digests[".testing_hasher/large3.bin"]
+    shutil.rmtree(".testing_hasher/")
@@ -0,0 +1,116 @@
+from utils.logger import configure_logger
+from utils.remote import RemoteReplica, ReplicaReceiver, send_message, receive_message, REMOTE, REMOTE_BATCH
+from utils.delta import BLOCK_SIZE
+from utils.scanner import TreeScanner
+import pytest
+import shutil
+import socket
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+@pytest.fixture
+def receiver():
+    os.makedirs(".testing_remote/source", exist_ok=True)
+    receiver = ReplicaReceiver(".testing_remote/replica", logger, token="secret")
+    receiver.start()
+    yield receiver
+    receiver.shutdown()
+    shutil.rmtree(".testing_remote/")
+
+def write(file_path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as file:
+        file.write(data)
+
+def read(file_path: str) -> bytes:
+    with open(file_path, "rb") as file:
+        return file.read()
+
+# This function checks if a message goes through a connection with its header and its body, compressed when it helps
+def test_message_round_trip():
+    sender, receiver = socket.socketpair()
+    body = b"compressible " * 1000
+    send_message(sender, {"kind": "write", "offset": 7}, body, compress=True)
+    send_message(sender, {"kind": "hello"})
+    sender.close()
+
+    assert receive_message(receiver) == ({"kind": "write", "offset": 7}, body)
+    assert receive_message(receiver) == ({"kind": "hello"}, b"")
+    assert receive_message(receiver) is None
+    receiver.close()
+
+# This function checks if a compressed body that would expand past the size limit is refused
+def test_message_refuses_oversized_decompression(monkeypatch):
+    monkeypatch.setattr("utils.remote.MAX_BODY_SIZE", 1024)
+    sender, receiver = socket.socketpair()
+    send_message(sender, {"kind": "write"}, bytes(4096), compress=True)
+    sender.close()
+
+    with pytest.raises(ConnectionError):
+        receive_message(receiver)
+    receiver.close()
+
+# This function checks if the replica is walked through pages of the receiver walk, in the order of a local walk
+def test_walk_in_pages(receiver, monkeypatch):
+    monkeypatch.setattr("utils.remote.SCAN_PAGE", 2)
+    for path in ("a.txt", os.path.join("dir", "b.txt"), os.path.join("dir", "sub", "c.txt"), "dir-x.txt", "z.txt"):
+        write(os.path.join(".testing_remote/replica", path), path.encode())
+
+    replica = RemoteReplica(receiver.address, logger, token="secret")
+    walked = list(replica.walk())
+
+    assert walked == list(TreeScanner.walk(".testing_remote/replica", logger))
+    assert replica.scan("dir") == TreeScanner.scan(".testing_remote/replica", logger, "dir")
+    replica.close()
+
+# This function checks if small files are sent in one batch and big ones in chunks, with their metadata, and if the
+# replica is scanned and hashed by the receiver
+def test_copy_files_to_receiver(receiver):
+    write(".testing_remote/source/small.txt", b"small file")
+    write(".testing_remote/source/other.txt", b"other file")
+    big = os.urandom(3 * 1024 * 1024)
+    write(".testing_remote/source/big.bin", big)
+    os.utime(".testing_remote/source/big.bin", ns=(1_000_000_000, 2_000_000_000))
+
+    replica = RemoteReplica(receiver.address, logger, token="secret")
+    results = replica.copy_files([(".testing_remote/source/small.txt", os.path.join("dir", "small.txt")),
+                                  (".testing_remote/source/missing.txt", "missing.txt"),
+                                  (".testing_remote/source/other.txt", "other.txt")])
+    big_result = replica.copy_file(".testing_remote/source/big.bin", "big.bin")
+
+    assert results[0].method == REMOTE_BATCH and isinstance(results[1], FileNotFoundError) and results[2].bytes_copied == 10
+    assert big_result.method == REMOTE and big_result.bytes_copied == len(big)
+    assert read(".testing_remote/replica/dir/small.txt") == b"small file"
+    assert read(".testing_remote/replica/big.bin") == big
+    assert os.stat(".testing_remote/replica/big.bin").st_mtime_ns == 2_000_000_000
+    assert sorted(replica.scan()) == ["big.bin", "dir", os.path.join("dir", "small.txt"), "other.txt"]
+    assert replica.file_digest("other.txt") == replica.file_digests(["other.txt"])["other.txt"] is not None
+    replica.close()
+
+# This function checks if a file modified in place is updated sending only the literals of its delta
+def test_update_file_with_remote_delta(receiver):
+    data = os.urandom(16 * BLOCK_SIZE)
+    changed = data[:3 * BLOCK_SIZE] + os.urandom(100) + data[3 * BLOCK_SIZE + 100:]
+    write(".testing_remote/replica/file.bin", data)
+    write(".testing_remote/source/file.bin", changed)
+
+    replica = RemoteReplica(receiver.address, logger, token="secret")
+    result = replica.update_file(".testing_remote/source/file.bin", "file.bin")
+
+    assert result.bytes_copied == BLOCK_SIZE
+    assert read(".testing_remote/replica/file.bin") == changed
+    replica.close()
+
+# This function checks if the paths out of the replica folder and the connections without the token are refused
+def test_receiver_refuses_paths_out_of_replica_and_wrong_token(receiver):
+    replica = RemoteReplica(receiver.address, logger, token="secret")
+    with pytest.raises(PermissionError):
+        replica.make_directory(os.path.join("..", "escaped"))
+    with pytest.raises(PermissionError):
+        replica.remove_file("/etc/hostname")
+    assert not os.path.exists(".testing_remote/escaped")
+    replica.close()
+
+    with pytest.raises(PermissionError):
+        RemoteReplica(receiver.address, logger, token="wrong")
@@ -0,0 +1,72 @@
+from utils.logger import configure_logger
+from utils.scanner import TreeScanner, FILE, DIRECTORY
+from utils.filters import PathFilter
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+# This function checks if the scan can walk a tree a single time and return every file and directory in it,
+# with the relative path mapped to the metadata of the entry
+def test_scan_builds_manifest():
+    os.makedirs(".testing_scan/tree/sub/deep", exist_ok=True)
+    with open(".testing_scan/tree/root.txt", "w") as file:
+        file.write("abc")
+    with open(".testing_scan/tree/sub/deep/leaf.txt", "w") as file:
+        file.write("abcdef")
+
+    manifest = TreeScanner.scan(".testing_scan/tree", logger)
+
+    assert manifest["root.txt"].kind == FILE
+    assert manifest["root.txt"].size == 3
+    assert manifest[os.path.join("sub", "deep", "leaf.txt")].size == 6
+    assert manifest["sub"].kind == DIRECTORY
+    assert manifest[os.path.join("sub", "deep")].kind == DIRECTORY
+    assert manifest["root.txt"].mtime_ns == os.stat(".testing_scan/tree/root.txt").st_mtime_ns
+    assert sorted(TreeScanner.files(manifest)) == sorted(["root.txt", os.path.join("sub", "deep", "leaf.txt")])
+    shutil.rmtree(".testing_scan/")
+
+# This function checks if scanning a path that does not exist returns an empty manifest instead of failing
+def test_scan_missing_folder():
+    assert TreeScanner.scan(".testing_scan/does_not_exist", logger) == {}
+
+# This function checks if walk yields the same entries as scan, in the order of the paths compared component by
+# component, and treats a directory removed while being walked as empty
+def test_walk_sorted_order():
+    os.makedirs(".testing_scan/tree/b/inner", exist_ok=True)
+    os.makedirs(".testing_scan/tree/a-b", exist_ok=True)
+    for path in ("b/inner/x.txt", "b/z.txt", "a-b/y.txt", "c.txt"):
+        with open(os.path.join(".testing_scan/tree", path), "w") as file:
+            file.write(path)
+
+    walked = list(TreeScanner.walk(".testing_scan/tree", logger))
+    assert dict(walked) == TreeScanner.scan(".testing_scan/tree", logger)
+    paths = [path for path, _ in walked]
+    assert paths == sorted(paths, key=lambda path: path.split(os.sep))
+    assert paths.index("b") < paths.index(os.path.join("b", "inner", "x.txt")) < paths.index("c.txt")
+
+    walked = []
+    for path, entry in TreeScanner.walk(".testing_scan/tree", logger):
+        walked.append(path)
+        if path == "b":
+            shutil.rmtree(".testing_scan/tree/b")
+    assert walked == ["a-b", os.path.join("a-b", "y.txt"), "b", "c.txt"]
+    shutil.rmtree(".testing_scan/")
+
+# This function checks if the excluded entries are left out of the scan and of the walk, and if the excluded
+# directories are not entered, so nothing below them is listed
+def test_scan_with_path_filter():
+    os.makedirs(".testing_scan/tree/node_modules/lib", exist_ok=True)
+    os.makedirs(".testing_scan/tree/src", exist_ok=True)
+    for path in ("node_modules/lib/index.js", "src/main.py", "src/main.pyc"):
+        with open(os.path.join(".testing_scan/tree", path), "w") as file:
+            file.write(path)
+    path_filter = PathFilter(["node_modules/", "*.pyc"])
+
+    manifest = TreeScanner.scan(".testing_scan/tree", logger, path_filter=path_filter)
+    walked = [path for path, _ in TreeScanner.walk(".testing_scan/tree", logger, path_filter=path_filter)]
+
+    assert sorted(manifest) == ["src", os.path.join("src", "main.py")]
+    assert walked == ["src", os.path.join("src", "main.py")]
+    assert TreeScanner.scan(".testing_scan/tree", logger, os.path.join("node_modules", "lib"), path_filter=path_filter) == {}
+    shutil.rmtree(".testing_scan/")
@@ -0,0 +1,65 @@
+from utils.logger import configure_logger
+from utils.scrub import ReplicaScrubber
+from utils.replica import LocalReplica
+from utils.index import HashIndex
+from utils.scanner import TreeScanner
+import threading
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+# This function checks if every slice resumes where the previous one stopped, a pass completing once the end of the
+# replica is reached, and if the position is kept in the index for the next runs
+def test_scrubber_rotates_slices_and_keeps_position():
+    for folder in (".testing_scrub/source", ".testing_scrub/replica"):
+        os.makedirs(os.path.join(folder, "dir"), exist_ok=True)
+        for name in ("a.txt", os.path.join("dir", "b.txt"), os.path.join("dir", "c.txt"), "d.txt"):
+            with open(os.path.join(folder, name), "w") as file:
+                file.write("1234")
+            os.utime(os.path.join(folder, name), ns=(1_000_000_000, 1_000_000_000))
+
+    index = HashIndex(".testing_scrub/index.sqlite", logger)
+    repaired = []
+    repair = lambda relative_path, size: repaired.append(relative_path) or True
+    scrubber = ReplicaScrubber(".testing_scrub/source", LocalReplica(".testing_scrub/replica", logger), logger, repair,
+                               threading.Lock(), 1024 * 1024, slice_bytes=8, index=index)
+
+    scrubber.run_slice()
+    assert scrubber.progress()["cursor"] == "d.txt" and scrubber.progress()["coverage"] is None
+    scrubber.run_slice()
+    progress = scrubber.progress()
+    assert progress["passes"] == 1 and progress["cursor"] is None and progress["replica_bytes"] == 16
+    assert progress["checked"] == {"count": 4, "bytes": 16} and repaired == []
+    scrubber.run_slice()
+    assert scrubber.progress()["cursor"] == "d.txt" and scrubber.progress()["coverage"] == 0.5
+
+    restarted = ReplicaScrubber(".testing_scrub/source", LocalReplica(".testing_scrub/replica", logger), logger, repair,
+                                threading.Lock(), 1024 * 1024, slice_bytes=8, index=index)
+    assert restarted.progress()["passes"] == 1 and restarted.progress()["cursor"] == "d.txt"
+    index.close()
+    shutil.rmtree(".testing_scrub/")
+
+# This function checks if a slice resumes the walk of the replica right after the position, without listing the
+# directories that come before it
+def test_scrubber_resumes_walk_after_position(monkeypatch):
+    for folder in (".testing_scrub/source", ".testing_scrub/replica"):
+        for name in (os.path.join("early", "x.txt"), os.path.join("late", "y.txt"), os.path.join("late", "z.txt")):
+            os.makedirs(os.path.join(folder, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(folder, name), "w") as file:
+                file.write("1234")
+            os.utime(os.path.join(folder, name), ns=(1_000_000_000, 1_000_000_000))
+
+    listed = []
+    sorted_entries = TreeScanner.sorted_entries
+    monkeypatch.setattr(TreeScanner, "sorted_entries", staticmethod(
+        lambda root_folder, relative_dir, *args, **kwargs: listed.append(relative_dir) or sorted_entries(root_folder, relative_dir, *args, **kwargs)))
+    scrubber = ReplicaScrubber(".testing_scrub/source", LocalReplica(".testing_scrub/replica", logger), logger,
+                               lambda relative_path, size: True, threading.Lock(), 1024 * 1024)
+    scrubber.cursor = os.path.join("late", "y.txt")
+
+    scrubber.run_slice()
+
+    assert listed == ["", "late"]
+    assert scrubber.progress()["checked"] == {"count": 1, "bytes": 4} and scrubber.progress()["passes"] == 1
+    shutil.rmtree(".testing_scrub/")
@@ -0,0 +1,39 @@
+from utils.synthetic import SyntheticTree
+from utils.scanner import TreeScanner
+from utils.logger import configure_logger
+import shutil
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+def tree_contents(folder: str) -> dict:
+    contents = {}
+    for relative_path in SyntheticTree(folder).files():
+        with open(os.path.join(folder, relative_path), "rb") as file:
+            contents[relative_path] = file.read()
+    return contents
+
+# This function checks if two trees generated with the same seed are identical, contents and mtimes included, and if
+# the in place modifications keep the size of the files they change
+def test_same_seed_same_tree():
+    for folder in (".testing_synthetic/first", ".testing_synthetic/second"):
+        tree = SyntheticTree(folder, seed=7)
+        tree.tiny_files(30, per_directory=10)
+        tree.deep_nesting(3)
+        tree.huge_files(1, 3 * 1024 * 1024 + 5)
+
+    assert tree_contents(".testing_synthetic/first") == tree_contents(".testing_synthetic/second")
+    first = TreeScanner.scan(".testing_synthetic/first", logger)
+    second = TreeScanner.scan(".testing_synthetic/second", logger)
+    assert {path: entry.mtime_ns for path, entry in first.items() if entry.is_file} == \
+           {path: entry.mtime_ns for path, entry in second.items() if entry.is_file}
+
+    before = tree_contents(".testing_synthetic/first")
+    modified = SyntheticTree(".testing_synthetic/first", seed=7).modify_files(0.1)
+    after = tree_contents(".testing_synthetic/first")
+    assert modified and all(after[path] != before[path] and len(after[path]) == len(before[path]) for path in modified)
+
+    renames = SyntheticTree(".testing_synthetic/first", seed=7).rename_entries(3, directory_count=1)
+    assert len(renames) == 4
+    assert all(os.path.exists(os.path.join(".testing_synthetic/first", new)) for _, new in renames)
+    shutil.rmtree(".testing_synthetic/")
@@ -0,0 +1,36 @@
+from utils.throttle import TokenBucket, Throttle
+from utils.files import FileOperator, REFLINK
+import shutil
+import time
+import os
+
+# This function checks if the bucket serves its capacity right away, and makes the caller wait for whatever is taken
+# above it, at the configured rate
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=100, capacity=10)
+    assert bucket.acquire(10) == 0
+    start = time.monotonic()
+    waited = bucket.acquire(20)
+    assert 0.15 <= waited <= 0.25
+    assert time.monotonic() - start >= 0.15
+
+# This function checks if a throttled copy moves the data in chunks taken from the bytes budget, so copying more than
+# the budget of a second takes about the extra time, and still produces the same file
+def test_throttled_copy():
+    os.makedirs(".testing_throttle", exist_ok=True)
+    data = os.urandom(600 * 1024)
+    with open(".testing_throttle/source.bin", "wb") as file:
+        file.write(data)
+
+    throttle = Throttle(bytes_per_second=400 * 1024)
+    start = time.monotonic()
+    result = FileOperator.copy_file_data(".testing_throttle/source.bin", ".testing_throttle/target.bin", throttle)
+    elapsed = time.monotonic() - start
+
+    with open(".testing_throttle/target.bin", "rb") as file:
+        assert file.read() == data
+    # a reflink moves no data, so it's not throttled
+    if result.method != REFLINK:
+        assert elapsed >= 0.4
+    assert throttle.chunk_size(64 * 1024 * 1024) == 64 * 1024
+    shutil.rmtree(".testing_throttle/")
@@ -0,0 +1,29 @@
+from utils.logger import configure_logger
+from utils.watcher import InotifyWatcher
+import shutil
+import pytest
+import os
+
+logger = configure_logger("logs/log_testing.log")
+
+# This function checks if the watcher reports the directories where files were written, including directories
+# created after the watcher started
+@pytest.mark.skipif(not InotifyWatcher.is_supported(), reason="inotify is only available on Linux")
+def test_watcher_collects_changed_directories():
+    os.makedirs(".testing_watch/tree/sub", exist_ok=True)
+    watcher = InotifyWatcher(".testing_watch/tree", logger)
+    watcher.start()
+
+    with open(".testing_watch/tree/sub/file.txt", "w") as file:
+        file.write("abc")
+    os.makedirs(".testing_watch/tree/new")
+    assert watcher.collect(0.1, 2) == {"", "sub"}
+
+    with open(".testing_watch/tree/new/inner.txt", "w") as file:
+        file.write("abc")
+    assert watcher.collect(0.1, 2) == {"new"}
+    assert watcher.collect(0.1, 0.1) == set()
+    assert not watcher.needs_full_sync
+
+    watcher.close()
+    shutil.rmtree(".testing_watch/")
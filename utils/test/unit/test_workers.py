@@ -0,0 +1,31 @@
+from utils.workers import WorkerPool
+
+def fail_on_odd(number: int) -> int:
+    if number % 2:
+        raise ValueError(f"odd number {number}")
+    return number * 10
+
+# This function checks if run_all returns the results in the same order as the items, and hands back the
+# exceptions raised by some items without stopping the others, for the threaded and the inline pools
+def test_run_all_collects_errors():
+    for workers in (1, 4):
+        pool = WorkerPool(workers)
+        results = pool.run_all(fail_on_odd, list(range(6)))
+        pool.shutdown()
+
+        assert [item for item, _, _ in results] == list(range(6))
+        assert [result for _, result, error in results if error is None] == [0, 20, 40]
+        assert [type(error) for _, _, error in results if error is not None] == [ValueError] * 3
+        assert pool.queue_depth == 0
+
+# This function checks if run_stream pulls the items lazily and yields the results in the same order as the items,
+# running the inline ones in the calling thread
+def test_run_stream_keeps_order():
+    for workers in (1, 4):
+        pool = WorkerPool(workers)
+        results = list(pool.run_stream(fail_on_odd, iter(range(50)), inline=lambda number: number % 10 == 0))
+        pool.shutdown()
+
+        assert [item for item, _, _ in results] == list(range(50))
+        assert [result for _, result, error in results if error is None] == [number * 10 for number in range(0, 50, 2)]
+        assert pool.queue_depth == 0
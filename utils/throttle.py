@@ -0,0 +1,86 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    This class represents a token bucket that refills at `rate` tokens per second, up to `capacity` tokens. Taking more
+    tokens than there are leaves the bucket in debt, and the caller sleeps until the debt is paid, so a request bigger
+    than the capacity is still served, at the configured rate on average.
+
+    Attributes:
+        rate: float
+        capacity: float
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError(f"Invalid token bucket rate: {rate}. Expected a positive number.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        This function takes the passed amount of tokens, sleeping as long as needed for the bucket to afford them.
+
+        Args:
+            amount: float
+
+        Returns:
+            waited: float, seconds slept
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        # sleeping out of the lock lets the other threads queue their own debt meanwhile
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class Throttle:
+    """
+    This class limits the disk usage of the copies and of the hashing, with one token bucket for the bytes read or
+    written per second and another one for the file operations per second. Either limit can be left out.
+
+    Attributes:
+        bytes_per_second: int | None
+        ops_per_second: float | None
+    """
+
+    def __init__(self, bytes_per_second: int = None, ops_per_second: float = None):
+        self.bytes_per_second = bytes_per_second or None
+        self.ops_per_second = ops_per_second or None
+        self.bytes_bucket = TokenBucket(bytes_per_second) if bytes_per_second else None
+        self.ops_bucket = TokenBucket(ops_per_second) if ops_per_second else None
+
+    def operation(self) -> None:
+        if self.ops_bucket is not None:
+            self.ops_bucket.acquire(1)
+
+    def transfer(self, size: int) -> None:
+        if self.bytes_bucket is not None and size > 0:
+            self.bytes_bucket.acquire(size)
+
+    def chunk_size(self, default: int) -> int:
+        """
+        This function returns the size of the chunks a throttled transfer should be split in, small enough for the
+        limit to be followed smoothly within a single file.
+
+        Args:
+            default: int
+
+        Returns:
+            chunk_size: int
+        """
+
+        if self.bytes_per_second is None:
+            return default
+        return max(64 * 1024, min(default, self.bytes_per_second // 10))
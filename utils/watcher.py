@@ -0,0 +1,218 @@
+import ctypes.util
+import ctypes
+import select
+import errno
+import struct
+import time
+import sys
+import os
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    This class watches every directory of a tree with Linux inotify, through ctypes, collecting the directories in which
+    something changed, so only those subtrees have to be synchronized. When the kernel event queue overflows, or a
+    directory could not be watched, the watcher asks for a full synchronization instead. The directories excluded by the
+    path filter are not watched, and the changes of excluded entries are ignored.
+
+    Attributes:
+        root_folder: str
+        logger: logger
+        needs_full_sync: bool
+        path_filter: PathFilter | None
+    """
+
+    def __init__(self, root_folder: str, logger, path_filter=None):
+        self.root_folder = root_folder
+        self.logger = logger
+        self.path_filter = path_filter
+        self.needs_full_sync = False
+        self.watches = {}
+        self.fd = None
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+    @staticmethod
+    def is_supported() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+            return hasattr(libc, "inotify_init1")
+        except OSError:
+            return False
+
+    def start(self) -> None:
+        """
+        This function creates the inotify instance and adds a watch to every directory of the tree.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            OSError: When the inotify instance could not be created.
+        """
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self.watch_tree("")
+
+    def watch_tree(self, relative_dir: str) -> None:
+        pending = [relative_dir]
+        while pending:
+            current = pending.pop()
+            if not self.add_watch(current):
+                continue
+            try:
+                with os.scandir(os.path.join(self.root_folder, current)) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            child = os.path.join(current, entry.name) if current else entry.name
+                            if self.path_filter is None or not self.path_filter.is_excluded(child, True):
+                                pending.append(child)
+            except OSError as e:
+                self.logger.error(f"An unexpected error occurred while watching the folder {current}: {str(e)}")
+
+    def add_watch(self, relative_dir: str) -> bool:
+        path = os.path.join(self.root_folder, relative_dir) if relative_dir else self.root_folder
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            # the directory may be gone already, anything else means changes in it would be missed
+            if error != errno.ENOENT:
+                self.logger.error(f"Error: could not watch {path}: {os.strerror(error)}. A full synchronization will be run.")
+                self.needs_full_sync = True
+            return False
+        self.watches[wd] = relative_dir
+        return True
+
+    def forget_tree(self, relative_dir: str) -> None:
+        """
+        This function removes the watches of a directory moved away and of everything below it, since the relative
+        paths they were registered with are no longer valid. If the directory was moved inside the tree, it is watched
+        again under its new path by the IN_MOVED_TO event.
+
+        Args:
+            relative_dir: str
+
+        Returns:
+            None
+        """
+
+        prefix = relative_dir + os.sep
+        for wd, directory in list(self.watches.items()):
+            if directory == relative_dir or directory.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def read_events(self) -> set:
+        """
+        This function reads every event available in the inotify file descriptor, and returns the relative paths
+        of the directories where they happened.
+
+        Args:
+            None
+
+        Returns:
+            changed_directories: set
+        """
+
+        changed_directories = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + name_length
+
+                if mask & IN_Q_OVERFLOW:
+                    self.logger.error("Error: the inotify event queue overflowed. A full synchronization will be run.")
+                    self.needs_full_sync = True
+                    continue
+
+                directory = self.watches.get(wd)
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                if directory is None:
+                    continue
+
+                child = None
+                if name:
+                    name = os.fsdecode(name)
+                    child = os.path.join(directory, name) if directory else name
+                    if self.path_filter is not None and self.path_filter.is_excluded(child, bool(mask & IN_ISDIR)):
+                        continue
+
+                changed_directories.add(directory)
+                if child is not None and mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self.watch_tree(child)
+                    elif mask & IN_MOVED_FROM:
+                        self.forget_tree(child)
+
+        return changed_directories
+
+    def collect(self, debounce: float, timeout: float) -> set:
+        """
+        This function waits up to `timeout` seconds for the first change in the tree, then keeps collecting changes
+        until the tree has been quiet for `debounce` seconds, so a burst of writes turns into a single synchronization.
+        A tree that never goes quiet is still synchronized after ten debounce windows.
+
+        Args:
+            debounce: float
+            timeout: float
+
+        Returns:
+            changed_directories: set, empty when nothing changed before the timeout
+        """
+
+        changed_directories = set()
+        ready, _, _ = select.select([self.fd], [], [], max(0, timeout))
+        if not ready:
+            return changed_directories
+
+        changed_directories |= self.read_events()
+        quiet_since = first_change = time.monotonic()
+        while time.monotonic() - quiet_since < debounce and time.monotonic() - first_change < debounce * 10:
+            ready, _, _ = select.select([self.fd], [], [], debounce)
+            if ready:
+                changed_directories |= self.read_events()
+                quiet_since = time.monotonic()
+        return changed_directories
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_CONCURRENT_IO = 8
+
+
+class WorkerPool:
+    """
+    This class represents the bounded pool of worker threads used to run the file operations of a cycle concurrently.
+    With a single worker the functions run inline, in the calling thread, keeping the sequential behaviour.
+
+    Attributes:
+        workers: int
+        queue_depth: int
+        max_queue_depth: int
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = max(1, workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="syncfold") if self.workers > 1 else None
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def run_all(self, function, items: list) -> list:
+        """
+        This function calls the passed function for every item, using the workers of the pool, and waits for all of them.
+        Exceptions raised by the function are not propagated, they are returned together with the item that raised them.
+
+        Args:
+            function: callable(item)
+            items: list
+
+        Returns:
+            results: list of (item, result, exception) tuples, in the same order as the items
+        """
+
+        if self.executor is None or len(items) <= 1:
+            return [self.call(function, item) for item in items]
+
+        with self.lock:
+            self.queue_depth += len(items)
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        futures = [self.executor.submit(self.queued_call, function, item) for item in items]
+        return [future.result() for future in futures]
+
+    def run_stream(self, function, items, inline=None):
+        """
+        This function calls the passed function for every item of an iterable that may be produced lazily, using the
+        workers of the pool, and yields the results in the same order as the items. At most a few items per worker are
+        in flight at any time, so the items are pulled from the iterable as fast as the workers go through them.
+
+        The items the inline predicate returns True for are run in the calling thread when they are reached, which keeps
+        them ordered with respect to every item that comes after them.
+
+        Args:
+            function: callable(item)
+            items: iterable
+            inline: callable(item) -> bool | None
+
+        Yields:
+            (item, result, exception): tuple
+        """
+
+        if self.executor is None:
+            for item in items:
+                yield self.call(function, item)
+            return
+
+        pending = deque()
+        max_pending = self.workers * 4
+        for item in items:
+            if inline is not None and inline(item):
+                pending.append(self.call(function, item))
+            else:
+                with self.lock:
+                    self.queue_depth += 1
+                    self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+                pending.append(self.executor.submit(self.queued_call, function, item))
+
+            while pending and (len(pending) > max_pending or isinstance(pending[0], tuple)):
+                result = pending.popleft()
+                yield result if isinstance(result, tuple) else result.result()
+
+        while pending:
+            result = pending.popleft()
+            yield result if isinstance(result, tuple) else result.result()
+
+    def call(self, function, item) -> tuple:
+        try:
+            return item, function(item), None
+        except Exception as e:
+            return item, None, e
+
+    def queued_call(self, function, item) -> tuple:
+        with self.lock:
+            self.queue_depth -= 1
+        return self.call(function, item)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+class IOBudget:
+    """
+    This class represents the global limit on the file operations running at once, shared by every pair of the daemon,
+    so the pairs replicating to the same disks do not compete for them beyond the limit. Every copy, update, deletion or
+    file comparison holds one slot while it runs.
+
+    Attributes:
+        limit: int
+    """
+
+    def __init__(self, limit: int = DEFAULT_MAX_CONCURRENT_IO):
+        self.limit = max(1, limit)
+        self.semaphore = threading.BoundedSemaphore(self.limit)
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.semaphore.release()